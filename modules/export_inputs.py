@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""Préparation des données d'entrée de l'export des cartes (côté application).
+
+- aires d'étude AE/ZE reprojetées en GeoPackage local ;
+- miroir local des projets QGIS du partage réseau ;
+- liste des sites d'une campagne multi-sites.
+
+Ces traitements tournent dans l'interpréteur de l'application (geopandas),
+avant l'envoi des jobs aux workers QGIS.
+"""
+import os
+import re
+import csv
+import json
+import math
+import shutil
+import hashlib
+import zipfile
+import datetime
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterable, List, Optional
+
+try:
+    from .export_worker import shapefile_digest
+except Exception:
+    from modules.export_worker import shapefile_digest
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+CACHE_DIR = os.path.join(REPO_ROOT, "cache")
+STUDY_DIR = os.path.join(CACHE_DIR, "study_layers")
+
+# Noms des couches dans le GeoPackage des aires d'étude
+GPKG_LAYER_AE = "aire_etude_elargie"
+GPKG_LAYER_ZE = "zone_etude"
+
+
+def log_with_time(msg: str) -> None:
+    print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+# ---------- CRS des projets QGIS ----------
+
+def _authid_from_qgs(fh) -> Optional[str]:
+    """Lit le SCR du projet (<projectCrs>) en s'arrêtant dès qu'il est trouvé."""
+    in_project_crs = False
+    for event, elem in ET.iterparse(fh, events=("start", "end")):
+        if event == "start" and elem.tag == "projectCrs":
+            in_project_crs = True
+        elif event == "end" and in_project_crs and elem.tag == "authid":
+            return (elem.text or "").strip() or None
+        elif event == "end" and elem.tag == "projectCrs":
+            return None
+    return None
+
+
+def project_crs_authid(project_path: str) -> Optional[str]:
+    """Identifiant du SCR (ex. "EPSG:2154") d'un projet .qgz/.qgs, sans QGIS."""
+    try:
+        if project_path.lower().endswith(".qgz"):
+            with zipfile.ZipFile(project_path) as zf:
+                names = [n for n in zf.namelist() if n.lower().endswith(".qgs")]
+                if not names:
+                    return None
+                with zf.open(names[0]) as fh:
+                    return _authid_from_qgs(fh)
+        with open(project_path, "rb") as fh:
+            return _authid_from_qgs(fh)
+    except Exception:
+        return None
+
+
+# ---------- Aires d'étude en GeoPackage local ----------
+
+def prepare_study_layers(ae_shp: str, ze_shp: str, projects: Iterable[str],
+                         dest_dir: str = STUDY_DIR) -> Dict[str, str]:
+    """Copie AE et ZE dans un GeoPackage local par SCR de projet.
+
+    Les couches sont reprojetées une fois dans le SCR du projet et écrites
+    avec index spatial : les workers QGIS relient leurs couches à ce fichier
+    local au lieu de relire les shapefiles (souvent sur le partage réseau) et
+    de les reprojeter à la volée pour chaque rendu.
+    Les fichiers sont nommés d'après l'empreinte des shapefiles : un export
+    ultérieur avec les mêmes aires d'étude les réutilise tels quels.
+
+    :return: {authid: chemin du GeoPackage}; vide si la préparation échoue.
+    """
+    crs_ids = sorted({c for c in (project_crs_authid(p) for p in projects) if c})
+    if not crs_ids:
+        return {}
+    os.makedirs(dest_dir, exist_ok=True)
+    digest = shapefile_digest(ae_shp)[:12] + "_" + shapefile_digest(ze_shp)[:12]
+    out: Dict[str, str] = {}
+    ae_gdf = ze_gdf = None
+    for authid in crs_ids:
+        gpkg = os.path.join(dest_dir, f"study_{digest}_{re.sub(r'[^0-9A-Za-z]+', '_', authid)}.gpkg")
+        if os.path.isfile(gpkg):
+            out[authid] = gpkg
+            continue
+        try:
+            if ae_gdf is None:
+                import geopandas as gpd
+                ae_gdf = gpd.read_file(ae_shp)
+                ze_gdf = gpd.read_file(ze_shp)
+                if ae_gdf.crs is None or ze_gdf.crs is None:
+                    log_with_time("Aires d'étude sans SCR : relinks sur les shapefiles d'origine")
+                    return {}
+            tmp = gpkg + ".tmp.gpkg"
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            ae_gdf.to_crs(authid).to_file(tmp, layer=GPKG_LAYER_AE, driver="GPKG")
+            ze_gdf.to_crs(authid).to_file(tmp, layer=GPKG_LAYER_ZE, driver="GPKG")
+            os.replace(tmp, gpkg)
+            out[authid] = gpkg
+            log_with_time(f"Aires d'étude copiées en local ({authid}) : {os.path.basename(gpkg)}")
+        except Exception as e:
+            log_with_time(f"GeoPackage des aires d'étude non créé ({authid}) : {e}")
+    _prune_study_layers(dest_dir, keep=set(out.values()))
+    return out
+
+
+def _prune_study_layers(dest_dir: str, keep: set, max_age_days: float = 7.0) -> None:
+    """Supprime les GeoPackages d'anciennes aires d'étude non utilisés depuis longtemps."""
+    limit = datetime.datetime.now().timestamp() - max_age_days * 86400
+    try:
+        for name in os.listdir(dest_dir):
+            path = os.path.join(dest_dir, name)
+            if path in keep or not name.startswith("study_"):
+                continue
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
+    except OSError:
+        pass
+
+
+# ---------- Miroir local des projets QGIS ----------
+
+PROJECTS_DIR = os.path.join(CACHE_DIR, "projects")
+PROJECT_INDEX = os.path.join(PROJECTS_DIR, "index.json")
+# Rafraîchissement de la liste en tâche de fond et export peuvent synchroniser en même temps
+_SYNC_LOCK = threading.Lock()
+
+
+def load_project_index(path: str = PROJECT_INDEX) -> Dict[str, Dict]:
+    """Index du miroir : {chemin source: {"local", "mtime", "size"}}."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _save_project_index(index: Dict[str, Dict], path: str = PROJECT_INDEX) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    except Exception:
+        pass
+
+
+def cached_projects(path: str = PROJECT_INDEX) -> List[str]:
+    """Liste des projets connue lors de la dernière synchronisation (sans accès réseau)."""
+    index = load_project_index(path)
+    return sorted((src for src, e in index.items() if os.path.isfile(e.get("local", ""))),
+                  key=lambda p: os.path.basename(p).lower())
+
+
+def sync_projects(sources: Iterable[str], dest_dir: str = PROJECTS_DIR,
+                  prune: bool = False) -> Dict[str, str]:
+    """Met à jour la copie locale des projets dont la taille ou la date a changé.
+
+    Un projet inaccessible (partage réseau hors ligne) garde sa copie
+    précédente. Avec `prune`, les projets absents de `sources` sont retirés
+    de l'index (liste complète issue de `discover_projects`).
+
+    Les appels concurrents du processus sont sérialisés ; chaque copie passe
+    par un fichier temporaire unique, remplacé atomiquement.
+
+    :return: {chemin source: chemin local} pour les projets disponibles en local.
+    """
+    with _SYNC_LOCK:
+        return _sync_projects(sources, dest_dir, prune)
+
+
+def _sync_projects(sources: Iterable[str], dest_dir: str, prune: bool) -> Dict[str, str]:
+    os.makedirs(dest_dir, exist_ok=True)
+    index = load_project_index(os.path.join(dest_dir, "index.json"))
+    sources = list(sources)
+    out: Dict[str, str] = {}
+    copied = 0
+    for src in sources:
+        entry = index.get(src) or {}
+        # Un sous-dossier par dossier source : deux partages peuvent contenir le même nom
+        sub = hashlib.sha1(os.path.dirname(src).lower().encode("utf-8")).hexdigest()[:10]
+        local = os.path.join(dest_dir, sub, os.path.basename(src))
+        try:
+            st = os.stat(src)
+        except OSError:
+            if os.path.isfile(entry.get("local", "")):
+                out[src] = entry["local"]
+            continue
+        if (entry.get("local") == local and os.path.isfile(local)
+                and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime):
+            out[src] = local
+            continue
+        try:
+            os.makedirs(os.path.dirname(local), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(local))
+            os.close(fd)
+            try:
+                shutil.copyfile(src, tmp)
+                os.replace(tmp, local)
+            except Exception:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+            index[src] = {"local": local, "size": st.st_size, "mtime": st.st_mtime}
+            out[src] = local
+            copied += 1
+        except Exception as e:
+            log_with_time(f"Copie locale impossible pour {os.path.basename(src)} : {e}")
+            if os.path.isfile(entry.get("local", "")):
+                out[src] = entry["local"]
+    if prune:
+        keep = set(sources)
+        for src in [s for s in index if s not in keep]:
+            try:
+                os.remove(index[src].get("local", ""))
+            except OSError:
+                pass
+            del index[src]
+    _save_project_index(index, os.path.join(dest_dir, "index.json"))
+    if copied:
+        log_with_time(f"Projets QGIS mis à jour en local : {copied}")
+    return out
+
+
+# ---------- Campagnes multi-sites ----------
+
+_SITE_COLUMNS = {
+    "ZE_SHP": ("ze", "ze_shp", "zone_etude", "zone d'étude"),
+    "AE_SHP": ("ae", "ae_shp", "aire_etude", "aire d'étude", "aire d'étude élargie"),
+    "EXPORT_DIR": ("out", "sortie", "dossier", "export_dir", "dossier de sortie"),
+    "SITE": ("site", "nom"),
+}
+
+
+class _SemicolonDialect(csv.excel):
+    delimiter = ";"
+
+
+def load_sites_csv(csv_path: str) -> List[Dict[str, str]]:
+    """Lit une liste de sites (ZE, AE, dossier de sortie[, nom]) depuis un CSV.
+
+    Séparateur `;`, `,` ou tabulation ; en-têtes reconnus sans tenir compte
+    de la casse (ex. "ze;ae;sortie;site"). Sans en-tête reconnu, les colonnes
+    sont lues dans l'ordre ZE, AE, sortie, nom. Les chemins relatifs sont
+    résolus par rapport au dossier du CSV. Les lignes dont un shapefile est
+    introuvable sont ignorées (avec un message).
+    """
+    base = os.path.dirname(os.path.abspath(csv_path))
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        text = f.read()
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096], delimiters=";,\t")
+    except csv.Error:
+        dialect = _SemicolonDialect
+    rows = [r for r in csv.reader(text.splitlines(), dialect) if any(c.strip() for c in r)]
+    if not rows:
+        return []
+    header = [c.strip().lower() for c in rows[0]]
+    cols: Dict[str, int] = {}
+    for key, names in _SITE_COLUMNS.items():
+        for i, h in enumerate(header):
+            if h in names:
+                cols[key] = i
+                break
+    if "ZE_SHP" in cols and "AE_SHP" in cols and "EXPORT_DIR" in cols:
+        rows = rows[1:]
+    else:
+        cols = {"ZE_SHP": 0, "AE_SHP": 1, "EXPORT_DIR": 2, "SITE": 3}
+
+    def _path(p: str) -> str:
+        p = os.path.expandvars(p.strip().strip('"'))
+        return os.path.normpath(p if os.path.isabs(p) else os.path.join(base, p))
+
+    sites: List[Dict[str, str]] = []
+    for n, row in enumerate(rows, start=1):
+        cell = lambda k: row[cols[k]].strip() if k in cols and cols[k] < len(row) else ""
+        if not (cell("ZE_SHP") and cell("AE_SHP") and cell("EXPORT_DIR")):
+            log_with_time(f"Site ligne {n} incomplet, ignoré")
+            continue
+        site = {k: _path(cell(k)) for k in ("ZE_SHP", "AE_SHP", "EXPORT_DIR")}
+        missing = [site[k] for k in ("ZE_SHP", "AE_SHP") if not os.path.isfile(site[k])]
+        if missing:
+            log_with_time(f"Site ligne {n} ignoré, shapefile introuvable : {missing[0]}")
+            continue
+        site["SITE"] = cell("SITE") or os.path.basename(site["EXPORT_DIR"].rstrip("\\/")) or f"site {n}"
+        sites.append(site)
+    return sites
+
+
+def safe_site_name(nom: str, max_len: Optional[int] = None) -> str:
+    """Nom de site utilisable dans un nom de fichier ou d'onglet Excel."""
+    nom = re.sub(r'[<>:"/\\|?*\[\]]+', "_", nom).strip() or "site"
+    return nom[:max_len] if max_len else nom
+
+
+def unique_site_name(nom: str, noms: set) -> str:
+    """`nom`, suffixé " (2)", " (3)"… s'il figure déjà dans `noms` (auquel il est ajouté).
+
+    Même règle pour l'ID des zonages et les rapports d'une campagne : un site
+    garde le même nom (et donc les mêmes fichiers) d'une étape à l'autre.
+    """
+    base, n = nom, 2
+    while nom in noms:
+        nom = f"{base} ({n})"
+        n += 1
+    noms.add(nom)
+    return nom
+
+
+def site_groups(sites: List[Dict], n_projects: int, workers: int) -> List[List[Dict]]:
+    """Découpe les sites en groupes : un job = un projet × un groupe de sites.
+
+    Un groupe partage une seule lecture du projet ; on ne découpe que ce qu'il
+    faut pour donner au moins deux jobs par worker.
+    """
+    if not sites:
+        return [[]]
+    n_groups = max(1, min(len(sites), math.ceil(2 * max(1, workers) / max(1, n_projects))))
+    return [sites[i::n_groups] for i in range(n_groups)]
@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+"""Pool de workers QGIS persistants pour l'export des cartes.
+
+Chaque worker est un sous-processus QGIS Python lancé en mode
+``python -m modules.export_worker_cli --serve`` : QGIS est initialisé une
+seule fois, puis le worker reçoit des jobs (une ligne JSON) sur stdin jusqu'à
+réception de ``{"cmd": "stop"}``. Le pool est conservé pour la durée de la
+session : un second export démarre avec des workers déjà chauds.
+
+Un worker resté sans nouvelle au-delà du délai d'un job (projet qui bloque
+QGIS : flux WMS injoignable, invite d'un fournisseur…) est tué et remplacé ;
+le job est signalé en erreur (`WorkerTimeout`).
+"""
+import os
+import json
+import time
+import queue
+import datetime
+import itertools
+import threading
+import subprocess
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from .export_worker import EVENT_PREFIX
+except Exception:
+    from modules.export_worker import EVENT_PREFIX
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+CACHE_DIR = os.path.join(REPO_ROOT, "cache")
+COSTS_PATH = os.path.join(CACHE_DIR, "export_view_costs.json")
+
+# Délais (s) sans aucun message du worker : démarrage de QGIS, puis job
+# (remis à zéro à chaque évènement de progression). cfg["JOB_TIMEOUT"] le modifie.
+INIT_TIMEOUT = 300.0
+JOB_TIMEOUT = 900.0
+
+
+def log_with_time(msg: str) -> None:
+    print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+class WorkerError(RuntimeError):
+    """Le worker QGIS s'est arrêté ou a répondu de façon inattendue."""
+
+
+class WorkerTimeout(WorkerError):
+    """Le worker QGIS n'a pas répondu dans le délai ; il a été tué."""
+
+
+def qgis_python(cfg: Dict) -> str:
+    return os.path.join(cfg["QGIS_ROOT"], "apps", cfg["PY_VER"], "python.exe")
+
+
+def qgis_subprocess_env(cfg: Dict) -> Dict[str, str]:
+    """Environnement d'exécution du Python de QGIS (stdlib QGIS + dépôt)."""
+    qgis_py_root = os.path.join(cfg["QGIS_ROOT"], "apps", cfg["PY_VER"])
+    qgis_lib = os.path.join(qgis_py_root, "Lib")
+    qgis_dlls = os.path.join(qgis_py_root, "DLLs")
+    qgis_site = os.path.join(qgis_lib, "site-packages")
+    qgis_app_py = os.path.join(cfg["QGIS_APP"], "python")
+
+    env = os.environ.copy()
+    for k in ("PYTHONPATH", "PYTHONHOME", "PYTHONSTARTUP"):
+        env.pop(k, None)
+    env["PYTHONNOUSERSITE"] = "1"
+    env["PYTHONHOME"] = qgis_py_root
+    env["PYTHONPATH"] = os.pathsep.join([REPO_ROOT, qgis_py_root, qgis_lib, qgis_dlls, qgis_site, qgis_app_py])
+    env["PYTHONIOENCODING"] = "utf-8"
+    env["PYTHONUNBUFFERED"] = "1"
+    return env
+
+
+# ---------- Estimation des coûts d'export (ordonnancement) ----------
+
+def _cost_key(project_path: str) -> str:
+    # Clé indépendante de l'emplacement (partage réseau, copie locale…)
+    return os.path.basename(project_path).lower()
+
+
+def load_export_costs(path: str = COSTS_PATH) -> Dict[str, float]:
+    """Durées d'export (s) par sortie produite, mesurées lors des exécutions précédentes."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return {str(k): float(v) for k, v in data.items()}
+    except Exception:
+        return {}
+
+
+def save_export_costs(costs: Dict[str, float], path: str = COSTS_PATH) -> None:
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(costs, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+    except Exception:
+        pass
+
+
+def record_export_cost(costs: Dict[str, float], project_path: str, duration: float,
+                       rendered: int, alpha: float = 0.5) -> None:
+    """Met à jour l'estimation par sortie (moyenne glissante exponentielle).
+
+    Un job dont aucune sortie n'a été produite (toutes à jour d'après le
+    manifeste, projet non lu) ne dit rien du coût du projet : ignoré.
+    """
+    if rendered <= 0:
+        return
+    duration = float(duration) / rendered
+    key = _cost_key(project_path)
+    prev = costs.get(key)
+    costs[key] = duration if prev is None else (alpha * duration + (1.0 - alpha) * prev)
+
+
+def order_by_cost(projects: List[str], costs: Dict[str, float]) -> List[str]:
+    """Trie les projets du plus long au plus court (LPT).
+
+    Un projet jamais mesuré reçoit le coût maximal connu : mieux vaut le
+    lancer tôt que découvrir en fin de lot qu'il est lourd.
+    """
+    default = max(costs.values()) if costs else 0.0
+    return sorted(projects, key=lambda p: costs.get(_cost_key(p), default), reverse=True)
+
+
+class QgisWorker:
+    """Un sous-processus QGIS persistant piloté par stdin/stdout."""
+
+    def __init__(self, cfg: Dict):
+        qgis_py = qgis_python(cfg)
+        if not os.path.isfile(qgis_py):
+            raise RuntimeError(f"Python QGIS introuvable: {qgis_py}")
+        self.proc = subprocess.Popen(
+            [qgis_py, "-m", "modules.export_worker_cli", "--serve"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            text=True, encoding="utf-8", errors="replace", bufsize=1,
+            env=qgis_subprocess_env(cfg), cwd=REPO_ROOT,
+        )
+        self.tail = deque(maxlen=20)
+        self._ids = itertools.count(1)
+        # stdout lu par un thread : l'attente d'un évènement peut expirer
+        self._lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._reader.start()
+        try:
+            self._send({"cmd": "init", "cfg": cfg})
+            # Évènement "ready" : pid et durée d'init de QGIS
+            self.info = self._read_until("ready", timeout=float(cfg.get("INIT_TIMEOUT", INIT_TIMEOUT)))
+        except Exception:
+            self.stop(timeout=1.0)
+            raise
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def _send(self, msg: Dict) -> None:
+        try:
+            self.proc.stdin.write(json.dumps(msg) + "\n")
+            self.proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise WorkerError(f"envoi impossible au worker: {e}")
+
+    def _read_stdout(self) -> None:
+        try:
+            for line in self.proc.stdout:
+                self._lines.put(line)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._lines.put(None)
+
+    def _read_until(self, evt_type: str, job_id=None,
+                    on_event: Optional[Callable[[Dict], None]] = None,
+                    timeout: Optional[float] = None) -> Dict:
+        """Attend l'évènement `evt_type` du job ; `timeout` : délai sans évènement (s)."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            try:
+                line = self._lines.get(timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.kill()
+                raise WorkerTimeout(f"worker sans réponse depuis {timeout:.0f}s, arrêté")
+            if line is None:
+                try:
+                    code = self.proc.wait(timeout=1.0)
+                except subprocess.TimeoutExpired:
+                    code = None
+                raise WorkerError(f"worker arrêté (code={code}): {' | '.join(self.tail)[:400]}")
+            line = line.rstrip("\r\n")
+            if not line.startswith(EVENT_PREFIX):
+                self.tail.append(line)
+                continue
+            try:
+                evt = json.loads(line[len(EVENT_PREFIX):])
+            except ValueError:
+                self.tail.append(line)
+                continue
+            if deadline is not None:
+                deadline = time.monotonic() + timeout
+            if evt.get("type") == "error" and evt.get("id") in (None, job_id):
+                if evt.get("id") is None and job_id is not None:
+                    # Erreur hors job : l'état du job en cours est inconnu,
+                    # le worker ne peut pas être rendu au pool
+                    self.kill()
+                raise WorkerError(evt.get("error") or "erreur worker")
+            if evt.get("type") == evt_type and evt.get("id") == job_id:
+                return evt
+            if on_event:
+                on_event(evt)
+
+    def request(self, msg: Dict, on_event: Optional[Callable[[Dict], None]] = None,
+                timeout: Optional[float] = JOB_TIMEOUT) -> Dict:
+        """Envoie un job (`msg` sans id) et attend son évènement "done".
+
+        Sans évènement pendant `timeout` secondes, le worker est tué et
+        `WorkerTimeout` levée.
+        """
+        job_id = next(self._ids)
+        self._send(dict(msg, id=job_id))
+        return self._read_until("done", job_id, on_event, timeout)
+
+    def run(self, projects: List[str], cfg: Dict,
+            on_event: Optional[Callable[[Dict], None]] = None) -> Dict:
+        return self.request({"cmd": "export", "projects": list(projects), "cfg": cfg}, on_event,
+                            float(cfg.get("JOB_TIMEOUT", JOB_TIMEOUT)))
+
+    def kill(self) -> None:
+        try:
+            self.proc.kill()
+            self.proc.wait(timeout=5.0)
+        except Exception:
+            pass
+
+    def stop(self, timeout: float = 10.0) -> None:
+        try:
+            if self.alive:
+                self._send({"cmd": "stop"})
+                self.proc.wait(timeout=timeout)
+        except Exception:
+            pass
+        if self.alive:
+            self.kill()
+
+
+class QgisWorkerPool:
+    """Ensemble de `QgisWorker` réutilisés d'un export à l'autre."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: "queue.Queue[QgisWorker]" = queue.Queue()
+        self._workers: List[QgisWorker] = []
+        self._key: Optional[Tuple[str, str, str]] = None
+        # Workers de remplacement en cours de démarrage (hors verrou)
+        self._starting = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    def worker_info(self) -> List[Dict]:
+        """Évènements "ready" des workers (pid, durée d'init de QGIS)."""
+        return [dict(getattr(w, "info", {}) or {}) for w in self._workers]
+
+    def ensure(self, size: int, cfg: Dict) -> int:
+        """Démarre ou arrête des workers pour en avoir `size` prêts.
+
+        À appeler hors export (tous les workers inactifs). Les démarrages sont
+        faits en parallèle pour ne payer qu'une fois le temps d'init de QGIS.
+        """
+        size = max(1, int(size))
+        key = (cfg["QGIS_ROOT"], cfg["QGIS_APP"], cfg["PY_VER"])
+        with self._lock:
+            if self._key != key:
+                self._shutdown_locked()
+                self._key = key
+            for w in [w for w in self._workers if not w.alive]:
+                self._discard_locked(w)
+            while len(self._workers) > size:
+                try:
+                    w = self._idle.get_nowait()
+                except queue.Empty:
+                    # Workers occupés : ils seront réduits au prochain appel
+                    break
+                self._workers.remove(w)
+                w.stop()
+            missing = size - len(self._workers)
+            if missing <= 0:
+                return len(self._workers)
+            log_with_time(f"Démarrage de {missing} worker(s) QGIS…")
+            started: List[QgisWorker] = []
+            errors: List[str] = []
+
+            def _start():
+                try:
+                    started.append(QgisWorker(cfg))
+                except Exception as e:
+                    errors.append(str(e))
+
+            threads = [threading.Thread(target=_start, daemon=True) for _ in range(missing)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            for w in started:
+                self._workers.append(w)
+                self._idle.put(w)
+            for err in errors[:1]:
+                log_with_time(f"Worker QGIS non démarré: {err}")
+            if not self._workers:
+                raise WorkerError("aucun worker QGIS disponible")
+            return len(self._workers)
+
+    def _discard_locked(self, w: QgisWorker) -> None:
+        if w in self._workers:
+            self._workers.remove(w)
+        # Purge la file des inactifs de ce worker
+        keep = []
+        while True:
+            try:
+                x = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if x is not w:
+                keep.append(x)
+        for x in keep:
+            self._idle.put(x)
+        w.stop(timeout=1.0)
+
+    def _acquire(self) -> QgisWorker:
+        while True:
+            try:
+                return self._idle.get(timeout=1.0)
+            except queue.Empty:
+                if not self._workers and not self._starting:
+                    raise WorkerError("aucun worker QGIS disponible")
+
+    def run(self, projects: List[str], cfg: Dict,
+            on_event: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Exporte `projects` sur le premier worker libre et retourne l'évènement "done"."""
+        return self.call({"cmd": "export", "projects": list(projects), "cfg": cfg}, cfg, on_event)
+
+    def call(self, msg: Dict, cfg: Dict,
+             on_event: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """Exécute un job quelconque (`QgisWorker.request`) sur le premier worker libre.
+
+        `cfg` sert à redémarrer un worker de remplacement si celui-ci tombe
+        ou ne répond plus dans le délai (`cfg["JOB_TIMEOUT"]`). Le démarrage
+        (jusqu'à `INIT_TIMEOUT`) se fait hors verrou : les autres jobs
+        continuent sur les workers restants.
+        """
+        w = self._acquire()
+        try:
+            res = w.request(msg, on_event, float(cfg.get("JOB_TIMEOUT", JOB_TIMEOUT)))
+        except WorkerError:
+            if w.alive:
+                # Erreur propre au job : le worker reste utilisable
+                self._idle.put(w)
+                raise
+            self._replace(w, cfg)
+            raise
+        self._idle.put(w)
+        return res
+
+    def _replace(self, w: QgisWorker, cfg: Dict) -> None:
+        with self._lock:
+            if w not in self._workers:
+                w.stop(timeout=1.0)
+                return
+            self._workers.remove(w)
+            self._starting += 1
+            key = self._key
+        w.stop(timeout=1.0)
+        repl = None
+        try:
+            repl = QgisWorker(cfg)
+        except Exception as e:
+            log_with_time(f"Remplacement du worker impossible: {e}")
+        with self._lock:
+            self._starting -= 1
+            if repl is None:
+                return
+            if self._key != key:
+                # Pool réinitialisé pendant le démarrage
+                repl.stop(timeout=1.0)
+                return
+            self._workers.append(repl)
+            self._idle.put(repl)
+
+    def _shutdown_locked(self) -> None:
+        for w in self._workers:
+            w.stop()
+        self._workers = []
+        self._idle = queue.Queue()
+        self._key = None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._shutdown_locked()
+
+
+_POOL: Optional[QgisWorkerPool] = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_worker_pool() -> QgisWorkerPool:
+    """Pool partagé par toute la session de l'application."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = QgisWorkerPool()
+        return _POOL
+
+
+def shutdown_worker_pool() -> None:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown()
+            _POOL = None
@@ -2,14 +2,28 @@
 """Worker QGIS isolé pour l'export des cartes."""
 import os
 import sys
+import json
+import contextlib
+import time
+import hashlib
 import datetime
-from typing import List, Dict, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Préfixe des messages structurés échangés avec le processus parent (mode --serve).
+# Les autres lignes de stdout sont de simples logs.
+EVENT_PREFIX = "@@"
 
 
 def log_with_time(msg: str) -> None:
     print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}")
 
 
+def emit_event(evt: Dict) -> None:
+    """Écrit un message structuré (une ligne JSON) à destination du parent."""
+    sys.stdout.write(EVENT_PREFIX + json.dumps(evt) + "\n")
+    sys.stdout.flush()
+
+
 def to_long_unc(path: str) -> str:
     if path.startswith("\\\\?\\"):
         return path
@@ -33,6 +47,9 @@ def _prepare_qgis_env(cfg: Dict) -> str:
     os.environ.setdefault("GDAL_DATA", os.path.join(cfg["QGIS_ROOT"], "share", "gdal"))
     os.environ.setdefault("PROJ_LIB", os.path.join(cfg["QGIS_ROOT"], "share", "proj"))
     os.environ.setdefault("QT_QPA_FONTDIR", r"C:\Windows\Fonts")
+    if cfg.get("RENDER_CACHE", True):
+        # Cache de blocs raster GDAL (Mo) partagé par tous les rendus du worker
+        os.environ.setdefault("GDAL_CACHEMAX", str(int(cfg.get("GDAL_CACHEMAX_MB", 1024))))
 
     qt_base = None
     for name in ("Qt6", "Qt5"):
@@ -112,17 +129,8 @@ def extent_in_project_crs(prj, lyr):
     return ext
 
 
-def apply_extent_and_export(layout, lyr_extent, out_png: str, cfg: Dict) -> bool:
-    from qgis.core import QgsLayoutItemMap, QgsLayoutExporter
-    maps = [it for it in layout.items() if isinstance(it, QgsLayoutItemMap)]
-    if not maps:
-        return False
-    for m in maps:
-        size = m.sizeWithUnits()
-        target_ratio = max(1e-9, float(size.width()) / float(size.height()))
-        adj_extent = adjust_extent_to_item_ratio(lyr_extent, target_ratio, cfg["MARGIN_FAC"])
-        m.setExtent(adj_extent)
-        m.refresh()
+def image_export_settings(cfg: Dict):
+    from qgis.core import QgsLayoutExporter
     img = QgsLayoutExporter.ImageExportSettings()
     img.dpi = cfg["DPI"]
     for attr in ("antialiasing", "antiAliasing"):
@@ -139,11 +147,117 @@ def apply_extent_and_export(layout, lyr_extent, out_png: str, cfg: Dict) -> bool
         pass
     if hasattr(img, "generateWorldFile"):
         img.generateWorldFile = False
-    exp = QgsLayoutExporter(layout)
+    return img
+
+
+def frame_maps(layout, lyr_extent, cfg: Dict) -> bool:
+    """Cadre toutes les cartes de la mise en page sur l'emprise (marge comprise)."""
+    from qgis.core import QgsLayoutItemMap
+    maps = [it for it in layout.items() if isinstance(it, QgsLayoutItemMap)]
+    if not maps:
+        return False
+    for m in maps:
+        size = m.sizeWithUnits()
+        target_ratio = max(1e-9, float(size.width()) / float(size.height()))
+        adj_extent = adjust_extent_to_item_ratio(lyr_extent, target_ratio, cfg["MARGIN_FAC"])
+        m.setExtent(adj_extent)
+        m.refresh()
+    return True
+
+
+def apply_extent_and_export(layout, lyr_extent, out_png: str, cfg: Dict,
+                            img=None, exp=None) -> bool:
+    """Cadre les cartes de la mise en page sur l'emprise puis exporte en PNG.
+
+    `img` (réglages d'export) et `exp` (exporteur) peuvent être partagés entre
+    plusieurs vues d'une même mise en page.
+    """
+    if not frame_maps(layout, lyr_extent, cfg):
+        return False
+    return export_image(layout, out_png, cfg, img, exp)
+
+
+def export_image(layout, out_png: str, cfg: Dict, img=None, exp=None) -> bool:
+    """Exporte la première page de la mise en page (déjà cadrée) en PNG."""
+    from qgis.core import QgsLayoutExporter
+    if img is None:
+        img = image_export_settings(cfg)
+    if exp is None:
+        exp = QgsLayoutExporter(layout)
     res = exp.exportToImage(out_png, img)
     return res == QgsLayoutExporter.Success
 
 
+def enable_render_cache(cfg: Dict) -> None:
+    """Active les caches réseau et raster du worker (option `RENDER_CACHE`).
+
+    Seuls les fonds de plan en ligne et les rasters en profitent : aucun rendu
+    n'est réutilisé entre les vues AE et ZE, les couches vecteur sont
+    redessinées pour chaque emprise. Gain mesurable avec
+    ``scripts/bench_export.py --compare-render-cache``.
+
+    - cache disque réseau de QGIS : les tuiles WMS/WMTS/XYZ des fonds de plan
+      téléchargées pour la vue AE sont resservies pour la vue ZE (et pour les
+      projets suivants du même worker) ;
+    - cache de blocs GDAL (`GDAL_CACHEMAX`, fixé avant l'init de QGIS dans
+      `_prepare_qgis_env`) : les rasters locaux décodés restent en mémoire.
+    """
+    try:
+        from qgis.core import QgsNetworkAccessManager
+        cache_dir = cfg.get("RENDER_CACHE_DIR") or os.path.join(
+            os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "qgis_network")
+        os.makedirs(cache_dir, exist_ok=True)
+        cache = QgsNetworkAccessManager.instance().cache()
+        if cache is not None and hasattr(cache, "setCacheDirectory"):
+            cache.setCacheDirectory(cache_dir)
+            cache.setMaximumCacheSize(int(cfg.get("RENDER_CACHE_MB", 512)) * 1024 * 1024)
+            log_with_time(f"Cache réseau QGIS: {cache_dir}")
+    except Exception as e:
+        log_with_time(f"Cache réseau QGIS non activé: {e}")
+
+
+@contextlib.contextmanager
+def project_source_paths(source_dir: Optional[str]):
+    """Résout les chemins relatifs du projet par rapport à son dossier d'origine.
+
+    Les workers lisent une copie locale du projet (`export_inputs.sync_projects`) :
+    sans ce préprocesseur, les couches en chemin relatif ("./", "../") seraient
+    cherchées à côté de la copie et non sur le partage réseau.
+    """
+    if not source_dir:
+        yield
+        return
+    from qgis.core import QgsPathResolver
+
+    def _resolve(path: str) -> str:
+        if path.startswith(("./", "../", ".\\", "..\\")):
+            return os.path.normpath(os.path.join(source_dir, path))
+        return path
+
+    pid = QgsPathResolver.setPathPreprocessor(_resolve)
+    try:
+        yield
+    finally:
+        QgsPathResolver.removePathPreprocessor(pid)
+
+
+def study_sources(prj, cfg: Dict) -> Tuple[str, str]:
+    """Sources OGR des couches AE/ZE pour ce projet.
+
+    Utilise le GeoPackage local déjà reprojeté dans le SCR du projet
+    (`cfg["STUDY_GPKG"]`, préparé par `export_inputs.prepare_study_layers`)
+    s'il existe, sinon les shapefiles d'origine.
+    """
+    try:
+        gpkg = (cfg.get("STUDY_GPKG") or {}).get(prj.crs().authid())
+    except Exception:
+        gpkg = None
+    if gpkg and os.path.isfile(gpkg):
+        return (f"{gpkg}|layername={cfg.get('GPKG_LAYER_AE', 'aire_etude_elargie')}",
+                f"{gpkg}|layername={cfg.get('GPKG_LAYER_ZE', 'zone_etude')}")
+    return cfg["AE_SHP"], cfg["ZE_SHP"]
+
+
 def relink_layer(prj, layer_name: str, shp_path: str):
     layers = prj.mapLayersByName(layer_name)
     if not layers:
@@ -156,91 +270,455 @@ def relink_layer(prj, layer_name: str, shp_path: str):
         return None
 
 
-def export_views(projet_path: str, cfg: Dict) -> Tuple[int, int]:
-    from qgis.core import QgsProject
-    okc = 0
-    koc = 0
-    nom = os.path.splitext(os.path.basename(projet_path))[0]
-    out_ae = os.path.join(cfg["EXPORT_DIR"], f"{nom}__AE.png")
-    out_ze = os.path.join(cfg["EXPORT_DIR"], f"{nom}__ZE.png")
-    out_proj = os.path.join(cfg["EXPORT_DIR"], f"{nom}{os.path.splitext(projet_path)[1]}")
+# ---------- Manifeste des exports (cache par empreinte des entrées) ----------
+
+MANIFEST_NAME = ".export_manifest.json"
+_DIGEST_CACHE: Dict[Tuple[str, int, int], str] = {}
+_SHP_SIDECARS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 du contenu d'un fichier, mémorisé par (chemin, taille, mtime)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ""
+    key = (os.path.normcase(os.path.abspath(path)), st.st_size, st.st_mtime_ns)
+    digest = _DIGEST_CACHE.get(key)
+    if digest is None:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = _DIGEST_CACHE[key] = h.hexdigest()
+    return digest
+
+
+def shapefile_digest(shp_path: str) -> str:
+    """Empreinte d'un shapefile et de ses fichiers annexes (.dbf, .prj…)."""
+    stem = os.path.splitext(shp_path or "")[0]
+    h = hashlib.sha1()
+    for ext in _SHP_SIDECARS:
+        h.update(ext.encode("ascii"))
+        h.update(file_digest(stem + ext).encode("ascii"))
+    return h.hexdigest()
+
+
+def output_fingerprint(projet_path: str, cfg: Dict, view: str) -> str:
+    """Empreinte des entrées d'une sortie : projet, couches AE/ZE et réglages."""
+    parts = {
+        "view": view,
+        "project": file_digest(projet_path),
+        "ae": shapefile_digest(cfg["AE_SHP"]),
+        "ze": shapefile_digest(cfg["ZE_SHP"]),
+    }
+    if view == "QGS":
+        # Le projet exporté référence les chemins des couches reliées
+        parts.update(ae_path=cfg["AE_SHP"], ze_path=cfg["ZE_SHP"])
+    else:
+        parts.update(dpi=cfg["DPI"], margin=cfg["MARGIN_FAC"], mode=cfg.get("CADRAGE_MODE", "BOTH"))
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_manifest(export_dir: str) -> Dict[str, str]:
+    try:
+        with open(os.path.join(export_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
 
+def update_manifest(export_dir: str, entries: Dict[str, str], timeout: float = 10.0) -> None:
+    """Fusionne `entries` dans le manifeste (plusieurs workers écrivent en parallèle)."""
+    path = os.path.join(export_dir, MANIFEST_NAME)
+    lock = path + ".lock"
+    deadline = time.monotonic() + timeout
+    fd = None
+    while fd is None:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock) > 60:
+                    os.remove(lock)  # verrou abandonné par un worker tué
+                    continue
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                log_with_time("Manifeste d'export verrouillé, mise à jour ignorée")
+                return
+            time.sleep(0.05)
+    try:
+        data = load_manifest(export_dir)
+        data.update(entries)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp, path)
+    except Exception as e:
+        log_with_time(f"Manifeste d'export non mis à jour: {e}")
+    finally:
+        os.close(fd)
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
+
+
+def planned_outputs(projet_path: str, cfg: Dict) -> List[Tuple[str, str]]:
+    """Sorties demandées pour un projet : [(vue, chemin)], vue parmi AE, ZE, QGS."""
+    nom = os.path.splitext(os.path.basename(projet_path))[0]
     mode = cfg.get("CADRAGE_MODE", "BOTH")
-    expected_exports = 0
+    outputs = []
     if cfg.get("EXPORT_TYPE", "PNG") in ("PNG", "BOTH"):
-        expected_exports += (2 if mode == "BOTH" else 1)
+        if mode in ("AE", "BOTH"):
+            outputs.append(("AE", os.path.join(cfg["EXPORT_DIR"], f"{nom}__AE.png")))
+        if mode in ("ZE", "BOTH"):
+            outputs.append(("ZE", os.path.join(cfg["EXPORT_DIR"], f"{nom}__ZE.png")))
     if cfg.get("EXPORT_TYPE", "PNG") in ("QGS", "BOTH"):
-        expected_exports += 1
+        outputs.append(("QGS", os.path.join(cfg["EXPORT_DIR"], f"{nom}{os.path.splitext(projet_path)[1]}")))
+    return outputs
 
-    prj = QgsProject.instance()
+
+def is_up_to_date(manifest: Dict[str, str], out: str, key: str, cfg: Dict) -> bool:
+    """Sortie existante dont l'empreinte des entrées n'a pas changé.
+
+    L'empreinte ne couvre que le projet et les couches AE/ZE, pas les autres
+    données référencées par le projet : "Écraser existants" (`OVERWRITE`)
+    force donc toujours un nouveau rendu, manifeste ou non.
+    """
+    if cfg["OVERWRITE"] or not os.path.exists(out):
+        return False
+    recorded = manifest.get(os.path.basename(out))
+    if recorded is not None:
+        return recorded == key
+    # Sortie antérieure au manifeste : conservée
+    return True
+
+
+def open_project(prj, projet_path: str, cfg: Dict) -> bool:
+    """Vide `prj` puis y lit le projet (repli sur le chemin long UNC)."""
     prj.clear()
+    with project_source_paths((cfg.get("PROJECT_SOURCES") or {}).get(projet_path)):
+        for pth in (projet_path, to_long_unc(projet_path)):
+            try:
+                if prj.read(pth):
+                    return True
+            except Exception:
+                pass
+    return False
 
+
+def is_rendered_view(evt: Dict) -> bool:
+    """Évènement d'une sortie réellement produite (ni ignorée car à jour, ni en échec)."""
+    return evt.get("type") == "view" and bool(evt.get("ok")) and not evt.get("skipped")
+
+
+def _add_time(timings: Optional[Dict[str, float]], phase: str, t0: float) -> None:
+    if timings is not None:
+        timings[phase] = round(timings.get(phase, 0.0) + time.perf_counter() - t0, 4)
+
+
+def export_views(projet_path: str, cfg: Dict,
+                 emit: Optional[Callable[[Dict], None]] = None,
+                 timings: Optional[Dict[str, float]] = None) -> Tuple[int, int]:
+    """Exporte les vues AE/ZE (PNG) et/ou le projet (QGS) d'un projet QGIS.
+
+    Une sortie n'est régénérée que si les empreintes de ses entrées (projet,
+    shapefiles AE/ZE, DPI, marge, cadrage) diffèrent de celles enregistrées
+    dans le manifeste du dossier d'export, ou si `cfg["OVERWRITE"]` est vrai ;
+    si toutes les sorties sont à jour, le projet n'est même pas ouvert.
+
+    Mode multi-sites : si `cfg["SITES"]` est une liste de surcharges
+    ({"AE_SHP", "ZE_SHP", "EXPORT_DIR", "STUDY_GPKG", "SITE"}), le projet est
+    lu une seule fois puis ses couches AE/ZE sont reliées successivement à
+    chaque site.
+
+    Si `emit` est fourni, il reçoit un évènement au début du projet (et de
+    chaque site) puis un évènement par sortie produite ou ignorée :
+    {"type": "view", "project", "view": "AE"|"ZE"|"QGS", "ok", "skipped",
+    "duration"} ; la clé "site" est ajoutée en mode multi-sites.
+
+    Si `timings` est fourni, les durées (s) des phases y sont cumulées :
+    "read" (lecture du projet), "relink", "extent" (emprise + cadrage),
+    "export" (rendu PNG) et "write" (écriture QGS).
+    """
+    from qgis.core import QgsProject
+    okc = 0
+    koc = 0
+    nom = os.path.splitext(os.path.basename(projet_path))[0]
+    prj = QgsProject.instance()
+    layout = None
     opened = False
-    for pth in (projet_path, to_long_unc(projet_path)):
-        try:
-            if prj.read(pth):
-                opened = True
-                break
-        except Exception:
-            pass
-    if not opened:
-        return 0, expected_exports
 
-    lm = prj.layoutManager()
-    layouts = lm.layouts()
-    if not layouts:
-        prj.clear()
-        return 0, expected_exports
-    layout = layouts[0]
+    for site in cfg.get("SITES") or [{}]:
+        site_cfg = dict(cfg, **site)
+        label = {"site": site["SITE"]} if site.get("SITE") else {}
 
-    lyr_ae = relink_layer(prj, cfg["LAYER_AE_NAME"], cfg["AE_SHP"])
-    lyr_ze = relink_layer(prj, cfg["LAYER_ZE_NAME"], cfg["ZE_SHP"])
+        def _report(view: str, t0: float, ok: bool, skipped: bool = False) -> None:
+            if emit:
+                emit(dict({
+                    "type": "view", "project": nom, "view": view, "ok": ok, "skipped": skipped,
+                    "duration": round(time.perf_counter() - t0, 3),
+                }, **label))
 
-    if cfg.get("EXPORT_TYPE", "PNG") in ("PNG", "BOTH"):
-        if mode in ("AE", "BOTH"):
-            if (not cfg["OVERWRITE"]) and os.path.exists(out_ae):
+        if emit:
+            emit(dict({"type": "start", "project": nom}, **label))
+
+        # Sorties attendues et empreintes de leurs entrées
+        outputs = planned_outputs(projet_path, site_cfg)
+        manifest = load_manifest(site_cfg["EXPORT_DIR"])
+        keys = {view: output_fingerprint(projet_path, site_cfg, view) for view, _ in outputs}
+
+        todo = []
+        for view, out in outputs:
+            if is_up_to_date(manifest, out, keys[view], site_cfg):
                 okc += 1
+                _report(view, time.perf_counter(), True, skipped=True)
             else:
-                if lyr_ae:
-                    ext_ae = extent_in_project_crs(prj, lyr_ae)
-                    if ext_ae and apply_extent_and_export(layout, ext_ae, out_ae, cfg):
-                        okc += 1
-                    else:
-                        koc += 1
-                else:
-                    koc += 1
-        if mode in ("ZE", "BOTH"):
-            if (not cfg["OVERWRITE"]) and os.path.exists(out_ze):
+                todo.append((view, out))
+        if not todo:
+            continue
+
+        if not opened:
+            _TILE_STATE.clear()
+            t0 = time.perf_counter()
+            if not open_project(prj, projet_path, cfg):
+                koc += len(todo)
+                continue
+            opened = True
+            _add_time(timings, "read", t0)
+            layouts = prj.layoutManager().layouts()
+            layout = layouts[0] if layouts else None
+        if layout is None:
+            koc += len(todo)
+            continue
+
+        t0 = time.perf_counter()
+        src_ae, src_ze = study_sources(prj, site_cfg)
+        lyr_ae = relink_layer(prj, site_cfg["LAYER_AE_NAME"], src_ae)
+        lyr_ze = relink_layer(prj, site_cfg["LAYER_ZE_NAME"], src_ze)
+        layers = {"AE": lyr_ae, "ZE": lyr_ze}
+        _add_time(timings, "relink", t0)
+        done: Dict[str, str] = {}
+
+        views = [(view, out) for view, out in todo if view != "QGS"]
+        # Réglages et exporteur construits une fois pour les vues de la même
+        # mise en page (construction d'objets seulement, indépendant de RENDER_CACHE)
+        img = exp = None
+        if len(views) > 1:
+            from qgis.core import QgsLayoutExporter
+            img = image_export_settings(site_cfg)
+            exp = QgsLayoutExporter(layout)
+        for view, out_png in views:
+            t0 = time.perf_counter()
+            ok = False
+            lyr = layers[view]
+            if lyr:
+                t1 = time.perf_counter()
+                ext = extent_in_project_crs(prj, lyr)
+                framed = bool(ext and frame_maps(layout, ext, site_cfg))
+                _add_time(timings, "extent", t1)
+                if framed:
+                    t1 = time.perf_counter()
+                    ok = export_image(layout, out_png, site_cfg, img, exp)
+                    _add_time(timings, "export", t1)
+            if ok:
                 okc += 1
+                done[os.path.basename(out_png)] = keys[view]
             else:
-                if lyr_ze:
-                    ext_ze = extent_in_project_crs(prj, lyr_ze)
-                    if ext_ze and apply_extent_and_export(layout, ext_ze, out_ze, cfg):
-                        okc += 1
-                    else:
-                        koc += 1
-                else:
-                    koc += 1
-
-    if cfg.get("EXPORT_TYPE", "PNG") in ("QGS", "BOTH"):
-        if (not cfg["OVERWRITE"]) and os.path.exists(out_proj):
-            okc += 1
-        else:
+                koc += 1
+            _report(view, t0, ok)
+
+        if any(view == "QGS" for view, _ in todo):
+            t0 = time.perf_counter()
+            if src_ae != site_cfg["AE_SHP"]:
+                # Le projet exporté doit pointer vers les shapefiles de l'utilisateur,
+                # pas vers le GeoPackage de travail
+                relink_layer(prj, site_cfg["LAYER_AE_NAME"], site_cfg["AE_SHP"])
+                relink_layer(prj, site_cfg["LAYER_ZE_NAME"], site_cfg["ZE_SHP"])
+            out_proj = dict(todo)["QGS"]
             try:
-                if prj.write(out_proj):
-                    okc += 1
-                else:
-                    koc += 1
+                ok = bool(prj.write(out_proj))
             except Exception:
+                ok = False
+            _add_time(timings, "write", t0)
+            if ok:
+                okc += 1
+                done[os.path.basename(out_proj)] = keys["QGS"]
+            else:
                 koc += 1
+            _report("QGS", t0, ok)
 
-    prj.clear()
+        if done:
+            update_manifest(site_cfg["EXPORT_DIR"], done)
+
+    if opened:
+        prj.clear()
     return okc, koc
 
 
-def worker_run(args: Tuple[List[str], Dict]) -> Tuple[int, int]:
-    projects, cfg = args
-    log_with_time(f"Worker start: {len(projects)} projets")
+# ---------- Rendu en bandes (DPI élevé) ----------
+
+# Projet et vue actuellement chargés pour le rendu en bandes : les bandes
+# successives d'une même vue reçues par ce worker ne relisent pas le projet.
+_TILE_STATE: Dict = {}
+
+
+def _load_view_for_tiles(projet_path: str, view: str, cfg: Dict):
+    from qgis.core import QgsProject
+    key = json.dumps([projet_path, view, cfg["AE_SHP"], cfg["ZE_SHP"], cfg["MARGIN_FAC"],
+                      cfg.get("STUDY_GPKG") or {}], sort_keys=True)
+    if _TILE_STATE.get("key") == key:
+        return _TILE_STATE["layout"]
+    _TILE_STATE.clear()
+    prj = QgsProject.instance()
+    if not open_project(prj, projet_path, cfg):
+        raise RuntimeError(f"projet illisible: {projet_path}")
+    layouts = prj.layoutManager().layouts()
+    if not layouts:
+        raise RuntimeError(f"aucune mise en page: {projet_path}")
+    layout = layouts[0]
+    src_ae, src_ze = study_sources(prj, cfg)
+    lyr = {
+        "AE": relink_layer(prj, cfg["LAYER_AE_NAME"], src_ae),
+        "ZE": relink_layer(prj, cfg["LAYER_ZE_NAME"], src_ze),
+    }[view]
+    ext = extent_in_project_crs(prj, lyr) if lyr else None
+    if not ext or not frame_maps(layout, ext, cfg):
+        raise RuntimeError(f"cadrage impossible ({view}): {projet_path}")
+    _TILE_STATE.update(key=key, layout=layout)
+    return layout
+
+
+def _page_geometry(layout, dpi: int):
+    """Rectangle de la première page (unités de mise en page) et sa taille en pixels."""
+    from qgis.core import QgsUnitTypes
+    from qgis.PyQt.QtCore import QRectF
+    page = layout.pageCollection().page(0)
+    rect = QRectF(page.pos().x(), page.pos().y(), page.rect().width(), page.rect().height())
+    mm_w = layout.convertFromLayoutUnits(rect.width(), QgsUnitTypes.LayoutMillimeters).length()
+    mm_h = layout.convertFromLayoutUnits(rect.height(), QgsUnitTypes.LayoutMillimeters).length()
+    return rect, int(round(mm_w * dpi / 25.4)), int(round(mm_h * dpi / 25.4))
+
+
+# Débord (mm) des cartes rognées au-delà de la bande : cadres, grilles et
+# annotations dessinés sur les bords rognés tombent hors de la bande gardée.
+TILE_OVERLAP_MM = 20.0
+
+
+def _linked_maps(maps) -> set:
+    """Cartes dont l'emprise est reprise par l'aperçu d'une autre carte."""
+    linked = set()
+    for m in maps:
+        try:
+            for ov in m.overviews().asList():
+                if ov.enabled() and ov.linkedMap() is not None:
+                    linked.add(id(ov.linkedMap()))
+        except Exception:
+            pass
+    return linked
+
+
+@contextlib.contextmanager
+def clip_maps_to_region(layout, top: float, bottom: float, overlap_mm: float = TILE_OVERLAP_MM):
+    """Réduit temporairement chaque carte à la partie utile pour la bande [top, bottom].
+
+    La carte garde sa largeur et son échelle : sa hauteur est ramenée à
+    l'intersection avec la bande (plus `overlap_mm` de chaque côté) et son
+    emprise à la portion correspondante. Seules les entités de cette portion
+    sont rendues, et l'image intermédiaire de la carte suit la taille de la
+    bande. Les cartes tournées et celles suivies par l'aperçu d'une autre
+    carte restent entières. Les cartes sont restaurées à la sortie.
+    """
+    from qgis.core import QgsLayoutItemMap, QgsLayoutMeasurement, QgsRectangle, QgsUnitTypes
+    from qgis.PyQt.QtCore import QRectF
+    margin = layout.convertToLayoutUnits(
+        QgsLayoutMeasurement(float(overlap_mm), QgsUnitTypes.LayoutMillimeters))
+    maps = [it for it in layout.items() if isinstance(it, QgsLayoutItemMap)]
+    linked = _linked_maps(maps)
+    saved = []
+    try:
+        for m in maps:
+            if id(m) in linked or m.itemRotation() or m.mapRotation():
+                continue
+            x, y = m.pos().x(), m.pos().y()
+            w, h = m.rect().width(), m.rect().height()
+            y0, y1 = max(y, top - margin), min(y + h, bottom + margin)
+            if h <= 0 or y1 <= y0 or (y0 <= y and y1 >= y + h):
+                continue
+            ext = QgsRectangle(m.extent())
+            saved.append((m, QRectF(x, y, w, h), ext))
+            ymax = ext.yMaximum() - ext.height() * (y0 - y) / h
+            ymin = ext.yMaximum() - ext.height() * (y1 - y) / h
+            m.attemptSetSceneRect(QRectF(x, y0, w, y1 - y0))
+            m.setExtent(QgsRectangle(ext.xMinimum(), ymin, ext.xMaximum(), ymax))
+        yield
+    finally:
+        for m, rect, ext in reversed(saved):
+            m.attemptSetSceneRect(rect)
+            m.setExtent(ext)
+
+
+def plan_tiles(projet_path: str, view: str, cfg: Dict) -> Dict:
+    """Taille en pixels de la vue exportée (cadrage appliqué)."""
+    layout = _load_view_for_tiles(projet_path, view, cfg)
+    _, width, height = _page_geometry(layout, cfg["DPI"])
+    return {"width": width, "height": height}
+
+
+def render_tile(projet_path: str, view: str, index: int, count: int,
+                out_part: str, cfg: Dict) -> Dict:
+    """Rend la bande `index` / `count` de la vue et l'écrit compressée dans `out_part`.
+
+    La bande (pleine largeur) est écrite sous forme de flux deflate brut des
+    lignes PNG filtrées (octet de filtre 0 + RGBA) : le processus parent
+    n'a plus qu'à concaténer les bandes dans l'IDAT du PNG final
+    (voir `tiled_export.assemble_png`). Les cartes sont réduites à la
+    portion de la bande (`clip_maps_to_region`) : rendu et mémoire du
+    worker sont proportionnels à la bande, pas à la page.
+    """
+    import zlib
+    from qgis.core import QgsLayoutExporter, QgsLayoutRenderContext
+    from qgis.PyQt.QtCore import QRectF, QSize
+    from qgis.PyQt.QtGui import QImage
+    layout = _load_view_for_tiles(projet_path, view, cfg)
+    rect, width, height = _page_geometry(layout, cfg["DPI"])
+    r0 = height * index // count
+    r1 = height * (index + 1) // count
+    rows = r1 - r0
+    ctx = layout.renderContext()
+    for name in ("FlagAntialiasing", "FlagUseAdvancedEffects"):
+        try:
+            ctx.setFlag(getattr(QgsLayoutRenderContext, name), True)
+        except Exception:
+            pass
+    region = QRectF(rect.x(), rect.y() + rect.height() * r0 / height,
+                    rect.width(), rect.height() * rows / height)
+    with clip_maps_to_region(layout, region.top(), region.bottom(),
+                             float(cfg.get("TILE_OVERLAP_MM", TILE_OVERLAP_MM))):
+        image = QgsLayoutExporter(layout).renderRegionToImage(region, QSize(width, rows), cfg["DPI"])
+    image = image.convertToFormat(QImage.Format_RGBA8888)
+    bpl = image.bytesPerLine()
+    ptr = image.constBits()
+    ptr.setsize(bpl * rows)
+    buf = memoryview(ptr)
+    comp = zlib.compressobj(int(cfg.get("PNG_LEVEL", 6)), zlib.DEFLATED, -15)
+    adler = 1
+    length = 0
+    with open(out_part, "wb") as f:
+        for y in range(rows):
+            line = b"\x00" + bytes(buf[y * bpl:y * bpl + width * 4])
+            adler = zlib.adler32(line, adler)
+            length += len(line)
+            f.write(comp.compress(line))
+        f.write(comp.flush(zlib.Z_FINISH if index == count - 1 else zlib.Z_SYNC_FLUSH))
+    return {"width": width, "height": height, "rows": rows, "adler": adler, "length": length}
+
+
+def init_qgis(cfg: Dict):
+    """Prépare l'environnement, importe PyQGIS et démarre une QgsApplication."""
     qt_base = _prepare_qgis_env(cfg)
 
     global QgsApplication, QgsProject, QgsLayoutExporter, QgsLayoutItemMap, QgsRectangle, QgsCoordinateTransform
@@ -252,17 +730,121 @@ def worker_run(args: Tuple[List[str], Dict]) -> Tuple[int, int]:
 
     qgs = QgsApplication([], False)
     qgs.initQgis()
+    if cfg.get("RENDER_CACHE", True):
+        enable_render_cache(cfg)
+    return qgs
+
+
+def export_projects(projects: List[str], cfg: Dict,
+                    emit: Optional[Callable[[Dict], None]] = None,
+                    timings: Optional[Dict[str, float]] = None) -> Tuple[int, int]:
+    ok = 0
+    ko = 0
+    for path in projects:
+        try:
+            ok_c, ko_c = export_views(path, cfg, emit, timings)
+            ok += ok_c
+            ko += ko_c
+        except Exception:
+            ko += 1
+    return ok, ko
+
+
+def worker_run(args: Tuple[List[str], Dict]) -> Tuple[int, int]:
+    projects, cfg = args
+    log_with_time(f"Worker start: {len(projects)} projets")
+    qgs = init_qgis(cfg)
     try:
-        ok = 0
-        ko = 0
-        for path in projects:
-            try:
-                ok_c, ko_c = export_views(path, cfg)
-                ok += ok_c
-                ko += ko_c
-            except Exception:
-                ko += 1
+        ok, ko = export_projects(projects, cfg, emit_event)
         log_with_time(f"Export OK/KO: {ok}/{ko}")
         return ok, ko
     finally:
         qgs.exitQgis()
+
+
+def worker_serve(stdin=None) -> int:
+    """Boucle d'un worker persistant : QGIS est initialisé une seule fois.
+
+    Protocole (une ligne JSON par message sur stdin) :
+    - {"cmd": "init", "cfg": {...}} : premier message, démarre QGIS ;
+    - {"cmd": "export", "id": ..., "projects": [...], "cfg": {...}} ;
+    - {"cmd": "plan", "id", "project", "view", "cfg"} : taille en pixels de la vue ;
+    - {"cmd": "tile", "id", "project", "view", "index", "count", "out", "cfg"} :
+      rendu d'une bande (voir `render_tile`) ;
+    - {"cmd": "stop"} : termine le worker.
+    Les réponses sont émises sur stdout via `emit_event` :
+    {"type": "ready", "init"} après l'init, les évènements de progression de
+    `export_views` (marqués de l'id du job) puis {"type": "done", "id", "ok",
+    "ko", "rendered", "duration", "timings"} à la fin de chaque job ("rendered" :
+    sorties réellement produites, hors sorties à jour ignorées) (résultat de `plan_tiles` /
+    `render_tile` pour les jobs de rendu en bandes).
+    """
+    stdin = stdin or sys.stdin
+    qgs = None
+    base_cfg: Dict = {}
+    try:
+        for line in stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                emit_event({"type": "error", "error": f"message invalide: {line[:200]}"})
+                continue
+            cmd = msg.get("cmd")
+            if cmd == "stop":
+                break
+            if cmd == "init":
+                t0 = time.perf_counter()
+                if qgs is None:
+                    base_cfg = dict(msg.get("cfg") or {})
+                    qgs = init_qgis(base_cfg)
+                emit_event({"type": "ready", "pid": os.getpid(), "init": round(time.perf_counter() - t0, 3)})
+            elif cmd == "export":
+                if qgs is None:
+                    emit_event({"type": "error", "id": msg.get("id"), "error": "QGIS non initialisé"})
+                    continue
+                cfg = dict(base_cfg)
+                cfg.update(msg.get("cfg") or {})
+                projects = msg.get("projects") or []
+                job_id = msg.get("id")
+                t0 = time.perf_counter()
+                timings: Dict[str, float] = {}
+                rendered = [0]
+
+                def _emit(evt: Dict) -> None:
+                    if is_rendered_view(evt):
+                        rendered[0] += 1
+                    emit_event(dict(evt, id=job_id))
+
+                ok, ko = export_projects(projects, cfg, _emit, timings)
+                emit_event({
+                    "type": "done", "id": job_id, "ok": ok, "ko": ko, "rendered": rendered[0],
+                    "duration": round(time.perf_counter() - t0, 3), "timings": timings,
+                })
+            elif cmd in ("plan", "tile"):
+                job_id = msg.get("id")
+                if qgs is None:
+                    emit_event({"type": "error", "id": job_id, "error": "QGIS non initialisé"})
+                    continue
+                cfg = dict(base_cfg)
+                cfg.update(msg.get("cfg") or {})
+                t0 = time.perf_counter()
+                try:
+                    if cmd == "plan":
+                        res = plan_tiles(msg["project"], msg["view"], cfg)
+                    else:
+                        res = render_tile(msg["project"], msg["view"], int(msg["index"]),
+                                          int(msg["count"]), msg["out"], cfg)
+                except Exception as e:
+                    _TILE_STATE.clear()
+                    emit_event({"type": "error", "id": job_id, "error": f"{cmd}: {e}"})
+                    continue
+                emit_event(dict(res, type="done", id=job_id, duration=round(time.perf_counter() - t0, 3)))
+            else:
+                emit_event({"type": "error", "id": msg.get("id"), "error": f"commande inconnue: {cmd}"})
+        return 0
+    finally:
+        if qgs is not None:
+            qgs.exitQgis()
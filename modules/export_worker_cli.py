@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 """CLI pour lancer le worker QGIS dans un sous-processus QGIS Python.
 
-Usage: python -m modules.export_worker_cli <input.json>
-L'input JSON doit contenir: {"projects": [...], "cfg": {...}}
-Sortie: imprime "OK,KO" sur stdout et un log minimal sur stderr en cas d'erreur.
+Usage:
+    python -m modules.export_worker_cli <input.json>
+        L'input JSON doit contenir: {"projects": [...], "cfg": {...}}
+        Sortie: imprime "OK,KO" sur stdout et un log minimal sur stderr en cas d'erreur.
+
+    python -m modules.export_worker_cli --serve
+        Worker persistant: QGIS est démarré une fois puis les jobs sont lus
+        sur stdin, une ligne JSON par job (voir `export_worker.worker_serve`).
 """
 from __future__ import annotations
 import sys
@@ -13,8 +18,20 @@ import traceback
 
 def main(argv: list[str]) -> int:
     if len(argv) < 2:
-        print("Usage: python -m modules.export_worker_cli <input.json>", file=sys.stderr)
+        print("Usage: python -m modules.export_worker_cli <input.json> | --serve", file=sys.stderr)
         return 2
+    if argv[1] == "--serve":
+        try:
+            for stream in (sys.stdin, sys.stdout):
+                try:
+                    stream.reconfigure(encoding="utf-8")
+                except Exception:
+                    pass
+            from .export_worker import worker_serve
+            return worker_serve()
+        except Exception:
+            traceback.print_exc()
+            return 1
     in_path = argv[1]
     try:
         with open(in_path, "r", encoding="utf-8") as f:
@@ -34,4 +51,3 @@ def main(argv: list[str]) -> int:
 
 if __name__ == "__main__":
     raise SystemExit(main(sys.argv))
-
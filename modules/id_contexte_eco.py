@@ -4,11 +4,22 @@ r"""
 Script d'identification des zonages (extrait de l'onglet "ID contexte éco").
 Les chemins des shapefiles de référence ne sont plus codés en dur :
 ils sont fournis par l'interface graphique principale.
+Les couches de zonage interrogées sont décrites dans le registre
+`Bases de données/zonages_id.json` (voir `zonage_registry`).
 """
 
+import io
 import os
+import re
 import sys
+import json
+import atexit
+import argparse
+import hashlib
 import datetime
+import threading
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Configuration des variables d'environnement pour PROJ et GDAL
 qgis_base = r"C:\Program Files\QGIS 3.40.3"
@@ -21,11 +32,36 @@ print(f"GDAL_DATA défini à: {os.environ['GDAL_DATA']}")
 
 # Maintenant importer les autres modules
 import geopandas as gpd
+import numpy as np
 import pandas as pd
-import math
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Border, Side, Alignment, NamedStyle
 from openpyxl.utils import get_column_letter
 
+try:
+    from .zonage_store import (
+        load_store_index, read_zonage, source_signature, source_size,
+        LAYER_CACHE_MAX_BYTES, set_layer_cache_budget,
+    )
+    from .zonage_registry import load_couches, default_name_attributes
+    from .export_inputs import load_sites_csv, safe_site_name, unique_site_name
+except Exception:
+    try:
+        from modules.zonage_store import (
+            load_store_index, read_zonage, source_signature, source_size,
+            LAYER_CACHE_MAX_BYTES, set_layer_cache_budget,
+        )
+        from modules.zonage_registry import load_couches, default_name_attributes
+        from modules.export_inputs import load_sites_csv, safe_site_name, unique_site_name
+    except Exception:
+        from zonage_store import (
+            load_store_index, read_zonage, source_signature, source_size,
+            LAYER_CACHE_MAX_BYTES, set_layer_cache_budget,
+        )
+        from zonage_registry import load_couches, default_name_attributes
+        from export_inputs import load_sites_csv, safe_site_name, unique_site_name
+
 
 def log_with_time(message):
     """Affiche un message avec un horodatage"""
@@ -33,23 +69,687 @@ def log_with_time(message):
     print(f"[{now}] {message}")
 
 
-def run_analysis(ae_shp: str, ze_shp: str, buffer_km: float = 5.0):
-    """Lance l'analyse d'identification des zonages à partir des shapefiles.
+# Utiliser EPSG:2154 (RGF93 / Lambert-93) pour la France
+CRS_PROJECTED = "EPSG:2154"
 
-    :param ae_shp: chemin vers la couche "Aire d'étude élargie"
-    :param ze_shp: chemin vers la couche "Zone d'étude"
-    :param buffer_km: distance du tampon autour de la ZE en kilomètres
+SYNTHESIS_SHEET = 'SYNTHÈSE'
+SYNTHESIS_HEADERS = ['Type de zonage', "Distance à la zone d'étude", 'Nom du site', '', 'CODES']
+
+
+# Directions par secteurs de 45° centrés sur les points cardinaux
+DIRECTIONS = np.array(['Nord', 'Nord-est', 'Est', 'Sud-est', 'Sud', 'Sud-ouest', 'Ouest', 'Nord-ouest'])
+
+
+def calculate_azimuths(points, origin):
     """
-    log_with_time("Démarrage du script d'identification des zonages...")
+    Calcule l'azimut en degrés de chaque point vu depuis `origin`.
+    L'azimut est mesuré dans le sens des aiguilles d'une montre à partir du Nord.
+    """
+    delta_x = points.x.to_numpy() - origin.x
+    delta_y = points.y.to_numpy() - origin.y
+    return (np.degrees(np.arctan2(delta_x, delta_y)) + 360) % 360
+
+
+def map_azimuths_to_directions(azimuths):
+    """
+    Mappe les azimuts en degrés aux 8 directions géographiques ('Inconnu' si indéfini).
+    """
+    azimuths = np.asarray(azimuths, dtype=float)
+    valid = np.isfinite(azimuths)
+    secteurs = (np.floor((np.where(valid, azimuths, 0.0) + 22.5) / 45.0).astype(int)) % 8
+    return np.where(valid, DIRECTIONS[secteurs], 'Inconnu')
+
+
+# Combine la distance et la direction avec la préposition appropriée.
+# Si la distance est égale à 0.0, retourne "Se superpose à la zone d'étude".
+def combine_distances_and_directions(distances_km, directions):
+    distances_km = pd.Series(distances_km).reset_index(drop=True)
+    directions = pd.Series(directions).reset_index(drop=True)
+    prepositions = pd.Series(np.where(directions.isin(['Est', 'Ouest']), "à l'", 'au '))
+    labels = distances_km.astype(str) + ' km ' + prepositions + directions.str.lower()
+    return np.where(distances_km.to_numpy() == 0.0, "Se superpose à la zone d'étude", labels.to_numpy())
+
+
+# Définition des styles pour le formatage Excel
+header_font = Font(name='Calibri', size=11, bold=True, color='FFFFFF')
+header_fill = PatternFill(fill_type='solid', start_color='4F81BD', end_color='4F81BD')
+title_font = Font(name='Calibri', size=12, bold=True)
+data_font = Font(name='Calibri', size=11)
+data_fill_even = PatternFill(fill_type='solid', start_color='F2F2F2', end_color='F2F2F2')
+data_fill_odd = PatternFill(fill_type='solid', start_color='FFFFFF', end_color='FFFFFF')
+border = Border(
+    left=Side(style='thin', color='000000'),
+    right=Side(style='thin', color='000000'),
+    top=Side(style='thin', color='000000'),
+    bottom=Side(style='thin', color='000000')
+)
+alignment = Alignment(horizontal='left', vertical='center', wrap_text=False)
+
+
+# Cache des entités candidates (couche ∩ AE) : une nouvelle analyse avec la
+# même AE et les mêmes couches ne refait ni la lecture ni la jointure spatiale
+CANDIDATES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'cache', 'id_contexte'))
+
+
+def reference_digest(reference_gdf):
+    """Empreinte de l'AE reprojetée (géométries et attributs, joints aux résultats)."""
+    h = hashlib.sha1()
+    h.update(repr(list(reference_gdf.columns)).encode('utf-8'))
+    h.update(str(reference_gdf.crs).encode('utf-8'))
+    for wkb in reference_gdf.geometry.to_wkb():
+        h.update(wkb or b'')
+    attributs = reference_gdf.drop(columns=reference_gdf.geometry.name)
+    if len(attributs.columns):
+        h.update(pd.util.hash_pandas_object(attributs.astype(str), index=False).values.tobytes())
+    return h.hexdigest()
+
+
+def _candidates_path(couche, ae_digest):
+    key = json.dumps([couche['chemin'], source_signature(couche['chemin']), ae_digest])
+    slug = re.sub(r'[^0-9A-Za-z]+', '_', couche['nom']).strip('_').lower()
+    return os.path.join(CANDIDATES_DIR, f"{slug}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.pkl")
+
+
+def load_candidates(couche, ae_digest):
+    path = _candidates_path(couche, ae_digest)
+    if not os.path.isfile(path):
+        return None
+    try:
+        return pd.read_pickle(path)
+    except Exception:
+        return None
+
+
+def save_candidates(couche, ae_digest, candidates_gdf):
+    try:
+        os.makedirs(CANDIDATES_DIR, exist_ok=True)
+        path = _candidates_path(couche, ae_digest)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        candidates_gdf.to_pickle(tmp)
+        os.replace(tmp, path)
+    except Exception as e:
+        log_with_time(f"Cache des candidats non enregistré pour '{couche['nom']}': {e}")
+
+
+def prune_candidates(max_age_days=30.0):
+    """Supprime les candidats d'anciennes AE non réutilisés depuis longtemps."""
+    limit = datetime.datetime.now().timestamp() - max_age_days * 86400
+    try:
+        for name in os.listdir(CANDIDATES_DIR):
+            path = os.path.join(CANDIDATES_DIR, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
+    except OSError:
+        pass
+
+
+def load_layer(couche, bbox, store_index=None):
+    """Lit une couche cible dans l'emprise `bbox` (Lambert-93) et la reprojette."""
+    nom_couche = couche['nom']
+
+    try:
+        cible_gdf, from_store = read_zonage(couche, bbox, store_index)
+        if from_store:
+            log_with_time(f"Couche '{nom_couche}' chargée depuis la base locale ({len(cible_gdf)} entités près de l'AE)")
+        else:
+            log_with_time(f"Couche '{nom_couche}' chargée ({len(cible_gdf)} entités dans l'emprise de l'AE)")
+    except Exception as e:
+        log_with_time(f"Erreur lors du chargement de la couche '{nom_couche}': {e}")
+        return None
+
+    if cible_gdf.crs != CRS_PROJECTED:
+        try:
+            cible_gdf = cible_gdf.to_crs(CRS_PROJECTED)
+            log_with_time(f"Reprojection de '{nom_couche}' effectuée")
+        except Exception as e:
+            log_with_time(f"Erreur lors de la reprojection de '{nom_couche}': {e}")
+            return None
+    return cible_gdf
+
+
+def intersecting(cible_gdf, reference_gdf):
+    """Jointure spatiale avec l'AE, limitée aux candidats de l'index spatial de la couche.
+
+    L'index de `cible_gdf` est construit une fois et réutilisé pour chaque AE
+    interrogée (plusieurs sites, couche gardée en cache).
+    """
+    if not cible_gdf.empty:
+        _, idx = cible_gdf.sindex.query(reference_gdf.geometry, predicate='intersects')
+        cible_gdf = cible_gdf.iloc[np.unique(idx)]
+    return gpd.sjoin(cible_gdf, reference_gdf, how='inner', predicate='intersects')
+
+
+def locate_candidates(nom_couche, overlapping_gdf, reference2_gdf, reference2_centroid):
+    """Ajoute distance, azimut et libellé "Distance et Direction" aux entités dans l'AE."""
+    if overlapping_gdf.empty:
+        log_with_time(f"Aucun site présent dans '{nom_couche}'.")
+        return overlapping_gdf
+
+    try:
+        # Distance de chaque entité au tampon de la ZE fusionné (shapely 2, vectorisé)
+        zone_etude = reference2_gdf.geometry.union_all()
+        distances = overlapping_gdf.geometry.distance(zone_etude)
+        distances_km = distances / 1000
+        distances_km = distances_km.round(1)
+        overlapping_gdf['Distance (km)'] = distances_km
+        log_with_time(f"Calcul des distances pour '{nom_couche}' effectué")
+    except Exception as e:
+        log_with_time(f"Erreur lors du calcul des distances pour '{nom_couche}': {e}")
+        return None
+
+    try:
+        overlapping_gdf['centroid'] = overlapping_gdf.geometry.centroid
+        azimuths = calculate_azimuths(overlapping_gdf['centroid'], reference2_centroid)
+        overlapping_gdf['Azimuth (°)'] = azimuths
+        overlapping_gdf['Azimuth'] = map_azimuths_to_directions(azimuths)
+        log_with_time(f"Calcul de l'azimut pour '{nom_couche}' effectué")
+    except Exception as e:
+        log_with_time(f"Erreur lors du calcul de l'azimut pour '{nom_couche}': {e}")
+        return None
+
+    try:
+        overlapping_gdf['Distance et Direction'] = combine_distances_and_directions(
+            overlapping_gdf['Distance (km)'], overlapping_gdf['Azimuth']
+        )
+        log_with_time(f"Combinaison distance/direction pour '{nom_couche}' effectuée")
+    except Exception as e:
+        log_with_time(f"Erreur lors de la combinaison de la distance et de la direction pour '{nom_couche}': {e}")
+        return None
+
+    return overlapping_gdf
+
+
+def make_site(reference_gdf, reference2_gdf, reference2_centroid, nom=None):
+    """Références d'un site pour `analyse_layer_sites` (AE, ZE tamponnée, centroïde)."""
+    try:
+        ae_digest = reference_digest(reference_gdf)
+    except Exception as e:
+        log_with_time(f"Empreinte de l'AE non calculée, cache des candidats ignoré : {e}")
+        ae_digest = None
+    return {'nom': nom, 'ae': reference_gdf, 'ze': reference2_gdf, 'centroid': reference2_centroid,
+            'ae_digest': ae_digest}
+
+
+# Deux groupes de sites sont lus ensemble tant que l'emprise commune ne
+# dépasse pas ce multiple de la somme de leurs emprises
+SITE_GROUP_MAX_GROWTH = 4.0
+
+
+def _bbox_area(b):
+    return max(b[2] - b[0], 0.0) * max(b[3] - b[1], 0.0)
+
+
+def _bbox_union(a, b):
+    return (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+
+
+def group_site_bboxes(bboxes, max_growth=SITE_GROUP_MAX_GROWTH):
+    """Regroupe des emprises proches : une lecture de couche par groupe.
+
+    Une emprise rejoint le groupe existant le moins agrandi, si l'emprise
+    commune reste sous `max_growth` fois la somme des emprises du groupe ;
+    sinon elle ouvre un groupe. Des sites éloignés ne forcent donc pas la
+    lecture de toute la couche nationale entre eux.
+
+    :return: [(emprise du groupe, [indices des emprises])]
+    """
+    groups = []  # [emprise, somme des surfaces, indices]
+    order = sorted(range(len(bboxes)), key=lambda i: (bboxes[i][0], bboxes[i][1]))
+    for i in order:
+        b = tuple(float(v) for v in bboxes[i])
+        best = None
+        for g in groups:
+            union = _bbox_union(g[0], b)
+            total = g[1] + _bbox_area(b)
+            if _bbox_area(union) <= max_growth * total and (best is None or _bbox_area(union) < best[1]):
+                best = (g, _bbox_area(union), union, total)
+        if best is None:
+            groups.append([b, _bbox_area(b), [i]])
+        else:
+            g, _, union, total = best
+            g[0], g[1] = union, total
+            g[2].append(i)
+    return [(g[0], sorted(g[2])) for g in groups]
+
+
+def analyse_layer_sites(couche, sites, store_index=None):
+    """Analyse une couche cible pour un ou plusieurs sites, avec une seule lecture.
+
+    Seules les entités dans l'emprise des AE sont lues (une lecture par
+    groupe de sites proches, voir `group_site_bboxes`), depuis la base
+    locale Lambert-93 (`zonage_store`) quand la couche y a été importée, sinon
+    depuis le shapefile source avec l'emprise convertie dans son SCR natif.
+    Les entités intersectant une AE sont reprises du cache quand ni l'AE ni
+    la couche n'ont changé : seuls distances et azimuts (qui dépendent de la
+    ZE et du tampon) sont alors recalculés.
+    Le résultat de chaque site (entités de la couche intersectant l'AE, avec
+    distance, azimut et libellé "Distance et Direction") alimente à la fois
+    la feuille de synthèse et l'onglet de la couche.
+
+    :return: une GeoDataFrame (éventuellement vide) par site, ou None si la
+        couche est introuvable ou en erreur.
+    """
+    nom_couche = couche['nom']
+    chemin_cible = couche['chemin']
+
+    if not os.path.exists(chemin_cible):
+        log_with_time(f"Le fichier de la couche '{nom_couche}' n'a pas été trouvé : {chemin_cible}")
+        return [None] * len(sites)
+
+    candidats = []
+    for site in sites:
+        cached = load_candidates(couche, site['ae_digest']) if site.get('ae_digest') else None
+        if cached is not None:
+            log_with_time(f"Couche '{nom_couche}' : {len(cached)} entité(s) dans l'AE reprises du cache")
+        candidats.append(cached)
+
+    manquants = [i for i, c in enumerate(candidats) if c is None]
+    groupes = group_site_bboxes([sites[i]['ae'].total_bounds for i in manquants]) if manquants else []
+    for bbox, membres in groupes:
+        cible_gdf = load_layer(couche, bbox, store_index)
+        if cible_gdf is None:
+            return [None] * len(sites)
+        for i in (manquants[k] for k in membres):
+            try:
+                candidats[i] = intersecting(cible_gdf, sites[i]['ae'])
+                log_with_time(f"Jointure spatiale pour '{nom_couche}' effectuée")
+            except Exception as e:
+                log_with_time(f"Erreur lors de la jointure spatiale pour '{nom_couche}': {e}")
+                continue
+            if sites[i].get('ae_digest'):
+                save_candidates(couche, sites[i]['ae_digest'], candidats[i])
+
+    return [
+        locate_candidates(nom_couche, overlap, site['ze'], site['centroid']) if overlap is not None else None
+        for overlap, site in zip(candidats, sites)
+    ]
+
+
+def analyse_layer(couche, reference_gdf, reference2_gdf, reference2_centroid, store_index=None, ae_digest=None):
+    """Analyse d'une couche cible pour un seul site (voir `analyse_layer_sites`)."""
+    site = {'ae': reference_gdf, 'ze': reference2_gdf, 'centroid': reference2_centroid, 'ae_digest': ae_digest}
+    return analyse_layer_sites(couche, [site], store_index)[0]
+
+
+def _analyse_layer_job(couche, sites, store_index=None):
+    """Tâche exécutée dans un processus du pool d'analyse.
+
+    Retourne les résultats sans géométries (inutiles pour l'écriture Excel et
+    coûteuses à renvoyer au processus principal) et les messages du journal,
+    réaffichés côté application.
+    """
+    logs = io.StringIO()
+    with contextlib.redirect_stdout(logs):
+        results = analyse_layer_sites(couche, sites, store_index)
+    results = [
+        pd.DataFrame(r.drop(columns=[r.geometry.name, 'centroid'], errors='ignore')) if r is not None else None
+        for r in results
+    ]
+    return results, logs.getvalue()
+
+
+# Processus d'analyse conservés d'une analyse à l'autre (démarrage des
+# interpréteurs et import de geopandas payés une seule fois par session).
+# Un exécuteur à un processus par emplacement : une couche est toujours
+# confiée au même processus, dont le cache (`zonage_store.cached_source_layer`)
+# la garde d'une analyse à l'autre.
+_POOLS = []
+_LAYER_SLOTS = {}
+_POOL_LOCK = threading.Lock()
+
+
+def default_analysis_workers():
+    return max(1, min((os.cpu_count() or 2) - 1, 6))
+
+
+def get_analysis_pools(workers):
+    global _POOLS
+    with _POOL_LOCK:
+        if _POOLS and len(_POOLS) != workers:
+            for pool in _POOLS:
+                pool.shutdown(wait=False, cancel_futures=True)
+            _POOLS = []
+        if not _POOLS:
+            # Le budget du cache de couches est partagé entre les processus
+            _POOLS = [ProcessPoolExecutor(max_workers=1, initializer=set_layer_cache_budget,
+                                          initargs=(LAYER_CACHE_MAX_BYTES // workers,))
+                      for _ in range(workers)]
+            _LAYER_SLOTS.clear()
+        return list(_POOLS)
+
+
+def layer_slots(couches, workers):
+    """Processus de chaque couche : celui de l'analyse précédente, sinon le moins chargé.
+
+    La charge est estimée par la taille des fichiers sources ; les nouvelles
+    couches sont placées de la plus lourde à la plus légère.
+    """
+    def _size(couche):
+        try:
+            return source_size(couche['chemin'])
+        except Exception:
+            return 0
+
+    sizes = [_size(c) for c in couches]
+    loads = [0] * workers
+    slots = [None] * len(couches)
+    with _POOL_LOCK:
+        for i, couche in enumerate(couches):
+            slot = _LAYER_SLOTS.get(couche['chemin'])
+            if slot is not None and slot < workers:
+                slots[i] = slot
+                loads[slot] += sizes[i]
+        for i in sorted(range(len(couches)), key=lambda k: sizes[k], reverse=True):
+            if slots[i] is None:
+                slot = min(range(workers), key=lambda w: loads[w])
+                slots[i] = slot
+                loads[slot] += sizes[i]
+                _LAYER_SLOTS[couches[i]['chemin']] = slot
+    return slots
+
+
+def shutdown_analysis_pool():
+    global _POOLS
+    with _POOL_LOCK:
+        for pool in _POOLS:
+            pool.shutdown(wait=False, cancel_futures=True)
+        _POOLS = []
+        _LAYER_SLOTS.clear()
+
+
+atexit.register(shutdown_analysis_pool)
+
+
+def analyse_sites(couches, sites, store_index=None, workers=None):
+    """Analyse toutes les couches pour tous les sites, réparties sur les processus d'analyse.
+
+    Chaque tâche traite une couche pour l'ensemble des sites (une lecture
+    par groupe de sites et un index spatial par couche) ; une couche va
+    toujours au même processus (`layer_slots`).
+
+    :return: resultats[i_couche][i_site], dans l'ordre de `couches` et `sites`.
+        En cas d'échec du pool (processus interrompu…), les couches restantes
+        sont traitées ici.
+    """
+    if workers is None:
+        workers = default_analysis_workers()
+    workers = max(1, min(int(workers), len(couches)))
+    resultats = [[None] * len(sites) for _ in couches]
+    restantes = list(range(len(couches)))
+
+    if workers > 1:
+        log_with_time(f"Analyse des couches sur {workers} processus...")
+        try:
+            pools = get_analysis_pools(workers)
+            slots = layer_slots(couches, workers)
+            futures = {
+                pools[slot].submit(_analyse_layer_job, couche, sites, store_index): i
+                for i, (couche, slot) in enumerate(zip(couches, slots))
+            }
+            for fut in as_completed(futures):
+                i = futures[fut]
+                resultats[i], logs = fut.result()
+                restantes.remove(i)
+                if logs:
+                    print(logs, end='')
+        except Exception as e:
+            log_with_time(f"Analyse parallèle interrompue ({e}) : suite des couches dans le processus principal")
+            shutdown_analysis_pool()
+
+    for i in restantes:
+        couche = couches[i]
+        log_with_time(f"Traitement de la couche {i+1}/{len(couches)}: {couche['nom']}")
+        resultats[i] = analyse_layer_sites(couche, sites, store_index)
+    return resultats
+
 
+def layer_table(couche, overlapping_gdf):
+    """Tableau de l'onglet d'une couche (lignes triées par distance).
+
+    :return: DataFrame (une ligne par entité dans l'AE) ou None si rien à écrire.
+    """
+    nom_couche = couche['nom']
+    attributs_a_exporter = couche['attributs']
+
+    if overlapping_gdf is None or overlapping_gdf.empty:
+        return None
+
+    available_columns = overlapping_gdf.columns
+    attributs_existants = []
+    colonne_mapping = {}
+
+    for attr in attributs_a_exporter:
+        found = False
+        for col in available_columns:
+            if col.lower() == attr.lower():
+                attributs_existants.append(col)
+                colonne_mapping[attr] = col
+                found = True
+                break
+        if not found:
+            log_with_time(f"L'attribut '{attr}' n'a pas été trouvé dans '{nom_couche}'.")
+
+    if not attributs_existants:
+        log_with_time(f"Aucun des attributs spécifiés n'a été trouvé dans '{nom_couche}'.")
+        log_with_time(f"Attributs disponibles dans '{nom_couche}': {available_columns.tolist()}")
+        return None
+
+    try:
+        resultats = overlapping_gdf[['Distance et Direction'] + attributs_existants].copy()
+        log_with_time(f"Extraction des attributs pour '{nom_couche}' effectuée")
+    except Exception as e:
+        log_with_time(f"Erreur lors de l'extraction des attributs dans '{nom_couche}': {e}")
+        return None
+
+    for attr, col in colonne_mapping.items():
+        resultats.rename(columns={col: attr}, inplace=True)
+
+    resultats['Distance numérique'] = overlapping_gdf['Distance (km)']
+    resultats = resultats.sort_values(by='Distance numérique', ascending=True)
+    resultats.drop(columns='Distance numérique', inplace=True)
+    resultats.insert(0, 'Nom de la couche', nom_couche)
+    colonnes_df = ['Nom de la couche', 'Distance et Direction'] + attributs_a_exporter
+
+    for col in colonnes_df:
+        if col not in resultats.columns:
+            resultats[col] = ''
+
+    return resultats[colonnes_df]
+
+
+def synthesis_rows(couche, overlapping_gdf, name_attributes=()):
+    """Lignes de la feuille de synthèse pour une couche (None si aucune).
+
+    :param name_attributes: colonnes essayées pour le "Nom du site" quand la
+        couche ne précise pas `attribut_nom` dans le registre
+    """
+    nom_couche = couche['nom']
+
+    if overlapping_gdf is None or overlapping_gdf.empty:
+        return None
+
+    agregation = couche.get('agregation')
+    if agregation:
+        return pd.DataFrame({
+            'Type de zonage': [agregation['type']],
+            'Distance à la zone d\'étude': ['/'],
+            'Nom du site': [f"{len(overlapping_gdf)} {agregation['libelle']} dans l'aire d'étude élargie"],
+            '': [''],
+            'CODES': ['']
+        })
+
+    # Recherche de l'attribut pour le nom du site en fonction de la couche
+    name_attr = couche.get('attribut_nom')
+    if not name_attr:
+        for attr in name_attributes:
+            if attr in overlapping_gdf.columns:
+                name_attr = attr
+                break
+
+    if not name_attr:
+        log_with_time(f"L'attribut 'Nom du site' est manquant pour '{nom_couche}'.")
+        return None
+
+    codes = ''
+    code_field = couche.get('attribut_code')
+    if code_field:
+        if code_field in overlapping_gdf.columns:
+            codes = overlapping_gdf[code_field].astype(str).values
+        else:
+            log_with_time(f"L'attribut '{code_field}' n'a pas été trouvé dans '{nom_couche}'.")
+
+    try:
+        temp_df = overlapping_gdf[['Distance et Direction', name_attr]].copy()
+    except Exception as e:
+        log_with_time(f"Erreur lors de l'extraction des attributs dans '{nom_couche}': {e}")
+        return None
+    temp_df['CODES'] = codes
+
+    temp_df.rename(columns={
+        'Distance et Direction': 'Distance à la zone d\'étude',
+        name_attr: 'Nom du site'
+    }, inplace=True)
+
+    temp_df.insert(0, 'Type de zonage', nom_couche)
+    temp_df.insert(3, '', '')
+    return pd.DataFrame(temp_df)
+
+
+# Styles nommés du classeur : un seul enregistrement par style, référencé
+# par chaque cellule (pas de formatage cellule par cellule après écriture)
+STYLE_TITLE = 'zonage_titre'
+STYLE_HEADER = 'zonage_entete'
+STYLE_DATA_EVEN = 'zonage_ligne_paire'
+STYLE_DATA_ODD = 'zonage_ligne_impaire'
+
+
+def register_styles(workbook):
+    workbook.add_named_style(NamedStyle(name=STYLE_TITLE, font=title_font, alignment=alignment))
+    workbook.add_named_style(NamedStyle(name=STYLE_HEADER, font=header_font, fill=header_fill,
+                                        border=border, alignment=alignment))
+    workbook.add_named_style(NamedStyle(name=STYLE_DATA_EVEN, font=data_font, fill=data_fill_even,
+                                        border=border, alignment=alignment))
+    workbook.add_named_style(NamedStyle(name=STYLE_DATA_ODD, font=data_font, fill=data_fill_odd,
+                                        border=border, alignment=alignment))
+
+
+def _cell_value(value):
+    """Valeur écrite dans la cellule (comme `DataFrame.to_excel` : NaN → vide)."""
+    if value is None:
+        return None
+    if isinstance(value, (str, bool, int)):
+        return value
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    if hasattr(value, 'item'):
+        return value.item()
+    if isinstance(value, (float, datetime.date, datetime.datetime)):
+        return value
+    return str(value)
+
+
+def _styled_row(worksheet, values, style):
+    row = []
+    for value in values:
+        cell = WriteOnlyCell(worksheet, value=_cell_value(value))
+        cell.style = style
+        row.append(cell)
+    return row
+
+
+def _data_rows(worksheet, df, first_even):
+    """Lignes de données en alternance de fond, générées au fil de l'écriture."""
+    for i, values in enumerate(df.itertuples(index=False, name=None)):
+        even = (i % 2 == 0) == first_even
+        yield _styled_row(worksheet, values, STYLE_DATA_EVEN if even else STYLE_DATA_ODD)
+
+
+# Fonction pour écrire l'onglet d'une couche
+def write_layer_sheet(workbook, nom_couche, resultats):
+    colonnes_df = list(resultats.columns)
+    nombre_total = len(resultats)
+    worksheet = workbook.create_sheet(title=nom_couche)
+
+    # En mode écriture seule, les largeurs sont fixées avant les lignes
+    for col_idx in range(1, len(colonnes_df) + 1):
+        column_letter = get_column_letter(col_idx)
+        if col_idx == 3:
+            worksheet.column_dimensions[column_letter].width = 45
+        elif 4 <= col_idx <= 9:
+            worksheet.column_dimensions[column_letter].width = 15
+        else:
+            worksheet.column_dimensions[column_letter].width = 20
+
+    ligne_nom_couche = [nom_couche, f"Nombre de {nom_couche} dans l'aire d'étude élargie : {nombre_total}"] + [''] * (len(colonnes_df) - 2)
+    worksheet.append(_styled_row(worksheet, ligne_nom_couche, STYLE_TITLE))
+    worksheet.append(_styled_row(worksheet, colonnes_df, STYLE_HEADER))
+    for row in _data_rows(worksheet, resultats, first_even=False):
+        worksheet.append(row)
+
+    log_with_time(f"Traitement de la couche '{nom_couche}' terminé")
+
+
+def build_synthesis(couches, rows):
+    """Concatène et trie les lignes de synthèse (ordre des couches, puis distance)."""
+    results_df = pd.concat(rows, ignore_index=True)
+    type_zonage_order = []
+    for couche in couches:
+        type_zonage = (couche.get('agregation') or {}).get('type') or couche['nom']
+        if type_zonage not in type_zonage_order:
+            type_zonage_order.append(type_zonage)
+    results_df['Type de zonage'] = pd.Categorical(results_df['Type de zonage'], categories=type_zonage_order, ordered=True)
+    results_df['Distance numérique'] = results_df["Distance à la zone d'étude"].apply(
+        lambda x: float(x.split(' ')[0]) if x != '/' and not x.startswith("Se") else float('inf')
+    )
+    results_df.sort_values(by=['Type de zonage', 'Distance numérique'], ascending=[True, True], inplace=True)
+    results_df.drop(columns=['Distance numérique'], inplace=True)
+    return results_df
+
+
+# Fonction pour écrire l'onglet 'SYNTHÈSE'
+def write_synthesis_sheet(workbook, results_df, sheet_name=SYNTHESIS_SHEET):
+    log_with_time(f"Création de la feuille de synthèse...")
+    worksheet = workbook.create_sheet(title=sheet_name)
+    worksheet.column_dimensions['A'].width = 25
+    worksheet.column_dimensions['B'].width = 20
+    worksheet.column_dimensions['C'].width = 50
+    worksheet.column_dimensions['D'].width = 5
+    worksheet.column_dimensions['E'].width = 20
+
+    worksheet.append(_styled_row(worksheet, SYNTHESIS_HEADERS, STYLE_HEADER))
+    if results_df is not None and not results_df.empty:
+        for row in _data_rows(worksheet, results_df, first_even=True):
+            worksheet.append(row)
+        log_with_time(f"Feuille de synthèse créée avec {len(results_df)} zonages")
+    else:
+        log_with_time(f"Aucun résultat à écrire dans la feuille '{sheet_name}'. Création d'une feuille vide.")
+
+
+OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'output'))
+DEFAULT_EXCEL = os.path.join(OUTPUT_DIR, 'ID zonages.xlsx')
+
+
+def load_references(ae_shp: str, ze_shp: str, buffer_km: float = 5.0):
+    """Charge l'AE et la ZE tamponnée en Lambert-93.
+
+    :return: (AE, ZE tamponnée, centroïde de la ZE) ou None en cas d'erreur
+    """
     # Vérifier si les fichiers de référence existent
     if not os.path.exists(ae_shp):
         log_with_time(f"Le fichier de la première couche de référence n'a pas été trouvé : {ae_shp}")
-        return
+        return None
 
     if not os.path.exists(ze_shp):
         log_with_time(f"Le fichier de la deuxième couche de référence n'a pas été trouvé : {ze_shp}")
-        return
+        return None
 
     # Chargement des couches de référence
     try:
@@ -57,18 +757,17 @@ def run_analysis(ae_shp: str, ze_shp: str, buffer_km: float = 5.0):
         log_with_time("Première couche de référence chargée avec succès")
     except Exception as e:
         log_with_time(f"Erreur lors du chargement de la première couche de référence : {e}")
-        return
+        return None
 
     try:
         reference2_gdf = gpd.read_file(ze_shp)
         log_with_time("Deuxième couche de référence chargée avec succès")
     except Exception as e:
         log_with_time(f"Erreur lors du chargement de la deuxième couche de référence : {e}")
-        return
+        return None
 
     # S'assurer que les GeoDataFrames ont un CRS approprié pour les calculs de distance
-    # Utiliser EPSG:2154 (RGF93 / Lambert-93) pour la France
-    crs_projected = "EPSG:2154"
+    crs_projected = CRS_PROJECTED
 
     # Reprojeter les couches si nécessaire
     if reference_gdf.crs != crs_projected:
@@ -77,7 +776,7 @@ def run_analysis(ae_shp: str, ze_shp: str, buffer_km: float = 5.0):
             log_with_time("Reprojection de la première couche de référence effectuée")
         except Exception as e:
             log_with_time(f"Erreur lors de la reprojection de la première couche de référence : {e}")
-            return
+            return None
 
     if reference2_gdf.crs != crs_projected:
         try:
@@ -85,7 +784,7 @@ def run_analysis(ae_shp: str, ze_shp: str, buffer_km: float = 5.0):
             log_with_time("Reprojection de la deuxième couche de référence effectuée")
         except Exception as e:
             log_with_time(f"Erreur lors de la reprojection de la deuxième couche de référence : {e}")
-            return
+            return None
 
     # Appliquer le tampon autour de la zone d'étude
     buffer_dist = buffer_km * 1000.0
@@ -99,655 +798,321 @@ def run_analysis(ae_shp: str, ze_shp: str, buffer_km: float = 5.0):
         log_with_time("Calcul du centroïde de référence effectué")
     except Exception as e:
         log_with_time(f"Erreur lors du calcul du centroïde de la deuxième couche de référence : {e}")
-        return
-
-    # Fonction pour calculer l'azimut entre deux points
-    def calculate_azimuth(point1, point2):
-        """
-        Calcule l'azimut en degrés entre deux points géométriques.
-        L'azimut est mesuré dans le sens des aiguilles d'une montre à partir du Nord.
-        """
-        delta_x = point2.x - point1.x
-        delta_y = point2.y - point1.y
-        angle_rad = math.atan2(delta_x, delta_y)
-        angle_deg = math.degrees(angle_rad)
-        azimuth = (angle_deg + 360) % 360
-        return azimuth
-
-    # Fonction pour mapper l'azimut à une direction
-    def map_azimuth_to_direction(azimuth):
-        """
-        Mappe l'azimut en degrés à une direction géographique.
-        """
-        if (337.5 <= azimuth < 360) or (0 <= azimuth < 22.5):
-            return 'Nord'
-        elif 22.5 <= azimuth < 67.5:
-            return 'Nord-est'
-        elif 67.5 <= azimuth < 112.5:
-            return 'Est'
-        elif 112.5 <= azimuth < 157.5:
-            return 'Sud-est'
-        elif 157.5 <= azimuth < 202.5:
-            return 'Sud'
-        elif 202.5 <= azimuth < 247.5:
-            return 'Sud-ouest'
-        elif 247.5 <= azimuth < 292.5:
-            return 'Ouest'
-        elif 292.5 <= azimuth < 337.5:
-            return 'Nord-ouest'
-        else:
-            return 'Inconnu'
-
-    # Fonction pour combiner la distance et la direction avec la préposition appropriée.
-    # Si la distance est égale à 0.0, retourne "Se superpose à la zone d'étude".
-    def combine_distance_and_direction(distance_km, direction):
-        if distance_km == 0.0:
-            return "Se superpose à la zone d'étude"
-        if direction in ['Est', 'Ouest']:
-            preposition = "à l'"
-            direction_str = direction.lower()
-        else:
-            preposition = 'au '
-            direction_str = direction.lower()
-        combined_str = f"{distance_km} km {preposition}{direction_str}"
-        return combined_str
-
-    # Définition des styles pour le formatage Excel
-    header_font = Font(name='Calibri', size=11, bold=True, color='FFFFFF')
-    header_fill = PatternFill(fill_type='solid', start_color='4F81BD', end_color='4F81BD')
-    data_font = Font(name='Calibri', size=11)
-    data_fill_even = PatternFill(fill_type='solid', start_color='F2F2F2', end_color='F2F2F2')
-    data_fill_odd = PatternFill(fill_type='solid', start_color='FFFFFF', end_color='FFFFFF')
-    border = Border(
-        left=Side(style='thin', color='000000'),
-        right=Side(style='thin', color='000000'),
-        top=Side(style='thin', color='000000'),
-        bottom=Side(style='thin', color='000000')
-    )
-    alignment = Alignment(horizontal='left', vertical='center', wrap_text=False)
-
-    # Liste des couches cibles avec leurs chemins, noms et attributs.
-    # Les modifications suivantes ont été apportées pour corriger les messages d'erreur liés aux attributs manquants.
-    couches_cibles = [
-        {
-            'nom': 'N2000 ZPS',
-            'chemin': r"C:\Users\utilisateur\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\N2000 ZPS.shp",
-            'attributs': ['SITENAME', 'SITECODE'],
-        },
-        {
-            'nom': 'N2000 ZSC',
-            'chemin': r"C:\Users\utilisateur\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\N2000 ZSC.shp",
-            'attributs': ['SITENAME', 'SITECODE'],
-        },
-        {
-            'nom': 'ZNIEFF de Type I',
-            'chemin': r"C:\Users\utilisateur\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZNIEFF de type I.shp",
-            'attributs': ['NOM','ID_MNHN','ID_ORG'],
-        },
-        {
-            'nom': 'ZNIEFF de Type II',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZNIEFF de type II.shp",
-            'attributs': ['NOM','ID_MNHN','ID_ORG'],
-        },
-        {
-            'nom': 'APPB',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\APPB.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','URL_FICHE','OPERATEUR'],
-        },
-        {
-            'nom': 'APPHN',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\APPHN.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','URL_FICHE','OPERATEUR'],
-        },
-        {
-            'nom': 'Terrain CEN - Terrain gere',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Terrain CEN - Terrain gere.shp",
-            'attributs': ['ID_MNHN','NOM_SITE'],
-        },
-        {
-            'nom': 'Terrain CEN - Terrain acquis',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Terrain CEN - Terrain acquis.shp",
-            'attributs': ['ID_MNHN','NOM_SITE'],
-        },
-        {
-            'nom': 'ENS',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ENS.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','URL_FICHE','GEST_SITE','OPERATEUR','STAT_FON'],
-        },
-        {
-            'nom': 'Parc Nationaux',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Parc Nationaux.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','ID_LOCAL','PPN_ASSO','URL_FICHE','GEST_SITE','OPERATEUR'],
-        },
-        {
-            'nom': 'Parc Naturels Régionaux',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Parc Naturels Regionaux.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','GEST_SITE','URL_FICHE'],
-        },
-        {
-            'nom': 'Réserve biologique',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Réserve biologique.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','GEST_SITE','URL_FICHE'],
-        },
-        {
-            'nom': 'Réserve de biosphère',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Réserve de biosphère.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','GEST_SITE','URL_FICHE','OPERATEUR'],
-        },
-        {
-            'nom': 'Réserve intégrale de PN',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Réserve intégrale de PN.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','GEST_SITE','URL_FICHE','OPERATEUR','ID_PN'],
-        },
-        {
-            'nom': 'Réserve nationale',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Réserve nationale.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','ID_LOCAL','URL_FICHE','ACTE_DEB','GEST_SITE','OPERATEUR'],
-        },
-        {
-            'nom': 'Réserve régionale',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Réserve régionale.shp",
-            'attributs': ['NOM_SITE','ID_MNHN','ID_LOCAL','URL_FICHE','ACTE_DEB','GEST_SITE','OPERATEUR'],
-        },
-        # Couches ZH
-        {
-            'nom': 'ZH 01',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZH 01.shp",
-            'attributs': ['nom','id_map','id_local','url'],
-        },
-        {
-            'nom': 'ZH 26',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZH 26.shp",
-            'attributs': ['site_name','nom_bv','site_cod','sdage'],
-        },
-        {
-            'nom': 'ZH 38',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZH 38.shp",
-            'attributs': ['nom','id_map','id_local','url'],
-        },
-        {
-            'nom': 'ZH 69',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZH 69.shp",
-            'attributs': ['nom','id_map','id_local','url'],
-        },
-        {
-            'nom': 'ZH 73',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZH 73.shp",
-            # Pour ZH 73, on remplace 'nom' par 'site_name' et 'id_map' par 'id_bdd'
-            # On ne prend pas en compte 'id_local' et 'url'
-            'attributs': ['site_name','id_bdd'],
-        },
-        {
-            'nom': 'ZH 74',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZH 74.shp",
-            # Pour ZH 74, on souhaite utiliser "NOM" pour le nom du site
-            'attributs': ['NOM'],
-        },
-        {
-            'nom': 'ZH Bourgogne',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZH Bourgogne.shp",
-            'attributs': ['nom','id_map','id_local','url'],
-        },
-        {
-            'nom': 'ZH PACA',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\ZH PACA.shp",
-            'attributs': ['site','code','lib_ssbv','type_sdage'],
-        },
-        # Couches Pelouses sèches (remplacement de l'ancienne couche)
-        {
-            'nom': 'Pelouses sèches 38',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Pelouses sèches 38.dbf",
-            'attributs': ['LEGENDE','ID'],
-        },
-        {
-            'nom': 'Pelouses sèches 73',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Pelouses sèches 73.dbf",
-            # Pour Pelouses sèches 73, utiliser 'site_name' pour le nom et 'id_bdd' à la place de 'LEGENDE'
-            'attributs': ['site_name','id_bdd'],
-        },
-        {
-            'nom': 'Pelouses sèches 74',
-            'chemin': r"C:\USERS\UTILISATEUR\Mon Drive\1 - Bota & Travail\+++++++++  BOTA  +++++++++\---------------------- 3) BDD\PYTHON\2) Contexte éco\INPUT\Tables pour ID zonages\Pelouses sèches 74.dbf",
-            # Pour Pelouses sèches 74, utiliser 'Site' pour le nom et conserver 'ID'
-            'attributs': ['Site','ID'],
-        }
-    ]
-
-    # Dossier de sortie et nom du fichier Excel
-    dossier_sortie = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'output'))
-    os.makedirs(dossier_sortie, exist_ok=True)
-    nom_fichier_sortie = 'ID zonages.xlsx'
-    chemin_sortie = os.path.join(dossier_sortie, nom_fichier_sortie)
-
-    # Vérifier si le fichier Excel existe déjà et le supprimer s'il existe
-    if os.path.exists(chemin_sortie):
-        try:
-            os.remove(chemin_sortie)
-            log_with_time(f"Le fichier existant '{chemin_sortie}' a été supprimé et sera remplacé par le nouvel export.")
-        except Exception as e:
-            log_with_time(f"Erreur lors de la suppression du fichier existant '{chemin_sortie}': {e}")
-            return
+        return None
 
-    # Fonction pour traiter une couche individuelle et écrire dans son propre onglet
-    def process_single_layer(couche, writer):
-        sheet_name = couche['nom']
-        nom_couche = couche['nom']
-        chemin_cible = couche['chemin']
-        attributs_a_exporter = couche['attributs']
+    return reference_gdf, reference2_gdf, reference2_centroid
 
-        row_position = 0
 
-        if not os.path.exists(chemin_cible):
-            log_with_time(f"Le fichier de la couche '{nom_couche}' n'a pas été trouvé : {chemin_cible}")
-            return
+def build_results(couches, resultats, name_attributes=()):
+    """Résultats structurés : synthèse et tableau de chaque couche.
 
-        try:
-            cible_gdf = gpd.read_file(chemin_cible)
-            log_with_time(f"Couche '{nom_couche}' chargée")
-        except Exception as e:
-            log_with_time(f"Erreur lors du chargement de la couche '{nom_couche}': {e}")
-            return
-
-        if cible_gdf.crs != crs_projected:
-            try:
-                cible_gdf = cible_gdf.to_crs(crs_projected)
-                log_with_time(f"Reprojection de '{nom_couche}' effectuée")
-            except Exception as e:
-                log_with_time(f"Erreur lors de la reprojection de '{nom_couche}': {e}")
-                return
-
-        try:
-            overlapping_gdf = gpd.sjoin(cible_gdf, reference_gdf, how='inner', predicate='intersects')
-            log_with_time(f"Jointure spatiale pour '{nom_couche}' effectuée")
-        except Exception as e:
-            log_with_time(f"Erreur lors de la jointure spatiale pour '{nom_couche}': {e}")
-            return
+    :return: {"synthese": DataFrame, "couches": {nom: DataFrame}} ; seules les
+        couches ayant des entités dans l'AE figurent dans "couches"
+    """
+    rows = [synthesis_rows(couche, overlap, name_attributes) for couche, overlap in zip(couches, resultats)]
+    rows = [r for r in rows if r is not None]
+    synthese_df = build_synthesis(couches, rows) if rows else pd.DataFrame(columns=SYNTHESIS_HEADERS)
+    tables = {}
+    for couche, overlap in zip(couches, resultats):
+        table = layer_table(couche, overlap)
+        if table is not None:
+            tables[couche['nom']] = table
+    return {'synthese': synthese_df, 'couches': tables}
 
-        if overlapping_gdf.empty:
-            log_with_time(f"Aucun site présent dans '{nom_couche}'.")
-            return
 
-        try:
-            distances = overlapping_gdf.geometry.apply(lambda geom: reference2_gdf.distance(geom).min())
-            distances_km = distances / 1000
-            distances_km = distances_km.round(1)
-            overlapping_gdf['Distance (km)'] = distances_km
-            log_with_time(f"Calcul des distances pour '{nom_couche}' effectué")
-        except Exception as e:
-            log_with_time(f"Erreur lors du calcul des distances pour '{nom_couche}': {e}")
-            return
+def analyse_zonages(ae_shp: str, ze_shp: str, buffer_km: float = 5.0, workers=None):
+    """Analyse des zonages en mémoire, sans écrire de fichier.
 
-        try:
-            overlapping_gdf['centroid'] = overlapping_gdf.geometry.centroid
-            overlapping_gdf['Azimuth (°)'] = overlapping_gdf['centroid'].apply(lambda geom: calculate_azimuth(reference2_centroid, geom))
-            overlapping_gdf['Azimuth'] = overlapping_gdf['Azimuth (°)'].apply(map_azimuth_to_direction)
-            log_with_time(f"Calcul de l'azimut pour '{nom_couche}' effectué")
-        except Exception as e:
-            log_with_time(f"Erreur lors du calcul de l'azimut pour '{nom_couche}': {e}")
-            return
+    :return: résultats de `build_results`, ou None en cas d'erreur
+    """
+    references = load_references(ae_shp, ze_shp, buffer_km)
+    if references is None:
+        return None
+    reference_gdf, reference2_gdf, reference2_centroid = references
+
+    # Une seule passe par couche : chargement, reprojection, jointure et
+    # distances servent à la fois à la synthèse et à l'onglet de la couche.
+    # Les couches sont analysées en parallèle.
+    try:
+        couches_cibles = load_couches()
+        name_attributes = default_name_attributes()
+    except Exception as e:
+        log_with_time(f"Erreur lors du chargement du registre des zonages : {e}")
+        return None
+    log_with_time(f"Analyse des couches ({len(couches_cibles)} couches)...")
+    site = make_site(reference_gdf, reference2_gdf, reference2_centroid)
+    prune_candidates()
+    resultats = analyse_sites(couches_cibles, [site], load_store_index(), workers)
+    return build_results(couches_cibles, [r[0] for r in resultats], name_attributes)
 
-        try:
-            overlapping_gdf['Distance et Direction'] = overlapping_gdf.apply(
-                lambda row: combine_distance_and_direction(row['Distance (km)'], row['Azimuth']),
-                axis=1
-            )
-            log_with_time(f"Combinaison distance/direction pour '{nom_couche}' effectuée")
-        except Exception as e:
-            log_with_time(f"Erreur lors de la combinaison de la distance et de la direction pour '{nom_couche}': {e}")
-            return
-
-        available_columns = overlapping_gdf.columns
-        attributs_existants = []
-        colonne_mapping = {}
-
-        for attr in attributs_a_exporter:
-            found = False
-            for col in available_columns:
-                if col.lower() == attr.lower():
-                    attributs_existants.append(col)
-                    colonne_mapping[attr] = col
-                    found = True
-                    break
-            if not found:
-                log_with_time(f"L'attribut '{attr}' n'a pas été trouvé dans '{nom_couche}'.")
-
-        if not attributs_existants:
-            log_with_time(f"Aucun des attributs spécifiés n'a été trouvé dans '{nom_couche}'.")
-            log_with_time(f"Attributs disponibles dans '{nom_couche}': {available_columns.tolist()}")
-            return
 
-        try:
-            resultats = overlapping_gdf[['Distance et Direction'] + attributs_existants].copy()
-            log_with_time(f"Extraction des attributs pour '{nom_couche}' effectuée")
-        except Exception as e:
-            log_with_time(f"Erreur lors de l'extraction des attributs dans '{nom_couche}': {e}")
-            return
-
-        for attr, col in colonne_mapping.items():
-            resultats.rename(columns={col: attr}, inplace=True)
-
-        resultats['Distance numérique'] = overlapping_gdf['Distance (km)']
-        resultats = resultats.sort_values(by='Distance numérique', ascending=True)
-        resultats.drop(columns='Distance numérique', inplace=True)
-        resultats.insert(0, 'Nom de la couche', nom_couche)
-        colonnes_df = ['Nom de la couche', 'Distance et Direction'] + attributs_a_exporter
-
-        for col in colonnes_df:
-            if col not in resultats.columns:
-                resultats[col] = ''
-
-        resultats = resultats[colonnes_df]
-        nombre_total = len(overlapping_gdf)
-        ligne_nom_couche = pd.DataFrame(
-            [[nom_couche, f"Nombre de {nom_couche} dans l'aire d'étude élargie : {nombre_total}"] + [''] * (len(colonnes_df) - 2)],
-            columns=colonnes_df
-        )
-        ligne_noms_attributs = pd.DataFrame([colonnes_df], columns=colonnes_df)
-        start_row = row_position
-
-        ligne_nom_couche.to_excel(writer, sheet_name=sheet_name, startrow=row_position, header=False, index=False)
-        row_position += 1
-        ligne_noms_attributs.to_excel(writer, sheet_name=sheet_name, startrow=row_position, header=False, index=False)
-        header_row_number = row_position
-        row_position += 1
-        data_start_row = row_position
-
-        resultats.to_excel(writer, sheet_name=sheet_name, startrow=row_position, header=False, index=False)
-        row_position += len(resultats)
-        data_end_row = row_position - 1
-        worksheet = writer.sheets[sheet_name]
-        start_col = 1
-        end_col = len(colonnes_df)
-
-        for col_idx in range(start_col, end_col + 1):
-            cell = worksheet.cell(row=start_row + 1, column=col_idx)
-            cell.font = Font(name='Calibri', size=12, bold=True)
-            cell.alignment = alignment
-
-        for col_idx in range(start_col, end_col + 1):
-            cell = worksheet.cell(row=header_row_number + 1, column=col_idx)
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.border = border
-            cell.alignment = alignment
-
-        for row_idx in range(data_start_row + 1, data_end_row + 2):
-            for col_idx in range(start_col, end_col + 1):
-                cell = worksheet.cell(row=row_idx, column=col_idx)
-                cell.font = data_font
-                cell.border = border
-                cell.alignment = alignment
-                if (row_idx - data_start_row) % 2 == 0:
-                    cell.fill = data_fill_even
-                else:
-                    cell.fill = data_fill_odd
-
-        for col_idx in range(start_col, end_col + 1):
-            column_letter = get_column_letter(col_idx)
-            if col_idx == 3:
-                worksheet.column_dimensions[column_letter].width = 45
-            elif 4 <= col_idx <= 9:
-                worksheet.column_dimensions[column_letter].width = 15
-            else:
-                worksheet.column_dimensions[column_letter].width = 20
-
-        log_with_time(f"Traitement de la couche '{nom_couche}' terminé")
-
-    # Fonction pour traiter les couches et écrire dans l'onglet 'SYNTHÈSE'
-    def process_synthesis(couches, sheet_name, writer):
-        log_with_time(f"Création de la feuille de synthèse...")
-        all_results = []
-        code_field_mapping = {
-            'N2000 ZPS': 'SITECODE',
-            'N2000 ZSC': 'SITECODE',
-            'ZNIEFF de Type I': 'ID_MNHN',
-            'ZNIEFF de Type II': 'ID_MNHN'
-        }
-
-        for couche in couches:
-            nom_couche = couche['nom']
-            chemin_cible = couche['chemin']
-
-            if nom_couche in ['ZH 38', 'Pelouses sèches']:
-                if not os.path.exists(chemin_cible):
-                    log_with_time(f"Le fichier de la couche '{nom_couche}' n'a pas été trouvé : {chemin_cible}")
-                    continue
-
-                try:
-                    cible_gdf = gpd.read_file(chemin_cible)
-                except Exception as e:
-                    log_with_time(f"Erreur lors du chargement de la couche '{nom_couche}': {e}")
-                    continue
-
-                if cible_gdf.crs != crs_projected:
-                    try:
-                        cible_gdf = cible_gdf.to_crs(crs_projected)
-                    except Exception as e:
-                        log_with_time(f"Erreur lors de la reprojection de '{nom_couche}': {e}")
-                        continue
-
-                try:
-                    overlapping_gdf = gpd.sjoin(cible_gdf, reference_gdf, how='inner', predicate='intersects')
-                except Exception as e:
-                    log_with_time(f"Erreur lors de la jointure spatiale pour '{nom_couche}': {e}")
-                    continue
-
-                if overlapping_gdf.empty:
-                    continue
-
-                nombre_objets = len(overlapping_gdf)
-
-                if nom_couche == 'ZH 38':
-                    type_zonage = 'Zone humide'
-                    nom_du_site = f"{nombre_objets} zones humides dans l'aire d'étude élargie"
-                elif nom_couche == 'Pelouses sèches':
-                    type_zonage = 'Pelouses sèches'
-                    nom_du_site = f"{nombre_objets} pelouses sèches dans l'aire d'étude élargie"
-
-                temp_df = pd.DataFrame({
-                    'Type de zonage': [type_zonage],
-                    'Distance à la zone d\'étude': ['/'],
-                    'Nom du site': [nom_du_site],
-                    '': [''],
-                    'CODES': ['']
-                })
-
-                all_results.append(temp_df)
-                continue
+def write_workbook(results, chemin_sortie):
+    """Écrit le classeur "ID zonages" (synthèse puis un onglet par couche)."""
+    heure_debut = datetime.datetime.now()
+    log_with_time(f"Début de la création du fichier Excel: {chemin_sortie}")
 
-            if not os.path.exists(chemin_cible):
-                log_with_time(f"Le fichier de la couche '{nom_couche}' n'a pas été trouvé : {chemin_cible}")
-                continue
+    # Classeur en écriture seule : les lignes sont écrites au fil de l'eau
+    # avec des styles nommés, la mémoire reste stable quelle que soit la taille
+    workbook = Workbook(write_only=True)
+    register_styles(workbook)
+    write_synthesis_sheet(workbook, results['synthese'])
 
-            try:
-                cible_gdf = gpd.read_file(chemin_cible)
-            except Exception as e:
-                log_with_time(f"Erreur lors du chargement de la couche '{nom_couche}': {e}")
-                continue
+    log_with_time(f"Écriture des onglets individuels ({len(results['couches'])} couches)...")
+    for nom_couche, table in results['couches'].items():
+        write_layer_sheet(workbook, nom_couche, table)
+    workbook.save(chemin_sortie)
 
-            if cible_gdf.crs != crs_projected:
-                try:
-                    cible_gdf = cible_gdf.to_crs(crs_projected)
-                except Exception as e:
-                    log_with_time(f"Erreur lors de la reprojection de '{nom_couche}': {e}")
-                    continue
+    duree_totale = datetime.datetime.now() - heure_debut
+    log_with_time(f"Fichier Excel créé avec succès en {duree_totale}")
 
-            try:
-                overlapping_gdf = gpd.sjoin(cible_gdf, reference_gdf, how='inner', predicate='intersects')
-            except Exception as e:
-                log_with_time(f"Erreur lors de la jointure spatiale pour '{nom_couche}': {e}")
-                continue
 
-            if overlapping_gdf.empty:
-                continue
+def run_analysis(ae_shp: str, ze_shp: str, buffer_km: float = 5.0, workers=None, excel_path=DEFAULT_EXCEL):
+    """Lance l'analyse d'identification des zonages à partir des shapefiles.
 
-            try:
-                distances = overlapping_gdf.geometry.apply(lambda geom: reference2_gdf.distance(geom).min())
-                distances_km = distances / 1000
-                distances_km = distances_km.round(1)
-                overlapping_gdf['Distance (km)'] = distances_km
-            except Exception as e:
-                log_with_time(f"Erreur lors du calcul des distances pour '{nom_couche}': {e}")
-                continue
+    :param ae_shp: chemin vers la couche "Aire d'étude élargie"
+    :param ze_shp: chemin vers la couche "Zone d'étude"
+    :param buffer_km: distance du tampon autour de la ZE en kilomètres
+    :param workers: nombre de processus d'analyse (défaut : cœurs - 1, max 6)
+    :param excel_path: classeur à écrire (None : aucun fichier)
+    :return: résultats en mémoire (voir `build_results`), ou None en cas d'erreur
+        (y compris si le classeur demandé n'a pas pu être écrit)
+    """
+    log_with_time("Démarrage du script d'identification des zonages...")
 
+    # Vérifier si le fichier Excel existe déjà et le supprimer s'il existe
+    if excel_path:
+        os.makedirs(os.path.dirname(os.path.abspath(excel_path)), exist_ok=True)
+        if os.path.exists(excel_path):
             try:
-                overlapping_gdf['centroid'] = overlapping_gdf.geometry.centroid
-                overlapping_gdf['Azimuth (°)'] = overlapping_gdf['centroid'].apply(lambda geom: calculate_azimuth(reference2_centroid, geom))
-                overlapping_gdf['Azimuth'] = overlapping_gdf['Azimuth (°)'].apply(map_azimuth_to_direction)
+                os.remove(excel_path)
+                log_with_time(f"Le fichier existant '{excel_path}' a été supprimé et sera remplacé par le nouvel export.")
             except Exception as e:
-                log_with_time(f"Erreur lors du calcul de l'azimut pour '{nom_couche}': {e}")
-                continue
+                log_with_time(f"Erreur lors de la suppression du fichier existant '{excel_path}': {e}")
+                return None
 
-            try:
-                overlapping_gdf['Distance et Direction'] = overlapping_gdf.apply(
-                    lambda row: combine_distance_and_direction(row['Distance (km)'], row['Azimuth']),
-                    axis=1
-                )
-            except Exception as e:
-                log_with_time(f"Erreur lors de la combinaison de la distance et de la direction pour '{nom_couche}': {e}")
-                continue
+    results = analyse_zonages(ae_shp, ze_shp, buffer_km, workers)
+    if results is None or not excel_path:
+        return results
 
-            # Recherche de l'attribut pour le nom du site en fonction de la couche
-            if nom_couche in ['ZNIEFF de Type I', 'ZNIEFF de Type II']:
-                name_attr = 'NOM'
-            elif nom_couche == 'ZH PACA':
-                name_attr = 'site'
-            elif nom_couche == 'Pelouses sèches 73':
-                name_attr = 'site_name'
-            elif nom_couche == 'Pelouses sèches 74':
-                name_attr = 'Site'
-            elif nom_couche == 'ZH 73':
-                name_attr = 'site_name'
-            elif nom_couche == 'ZH 74':
-                name_attr = 'NOM'
-            else:
-                name_attr = None
-                for attr in ['SITENAME', 'NAME', 'NOM_SITE', 'nom', 'site']:
-                    if attr in overlapping_gdf.columns:
-                        name_attr = attr
-                        break
-
-            if not name_attr:
-                log_with_time(f"L'attribut 'Nom du site' est manquant pour '{nom_couche}'.")
-                continue
+    try:
+        write_workbook(results, excel_path)
+    except Exception as e:
+        log_with_time(f"Erreur lors de l'écriture dans le fichier Excel : {e}")
+        return None
 
-            if nom_couche in code_field_mapping:
-                code_field = code_field_mapping[nom_couche]
-                if code_field in overlapping_gdf.columns:
-                    overlapping_gdf['CODES'] = overlapping_gdf[code_field].astype(str)
-                else:
-                    overlapping_gdf['CODES'] = ''
-                    log_with_time(f"L'attribut '{code_field}' n'a pas été trouvé dans '{nom_couche}'.")
-            else:
-                overlapping_gdf['CODES'] = ''
+    log_with_time(f"\nLes résultats ont été exportés avec succès dans le fichier Excel : {excel_path}")
+    return results
 
-            try:
-                temp_df = overlapping_gdf[['Distance et Direction', name_attr, 'CODES']].copy()
-            except Exception as e:
-                log_with_time(f"Erreur lors de l'extraction des attributs dans '{nom_couche}': {e}")
-                continue
 
-            temp_df.rename(columns={
-                'Distance et Direction': 'Distance à la zone d\'étude',
-                name_attr: 'Nom du site'
-            }, inplace=True)
-
-            temp_df.insert(0, 'Type de zonage', nom_couche)
-            temp_df.insert(3, '', '')
-            all_results.append(temp_df)
-
-        if all_results:
-            results_df = pd.concat(all_results, ignore_index=True)
-            results_df['Type de zonage'] = results_df['Type de zonage'].replace({'ZH 38': 'Zone humide'})
-            type_zonage_order = [couche['nom'] for couche in couches]
-            type_zonage_order = ['Zone humide' if nom == 'ZH 38' else nom for nom in type_zonage_order]
-            results_df['Type de zonage'] = pd.Categorical(results_df['Type de zonage'], categories=type_zonage_order, ordered=True)
-            results_df['Distance numérique'] = results_df["Distance à la zone d'étude"].apply(
-                lambda x: float(x.split(' ')[0]) if x != '/' and not x.startswith("Se") else float('inf')
-            )
-            results_df.sort_values(by=['Type de zonage', 'Distance numérique'], ascending=[True, True], inplace=True)
-            results_df.drop(columns=['Distance numérique'], inplace=True)
-
-            results_df.to_excel(writer, sheet_name=sheet_name, startrow=1, header=False, index=False)
-
-            worksheet = writer.sheets[sheet_name]
-            headers = ['Type de zonage', "Distance à la zone d'étude", 'Nom du site', '', 'CODES']
-            for col_idx, header in enumerate(headers, start=1):
-                cell = worksheet.cell(row=1, column=col_idx)
-                cell.value = header
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.border = border
-                cell.alignment = alignment
-
-            data_start_row = 2
-            data_end_row = data_start_row + len(results_df) - 1
-            start_col = 1
-            end_col = 5
-
-            for row_idx in range(data_start_row, data_end_row + 1):
-                for col_idx in range(start_col, end_col + 1):
-                    cell = worksheet.cell(row=row_idx, column=col_idx)
-                    cell.font = data_font
-                    cell.border = border
-                    cell.alignment = alignment
-                    if (row_idx - data_start_row) % 2 == 0:
-                        cell.fill = data_fill_even
-                    else:
-                        cell.fill = data_fill_odd
-
-            worksheet.column_dimensions['A'].width = 25
-            worksheet.column_dimensions['B'].width = 20
-            worksheet.column_dimensions['C'].width = 50
-            worksheet.column_dimensions['D'].width = 5
-            worksheet.column_dimensions['E'].width = 20
-
-            log_with_time(f"Feuille de synthèse créée avec {len(results_df)} zonages")
+def _site_specs(sites, buffer_km):
+    """Normalise les sites : dicts (AE_SHP/ZE_SHP/SITE[, EXPORT_DIR, BUFFER_KM]) ou triplets (AE, ZE, tampon).
 
+    Noms dédoublonnés comme `report_builder._site_specs` (`unique_site_name`).
+    :return: [(nom, AE, ZE, tampon, dossier du site ou None)]
+    """
+    specs = []
+    noms = set()
+    for i, site in enumerate(sites, start=1):
+        if isinstance(site, dict):
+            ae = site.get('AE_SHP') or site.get('ae_shp')
+            ze = site.get('ZE_SHP') or site.get('ze_shp')
+            tampon = site.get('BUFFER_KM', site.get('buffer_km', buffer_km))
+            nom = site.get('SITE') or site.get('nom')
+            dossier = site.get('EXPORT_DIR') or site.get('dossier')
         else:
-            log_with_time(f"Aucun résultat à écrire dans la feuille '{sheet_name}'. Création d'une feuille vide.")
-            empty_df = pd.DataFrame(columns=['Type de zonage', "Distance à la zone d'étude", 'Nom du site', '', 'CODES'])
-            empty_df.to_excel(writer, sheet_name=sheet_name, index=False)
-            worksheet = writer.sheets[sheet_name]
-            for col_idx, header in enumerate(empty_df.columns, start=1):
-                cell = worksheet.cell(row=1, column=col_idx)
-                cell.value = header
-                cell.font = header_font
-                cell.fill = header_fill
-                cell.border = border
-                cell.alignment = alignment
-            worksheet.column_dimensions['A'].width = 25
-            worksheet.column_dimensions['B'].width = 20
-            worksheet.column_dimensions['C'].width = 50
-            worksheet.column_dimensions['D'].width = 5
-            worksheet.column_dimensions['E'].width = 20
-
-    # Création de l'objet ExcelWriter pour écrire dans le fichier Excel
-    try:
-        heure_debut = datetime.datetime.now()
-        log_with_time(f"Début de la création du fichier Excel: {chemin_sortie}")
+            ae, ze = site[0], site[1]
+            tampon = site[2] if len(site) > 2 else buffer_km
+            nom = dossier = None
+        nom = unique_site_name(str(nom or os.path.splitext(os.path.basename(ae))[0] or f"Site {i}"), noms)
+        specs.append((nom, ae, ze, float(tampon), dossier))
+    return specs
 
-        with pd.ExcelWriter(chemin_sortie, engine='openpyxl') as writer:
-            process_synthesis(couches_cibles, 'SYNTHÈSE', writer)
 
-            log_with_time(f"Traitement des onglets individuels ({len(couches_cibles)} couches)...")
-            for i, couche in enumerate(couches_cibles):
-                log_with_time(f"Traitement de la couche {i+1}/{len(couches_cibles)}: {couche['nom']}")
-                process_single_layer(couche, writer)
+def site_output_paths(nom, dossier, output_dir=OUTPUT_DIR):
+    """Classeur et JSON d'un site : ``ID zonages.xlsx/.json`` dans son dossier,
+    sinon ``ID zonages - <site>.xlsx/.json`` dans `output_dir`.
 
-        duree_totale = datetime.datetime.now() - heure_debut
-        log_with_time(f"Fichier Excel créé avec succès en {duree_totale}")
+    Ce sont les fichiers cherchés par `report_builder.site_results`.
+    """
+    if dossier:
+        return os.path.join(dossier, 'ID zonages.xlsx'), os.path.join(dossier, 'ID zonages.json')
+    stem = os.path.join(output_dir, f"ID zonages - {safe_site_name(nom)}")
+    return stem + '.xlsx', stem + '.json'
+
+
+def write_combined_workbook(results_by_site, chemin_sortie):
+    """Classeur unique : une feuille de synthèse par site."""
+    workbook = Workbook(write_only=True)
+    register_styles(workbook)
+    titres = set()
+    for nom, results in results_by_site.items():
+        titre = safe_site_name(nom, 31)
+        n = 2
+        while titre.lower() in titres:
+            suffixe = f" ({n})"
+            titre = safe_site_name(nom, 31 - len(suffixe)) + suffixe
+            n += 1
+        titres.add(titre.lower())
+        write_synthesis_sheet(workbook, results['synthese'], sheet_name=titre)
+    workbook.save(chemin_sortie)
+
+
+def run_batch(sites, buffer_km: float = 5.0, workers=None, output_dir=OUTPUT_DIR, combined_path=None,
+              excel=True, json_results=False):
+    """Analyse des zonages pour une campagne de plusieurs sites.
+
+    Chaque couche de zonage est lue une fois par groupe de sites proches
+    (`group_site_bboxes`), son index spatial construit une fois par lecture,
+    puis interrogé pour chaque site du groupe. Les couches sont réparties sur
+    les processus d'analyse (`layer_slots`).
+
+    :param sites: dicts (AE_SHP, ZE_SHP[, SITE, BUFFER_KM]) comme ceux de
+        `export_inputs.load_sites_csv`, ou triplets (AE, ZE[, tampon km])
+    :param output_dir: dossier des fichiers des sites sans dossier propre
+        (EXPORT_DIR), voir `site_output_paths`
+    :param combined_path: classeur unique des synthèses de tous les sites
+    :param excel: écrire le classeur de chaque site
+    :param json_results: écrire ``ID zonages.json`` de chaque site (relu par
+        `report_builder` sans passer par le classeur)
+    :return: {nom du site: résultats (voir `build_results`)}
+    """
+    heure_debut = datetime.datetime.now()
+    specs = _site_specs(sites, buffer_km)
+    log_with_time(f"Analyse groupée des zonages : {len(specs)} site(s)")
 
+    try:
+        couches_cibles = load_couches()
+        name_attributes = default_name_attributes()
     except Exception as e:
-        log_with_time(f"Erreur lors de l'écriture dans le fichier Excel : {e}")
-        return
+        log_with_time(f"Erreur lors du chargement du registre des zonages : {e}")
+        return {}
+
+    dossiers = {}
+    prepared = []
+    for nom, ae, ze, tampon, dossier in specs:
+        dossiers[nom] = dossier
+        log_with_time(f"Site '{nom}' : chargement de l'AE et de la ZE")
+        references = load_references(ae, ze, tampon)
+        if references is None:
+            log_with_time(f"Site '{nom}' ignoré")
+            continue
+        prepared.append(make_site(*references, nom=nom))
+    if not prepared:
+        return {}
+
+    prune_candidates()
+    resultats = analyse_sites(couches_cibles, prepared, load_store_index(), workers)
+
+    results_by_site = {}
+    for j, site in enumerate(prepared):
+        results = build_results(couches_cibles, [r[j] for r in resultats], name_attributes)
+        results_by_site[site['nom']] = results
+        if not (excel or json_results):
+            continue
+        excel_path, json_path = site_output_paths(site['nom'], dossiers[site['nom']], output_dir)
+        try:
+            os.makedirs(os.path.dirname(excel_path), exist_ok=True)
+            if excel:
+                write_workbook(results, excel_path)
+            if json_results:
+                results_to_json(results, json_path)
+        except Exception as e:
+            log_with_time(f"Erreur lors de l'écriture des résultats du site '{site['nom']}' : {e}")
 
-    log_with_time(f"\nLes résultats ont été exportés avec succès dans le fichier Excel : {chemin_sortie}")
+    if combined_path:
+        try:
+            write_combined_workbook(results_by_site, combined_path)
+            log_with_time(f"Classeur des synthèses : {combined_path}")
+        except Exception as e:
+            log_with_time(f"Erreur lors de l'écriture du classeur des synthèses : {e}")
+
+    log_with_time(f"Analyse groupée terminée en {datetime.datetime.now() - heure_debut}")
+    return results_by_site
+
+
+def _results_records(results):
+    def records(df):
+        return json.loads(df.to_json(orient='records', force_ascii=False))
+
+    return {
+        'synthese': records(results['synthese']),
+        'couches': {nom: records(df) for nom, df in results['couches'].items()},
+    }
+
+
+def results_to_json(results, path):
+    """Écrit les résultats en JSON : {"synthese": [...], "couches": {nom: [...]}}."""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(_results_records(results), f, ensure_ascii=False, indent=2)
+
+
+def results_to_parquet(results, out_dir):
+    """Écrit un fichier Parquet par tableau (synthese.parquet, <couche>.parquet)."""
+    def _write(df, name):
+        df = df.copy()
+        for col in df.columns:
+            if df[col].dtype == object:
+                df[col] = df[col].astype('string')
+        df.to_parquet(os.path.join(out_dir, name), index=False)
+
+    os.makedirs(out_dir, exist_ok=True)
+    _write(results['synthese'], 'synthese.parquet')
+    for nom, df in results['couches'].items():
+        slug = re.sub(r'[^0-9A-Za-z]+', '_', nom).strip('_').lower()
+        _write(df, f"{slug}.parquet")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Identification des zonages autour d'une zone d'étude")
+    parser.add_argument('ae_shp', nargs='?', help="couche de l'aire d'étude élargie")
+    parser.add_argument('ze_shp', nargs='?', help="couche de la zone d'étude")
+    parser.add_argument('buffer_km', nargs='?', type=float, default=5.0, help="tampon autour de la ZE (km)")
+    parser.add_argument('--workers', type=int, default=None, help="processus d'analyse")
+    parser.add_argument('--excel', default=DEFAULT_EXCEL, help="classeur de sortie")
+    parser.add_argument('--no-excel', action='store_true', help="ne pas écrire de classeur")
+    parser.add_argument('--json', nargs='?', const='',
+                        help="écrire les résultats dans ce fichier JSON ; avec --sites, "
+                             "un 'ID zonages.json' par site (et, si un chemin est donné, un fichier de tous les sites)")
+    parser.add_argument('--parquet', help="écrire les résultats en Parquet dans ce dossier")
+    parser.add_argument('--sites', help="CSV de sites (ze;ae;sortie;site) pour une analyse groupée")
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help="dossier des résultats des sites sans dossier de sortie (--sites)")
+    parser.add_argument('--combined', help="classeur unique des synthèses (--sites)")
+    args = parser.parse_args(argv)
+
+    if args.sites:
+        results_by_site = run_batch(load_sites_csv(args.sites), args.buffer_km, args.workers,
+                                    args.output_dir, args.combined, excel=not args.no_excel,
+                                    json_results=args.json is not None)
+        if not results_by_site:
+            return 1
+        if args.json:
+            with open(args.json, 'w', encoding='utf-8') as f:
+                json.dump({nom: _results_records(r) for nom, r in results_by_site.items()},
+                          f, ensure_ascii=False, indent=2)
+            log_with_time(f"Résultats JSON : {args.json}")
+        if args.parquet:
+            for nom, results in results_by_site.items():
+                results_to_parquet(results, os.path.join(args.parquet, safe_site_name(nom)))
+            log_with_time(f"Résultats Parquet : {args.parquet}")
+        return 0
+
+    if not args.ae_shp or not args.ze_shp:
+        parser.error("ae_shp et ze_shp sont requis sans --sites")
+    if args.json == '':
+        parser.error("--json : indiquer le fichier de sortie")
+    results = run_analysis(args.ae_shp, args.ze_shp, args.buffer_km, args.workers,
+                           None if args.no_excel else args.excel)
+    if results is None:
+        return 1
+    if args.json:
+        results_to_json(results, args.json)
+        log_with_time(f"Résultats JSON : {args.json}")
+    if args.parquet:
+        results_to_parquet(results, args.parquet)
+        log_with_time(f"Résultats Parquet : {args.parquet}")
+    return 0
 
 
 if __name__ == '__main__':
-    if len(sys.argv) < 3:
-        print("Usage: id_contexte_eco.py <ae_shp> <ze_shp> [buffer_km]")
-        sys.exit(1)
-    buffer_arg = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
-    run_analysis(sys.argv[1], sys.argv[2], buffer_arg)
+    sys.exit(main())
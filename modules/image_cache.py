@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Préparation des images insérées dans les documents Word.
+
+Les cartes sont exportées à 300 DPI (ou plus) pour la mise en page QGIS,
+alors qu'elles sont insérées sur 16 cm de large : la plupart des pixels sont
+inutiles et le .docx grossit de plusieurs dizaines de Mo. `prepare_image`
+ré-échantillonne l'image à la densité utile pour sa largeur d'insertion, la
+réencode (PNG optimisé ou JPEG, le plus léger) et garde le résultat dans
+``cache/images`` sous l'empreinte du contenu source : une même carte insérée
+dans plusieurs rapports n'est traitée qu'une fois.
+"""
+import os
+import io
+import json
+import hashlib
+import datetime
+import threading
+from typing import Dict, Tuple
+
+from PIL import Image
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+IMAGE_CACHE_DIR = os.path.join(REPO_ROOT, "cache", "images")
+
+# Densité des images insérées (celle de la compression "HD" de Word)
+TARGET_DPI = 220
+JPEG_QUALITY = 88
+# Changer cette valeur invalide les images déjà préparées
+_CACHE_VERSION = 1
+
+_DIGESTS: Dict[Tuple[str, int, int], str] = {}
+_DIGESTS_LOCK = threading.Lock()
+
+
+def log_with_time(msg: str) -> None:
+    print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+def source_digest(path: str) -> str:
+    """Empreinte du contenu, recalculée seulement si la taille ou la date change."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _DIGESTS_LOCK:
+        digest = _DIGESTS.get(key)
+    if digest is None:
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        with _DIGESTS_LOCK:
+            _DIGESTS[key] = digest
+    return digest
+
+
+def target_width_px(width_cm: float, dpi: int = TARGET_DPI) -> int:
+    return max(1, int(round(width_cm / 2.54 * dpi)))
+
+
+def _has_transparency(img: Image.Image) -> bool:
+    if img.mode in ("RGBA", "LA"):
+        return img.getchannel("A").getextrema()[0] < 255
+    return img.mode == "P" and "transparency" in img.info
+
+
+def _encode(img: Image.Image) -> Tuple[bytes, str]:
+    """Encodage le plus léger : PNG optimisé, ou JPEG si l'image est opaque."""
+    if _has_transparency(img):
+        buf = io.BytesIO()
+        img.convert("RGBA").save(buf, format="PNG", optimize=True)
+        return buf.getvalue(), ".png"
+    rgb = img.convert("RGB")
+    png = io.BytesIO()
+    rgb.save(png, format="PNG", optimize=True)
+    jpg = io.BytesIO()
+    rgb.save(jpg, format="JPEG", quality=JPEG_QUALITY, optimize=True, subsampling=0)
+    if jpg.tell() < png.tell():
+        return jpg.getvalue(), ".jpg"
+    return png.getvalue(), ".png"
+
+
+def prepare_image(path: str, width_cm: float, dpi: int = TARGET_DPI,
+                  cache_dir: str = IMAGE_CACHE_DIR) -> str:
+    """Chemin d'une version de `path` adaptée à une insertion sur `width_cm`.
+
+    En cas d'erreur, l'image source est retournée telle quelle.
+    """
+    try:
+        width_px = target_width_px(width_cm, dpi)
+        key = json.dumps([source_digest(path), width_px, _CACHE_VERSION])
+        stem = os.path.join(cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest()[:20])
+        for ext in (".png", ".jpg"):
+            if os.path.isfile(stem + ext):
+                os.utime(stem + ext)
+                return stem + ext
+
+        with Image.open(path) as img:
+            img.load()
+            if img.width > width_px:
+                height_px = max(1, int(round(img.height * width_px / img.width)))
+                if img.mode not in ("RGB", "RGBA", "L", "LA"):
+                    img = img.convert("RGBA")
+                img = img.resize((width_px, height_px), Image.LANCZOS)
+            data, ext = _encode(img)
+        if len(data) >= os.path.getsize(path) and os.path.splitext(path)[1].lower() == ext:
+            # Rien à gagner : la source est gardée telle quelle
+            with open(path, "rb") as f:
+                data = f.read()
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{stem}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, stem + ext)
+        return stem + ext
+    except Exception as e:
+        log_with_time(f"Image non optimisée ({os.path.basename(path)}) : {e}")
+        return path
+
+
+def prune_image_cache(max_age_days: float = 60.0, cache_dir: str = IMAGE_CACHE_DIR) -> None:
+    """Supprime les images préparées non réutilisées depuis longtemps."""
+    limit = datetime.datetime.now().timestamp() - max_age_days * 86400
+    try:
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            try:
+                if os.path.getmtime(path) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
+    except OSError:
+        pass
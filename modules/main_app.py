@@ -81,7 +81,7 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 
 from tkinter import font as tkfont
 
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
@@ -180,9 +180,29 @@ except Exception:
   # Import du worker QGIS externalisé
  
 try:
-    from .export_worker import worker_run
+    from .export_worker import EVENT_PREFIX, worker_run, is_rendered_view
+    from .export_inputs import (
+        GPKG_LAYER_AE, GPKG_LAYER_ZE, prepare_study_layers, cached_projects, sync_projects,
+        load_sites_csv, site_groups,
+    )
+    from .tiled_export import TILE_MIN_DPI, export_views_tiled
+    from .image_cache import prepare_image
+    from .export_pool import (
+        WorkerError, get_worker_pool, qgis_python, qgis_subprocess_env, shutdown_worker_pool,
+        INIT_TIMEOUT, JOB_TIMEOUT, load_export_costs, save_export_costs, record_export_cost, order_by_cost,
+    )
 except Exception:
-    from modules.export_worker import worker_run
+    from modules.export_worker import EVENT_PREFIX, worker_run, is_rendered_view
+    from modules.export_inputs import (
+        GPKG_LAYER_AE, GPKG_LAYER_ZE, prepare_study_layers, cached_projects, sync_projects,
+        load_sites_csv, site_groups,
+    )
+    from modules.tiled_export import TILE_MIN_DPI, export_views_tiled
+    from modules.image_cache import prepare_image
+    from modules.export_pool import (
+        WorkerError, get_worker_pool, qgis_python, qgis_subprocess_env, shutdown_worker_pool,
+        INIT_TIMEOUT, JOB_TIMEOUT, load_export_costs, save_export_costs, record_export_cost, order_by_cost,
+    )
   
   
   
@@ -250,6 +270,10 @@ MARGIN_FAC_DEFAULT = 1.15
 
 OVERWRITE_DEFAULT  = False
 
+RENDER_CACHE_DEFAULT = True  # cache disque des fonds de plan en ligne et cache raster GDAL des workers
+
+TILED_EXPORT_DEFAULT = True  # rendu PNG en bandes parallèles à partir de TILE_MIN_DPI
+
 
 
 LAYER_AE_NAME = "Aire d'étude élargie"
@@ -423,25 +447,41 @@ def qgis_multiprocessing_ok() -> bool:
 
 
 
-def run_worker_subprocess(projects: List[str], cfg: dict) -> tuple[int, int]:
+def run_worker_subprocess(projects: List[str], cfg: dict, on_event=None) -> tuple[int, int]:
 
-    """Exécute un lot via QGIS Python dans un sous-processus.
+    """Exécute un lot via QGIS Python dans un sous-processus à usage unique.
 
 
 
     Cette approche évite totalement multiprocessing dans l'interpréteur QGIS,
 
-    supprimant l'erreur `_multiprocessing`.
+    supprimant l'erreur `_multiprocessing`. Le chemin nominal passe désormais
+
+    par le pool de workers persistants (`export_pool`) ; cette fonction reste
+
+    le repli si le pool ne peut pas démarrer. Les évènements de progression
+
+    émis par le worker sont transmis au fil de l'eau à `on_event`.
+
+
+
+    Mêmes délais que le pool : sans évènement pendant `cfg["JOB_TIMEOUT"]`
+
+    secondes (plus `INIT_TIMEOUT` avant le premier, le temps que QGIS
+
+    démarre), le sous-processus est tué et le lot compté en échec.
 
     """
 
     import json as _json
 
+    import queue as _queue
+
     tmp = None
 
     try:
 
-        qgis_py = os.path.join(QGIS_ROOT, "apps", PY_VER, "python.exe")
+        qgis_py = qgis_python(cfg)
 
         if not os.path.isfile(qgis_py):
 
@@ -449,53 +489,107 @@ def run_worker_subprocess(projects: List[str], cfg: dict) -> tuple[int, int]:
 
 
 
-        repo_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+        data = {"projects": list(projects or []), "cfg": dict(cfg or {})}
 
-        qgis_py_root = os.path.join(QGIS_ROOT, "apps", PY_VER)
+        fd, tmp = tempfile.mkstemp(prefix="qgis_worker_", suffix=".json")
 
-        qgis_lib  = os.path.join(qgis_py_root, "Lib")
+        os.close(fd)
 
-        qgis_dlls = os.path.join(qgis_py_root, "DLLs")
+        with open(tmp, "w", encoding="utf-8") as f:
 
-        qgis_site = os.path.join(qgis_lib, "site-packages")
+            _json.dump(data, f)
 
-        qgis_app_py = os.path.join(QGIS_APP, "python")
 
 
+        env = qgis_subprocess_env(cfg)
 
-        data = {"projects": list(projects or []), "cfg": dict(cfg or {})}
+        cmd = [qgis_py, "-m", "modules.export_worker_cli", tmp]
 
-        fd, tmp = tempfile.mkstemp(prefix="qgis_worker_", suffix=".json")
+        lines = []
 
-        os.close(fd)
+        job_timeout = float(cfg.get("JOB_TIMEOUT", JOB_TIMEOUT))
 
-        with open(tmp, "w", encoding="utf-8") as f:
+        timeout = float(cfg.get("INIT_TIMEOUT", INIT_TIMEOUT)) + job_timeout
 
-            _json.dump(data, f)
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
 
+                              encoding="utf-8", errors="replace", env=env) as proc:
 
+            # stdout lu par un thread : l'attente d'une ligne peut expirer
 
-        env = os.environ.copy()
+            pending = _queue.Queue()
 
-        for k in ("PYTHONPATH", "PYTHONHOME", "PYTHONSTARTUP"):
 
-            env.pop(k, None)
 
-        env["PYTHONNOUSERSITE"] = "1"
+            def _read_stdout():
 
-        env["PYTHONHOME"] = qgis_py_root
+                try:
 
-        env["PYTHONPATH"] = os.pathsep.join([repo_root, qgis_py_root, qgis_lib, qgis_dlls, qgis_site, qgis_app_py])
+                    for raw in proc.stdout:
 
+                        pending.put(raw)
 
+                except (OSError, ValueError):
 
-        cmd = [qgis_py, "-m", "modules.export_worker_cli", tmp]
+                    pass
+
+                finally:
+
+                    pending.put(None)
+
+
+
+            threading.Thread(target=_read_stdout, daemon=True).start()
+
+            deadline = time.monotonic() + timeout
+
+            while True:
+
+                try:
+
+                    line = pending.get(timeout=max(0.0, deadline - time.monotonic()))
+
+                except _queue.Empty:
+
+                    proc.kill()
+
+                    proc.wait()
+
+                    log_with_time(f"Worker subproc sans réponse depuis {timeout:.0f}s, arrêté")
+
+                    return 0, len(projects or [])
+
+                if line is None:
+
+                    break
+
+                line = line.rstrip("\r\n")
+
+                if line.startswith(EVENT_PREFIX):
+
+                    deadline = time.monotonic() + job_timeout
+
+                    timeout = job_timeout
+
+                    if on_event:
+
+                        try:
+
+                            on_event(_json.loads(line[len(EVENT_PREFIX):]))
+
+                        except ValueError:
+
+                            pass
+
+                    continue
+
+                lines.append(line)
 
-        r = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env)
+            returncode = proc.wait()
 
-        out = (r.stdout or "").strip()
+        out = "\n".join(lines).strip()
 
-        if r.returncode == 0 and "," in out:
+        if returncode == 0 and "," in out:
 
             try:
 
@@ -509,7 +603,7 @@ def run_worker_subprocess(projects: List[str], cfg: dict) -> tuple[int, int]:
 
                 pass
 
-        log_with_time(f"Worker subproc KO (code={r.returncode}): {out[:400]}")
+        log_with_time(f"Worker subproc KO (code={returncode}): {out[:400]}")
 
         return 0, len(projects or [])
 
@@ -1067,6 +1161,9 @@ class ExportCartesTab(ttk.Frame):
 
         self.overwrite_var= tk.BooleanVar(value=self.prefs.get("OVERWRITE", OVERWRITE_DEFAULT))
 
+        self.render_cache_var = tk.BooleanVar(value=self.prefs.get("RENDER_CACHE", RENDER_CACHE_DEFAULT))
+        self.tiled_var = tk.BooleanVar(value=self.prefs.get("TILED_EXPORT", TILED_EXPORT_DEFAULT))
+
         self.dpi_var      = tk.IntVar(value=int(self.prefs.get("DPI", DPI_DEFAULT)))
 
         self.workers_var  = tk.IntVar(value=int(self.prefs.get("N_WORKERS", N_WORKERS_DEFAULT)))
@@ -1100,9 +1197,7 @@ class ExportCartesTab(ttk.Frame):
         # State
         self.busy = False
         self.wiki_last_url = ""
-        self._after_run_callback = None
-        self._report_active = False
-        self._report_iter = None
+        self._id_results = None
 
         # Vars used elsewhere
         self.out_dir_var = tk.StringVar(value=self.prefs.get("OUT_DIR", OUT_IMG))
@@ -1161,6 +1256,18 @@ class ExportCartesTab(ttk.Frame):
         ttk.Spinbox(opt_frm, from_=1.0, to=2.0, increment=0.05, textvariable=self.margin_var, width=6).grid(row=0, column=5, sticky="w")
 
         ttk.Checkbutton(opt_frm, text="Écraser existants", variable=self.overwrite_var, style="Card.TCheckbutton").grid(row=1, column=0, columnspan=2, sticky="w", pady=(6,0))
+        cb_cache = ttk.Checkbutton(opt_frm, text="Cache fonds de plan/rasters", variable=self.render_cache_var, style="Card.TCheckbutton")
+        cb_cache.grid(row=2, column=0, columnspan=2, sticky="w", pady=(4,0))
+        try:
+            ToolTip(cb_cache, "Cache disque des tuiles WMS/WMTS/XYZ et cache de blocs raster GDAL, partagés entre les vues et projets d'un worker (sans effet sur les couches vecteur)")
+        except Exception:
+            pass
+        cb_tiled = ttk.Checkbutton(opt_frm, text=f"Rendu en bandes (≥ {TILE_MIN_DPI} DPI)", variable=self.tiled_var, style="Card.TCheckbutton")
+        cb_tiled.grid(row=2, column=2, columnspan=4, sticky="w", pady=(4,0))
+        try:
+            ToolTip(cb_tiled, "Découpe la page en bandes rendues en parallèle par les workers (cartes rognées à chaque bande) : mémoire bornée aux DPI élevés")
+        except Exception:
+            pass
 
         ttk.Label(opt_frm, text="Type d'export").grid(row=1, column=2, sticky="w", pady=(6,0))
         types = ttk.Frame(opt_frm)
@@ -1196,6 +1303,12 @@ class ExportCartesTab(ttk.Frame):
         self.id_button.grid(row=0, column=1, sticky="ew", padx=(0,6))
         self.report_button = ttk.Button(act_frm, text="Rapport auto", command=self.start_report_sequence)
         self.report_button.grid(row=0, column=2, sticky="ew")
+        self.batch_button = ttk.Button(act_frm, text="Lot de sites (CSV)…", command=self.start_batch_export)
+        self.batch_button.grid(row=1, column=0, sticky="ew", padx=(0,6), pady=(6,0))
+        try:
+            ToolTip(self.batch_button, "CSV ze;ae;sortie[;site] : exporte tous les sites avec les projets cochés, chaque projet n'étant ouvert qu'une fois")
+        except Exception:
+            pass
 
         # ID buffer
         id_frm = ttk.Frame(left)
@@ -1459,7 +1572,7 @@ class ExportCartesTab(ttk.Frame):
                 run_t.bold = True
                 p_t.alignment = WD_ALIGN_PARAGRAPH.CENTER
                 p_img = cell.add_paragraph()
-                p_img.add_run().add_picture(path, width=Cm(12.5 * 0.8))
+                p_img.add_run().add_picture(prepare_image(path, 12.5 * 0.8), width=Cm(12.5 * 0.8))
                 p_img.alignment = WD_ALIGN_PARAGRAPH.CENTER
 
             doc.add_paragraph()
@@ -1873,11 +1986,43 @@ class ExportCartesTab(ttk.Frame):
 
     def _populate_projects(self):
 
+        # Liste issue de l'index local : l'interface n'attend pas le partage réseau
+
+        self._show_projects(cached_projects())
+
+        threading.Thread(target=self._refresh_projects, daemon=True).start()
+
+    def _refresh_projects(self):
+
+        """Liste le partage et met à jour les copies locales (thread de fond)."""
+
+        try:
+
+            found = discover_projects()
+
+            if found:
+
+                sync_projects(found, prune=True)
+
+        except Exception as e:
+
+            log_with_time(f"Synchronisation des projets impossible: {e}")
+
+            return
+
+        if found and found != self.all_projects:
+
+            self.after(0, lambda: (self._show_projects(found), self._apply_filter()))
+
+    def _show_projects(self, projects: List[str]):
+
         for w in list(self.scrollable_frame.children.values()): w.destroy()
 
+        previous = self.project_vars
+
         self.project_vars = {}
 
-        self.all_projects = discover_projects()
+        self.all_projects = list(projects)
 
         self.filtered_projects = list(self.all_projects)
 
@@ -1891,7 +2036,7 @@ class ExportCartesTab(ttk.Frame):
 
         for i, proj_path in enumerate(self.filtered_projects):
 
-            var = tk.IntVar(value=1); self.project_vars[proj_path] = var
+            var = previous.get(proj_path) or tk.IntVar(value=1); self.project_vars[proj_path] = var
 
             r, c = divmod(i, 2)
 
@@ -1999,12 +2144,64 @@ class ExportCartesTab(ttk.Frame):
 
 
 
+        self._launch_export(projets)
+
+    def start_batch_export(self):
+
+        """Export multi-sites : liste (ZE, AE, dossier de sortie) lue dans un CSV."""
+
+        if self.busy:
+
+            print("Une action est déjà en cours.", file=self.stdout_redirect)
+
+            return
+
+        projets = self._selected_projects()
+
+        if not projets:
+
+            messagebox.showerror("Erreur", "Sélectionnez au moins un projet."); return
+
+        csv_path = filedialog.askopenfilename(title="Liste des sites", filetypes=[("CSV", "*.csv"), ("Tous", "*.*")])
+
+        if not csv_path:
+
+            return
+
+        try:
+
+            sites = load_sites_csv(csv_path)
+
+        except Exception as e:
+
+            messagebox.showerror("Erreur", f"CSV illisible : {e}"); return
+
+        if not sites:
+
+            messagebox.showerror("Erreur", "Aucun site valide dans le CSV."); return
+
+        self._launch_export(projets, sites)
+
+    def _launch_export(self, projets: List[str], sites: Optional[List[Dict]] = None):
+
+        self._prepare_export(projets, sites)
+
+        t = threading.Thread(target=self._run_export_logic, args=(projets, sites), daemon=True)
+
+        t.start()
+
+    def _prepare_export(self, projets: List[str], sites: Optional[List[Dict]] = None):
+
+        """État de l'interface (boutons, progression) et préférences d'un export."""
+
         self.busy = True
 
         self.export_button.config(state="disabled")
         try:
             if hasattr(self, 'id_button') and self.id_button:
                 self.id_button.config(state="disabled")
+            if hasattr(self, 'batch_button') and self.batch_button:
+                self.batch_button.config(state="disabled")
         except Exception:
             pass
 
@@ -2018,7 +2215,7 @@ class ExportCartesTab(ttk.Frame):
 
         per_project = png_exports + qgs_exports
 
-        self.total_expected = per_project * len(projets)
+        self.total_expected = per_project * len(projets) * (len(sites) if sites else 1)
 
         self.progress_done = 0
 
@@ -2028,12 +2225,16 @@ class ExportCartesTab(ttk.Frame):
 
 
 
-        self.prefs.update({
+        self.prefs.update({} if sites else {
 
             "ZE_SHP": self.ze_shp_var.get(),
 
             "AE_SHP": self.ae_shp_var.get(),
 
+        })
+
+        self.prefs.update({
+
             "CADRAGE_MODE": self.cadrage_var.get(),
 
             "OVERWRITE": bool(self.overwrite_var.get()),
@@ -2048,17 +2249,15 @@ class ExportCartesTab(ttk.Frame):
 
             "EXPORT_TYPE": exp_type,
 
-        }); save_prefs(self.prefs)
-
-
+            "RENDER_CACHE": bool(self.render_cache_var.get()),
 
-        t = threading.Thread(target=self._run_export_logic, args=(projets,), daemon=True)
+            "TILED_EXPORT": bool(self.tiled_var.get()),
 
-        t.start()
+        }); save_prefs(self.prefs)
 
 
 
-    def _run_export_logic(self, projets: List[str]):
+    def _run_export_logic(self, projets: List[str], sites: Optional[List[Dict]] = None):
 
         old_stdout = sys.stdout
 
@@ -2066,263 +2265,301 @@ class ExportCartesTab(ttk.Frame):
 
         try:
 
-            start = datetime.datetime.now()
+            ok_total, ko_total = self._export_projects(projets, sites)
 
-            out_dir = self.out_dir_var.get() or OUT_IMG
+            self.after(0, lambda: self.status_label.config(text=f"Terminé — OK={ok_total} / KO={ko_total}"))
 
-            os.makedirs(out_dir, exist_ok=True)
+        except Exception as e:
 
-            log_with_time(f"{len(projets)} projets (attendu = calcul en cours)")
+            log_with_time(f"Erreur critique: {e}")
 
-            log_with_time(f"Workers={self.workers_var.get()}, DPI={self.dpi_var.get()}, marge={self.margin_var.get():.2f}, overwrite={self.overwrite_var.get()}")
+            _err = str(e)
 
-            workers = int(self.workers_var.get())
+            self.after(0, lambda msg=_err: messagebox.showerror("Erreur", msg))
 
-            # Désactive provisoirement le multiprocessing pour éviter les erreurs _multiprocessing
+        finally:
 
-            workers = workers
+            sys.stdout = old_stdout
 
-            chunks = chunk_even(projets, workers)
+            self.after(0, self._run_finished)
 
-            # Forcer au moins 2 workers pour utiliser ProcessPoolExecutor
+    def _export_projects(self, projets: List[str], sites: Optional[List[Dict]] = None) -> Tuple[int, int]:
 
-            # (et donc le Python de QGIS configuré ci-dessous)
+        """Exporte les projets (sortie console déjà redirigée) et retourne (OK, KO)."""
 
-            workers = max(1, workers)
+        start = datetime.datetime.now()
 
-            cfg = {
+        out_dir = self.out_dir_var.get() or OUT_IMG
 
-                "QGIS_ROOT": QGIS_ROOT,
+        os.makedirs(out_dir, exist_ok=True)
 
-                "QGIS_APP": QGIS_APP,
+        log_with_time(f"{len(projets)} projets (attendu = calcul en cours)")
 
-                "PY_VER": PY_VER,
+        log_with_time(f"Workers={self.workers_var.get()}, DPI={self.dpi_var.get()}, marge={self.margin_var.get():.2f}, overwrite={self.overwrite_var.get()}")
 
-                "EXPORT_DIR": out_dir,
+        workers = max(1, int(self.workers_var.get()))
 
-                "DPI": int(self.dpi_var.get()),
+        # Projets les plus coûteux d'abord (durées mesurées aux exports précédents)
 
-                "MARGIN_FAC": float(self.margin_var.get()),
+        costs = load_export_costs()
 
-                "LAYER_AE_NAME": LAYER_AE_NAME,
+        projets = order_by_cost(projets, costs)
 
-                "LAYER_ZE_NAME": LAYER_ZE_NAME,
+        # Les workers lisent les copies locales (seuls les projets modifiés sont recopiés)
 
-                "AE_SHP": self.ae_shp_var.get(),
+        try:
 
-                "ZE_SHP": self.ze_shp_var.get(),
+            local = sync_projects(projets)
 
-                "CADRAGE_MODE": self.cadrage_var.get(),
+        except Exception as e:
 
-                "OVERWRITE": bool(self.overwrite_var.get()),
+            log_with_time(f"Copie locale des projets impossible: {e}")
 
-                "EXPORT_TYPE": self.export_type_var.get(),
+            local = {}
 
-                "WORKERS": workers,
+        project_sources = {local[p]: os.path.dirname(p) for p in projets if p in local}
 
-            }
+        projets = [local.get(p, p) for p in projets]
 
-            ok_total = 0
+        cfg = {
 
-            ko_total = 0
+            "QGIS_ROOT": QGIS_ROOT,
 
-            def ui_update_progress(done_inc):
+            "QGIS_APP": QGIS_APP,
 
-                self.progress_done += done_inc
+            "PY_VER": PY_VER,
 
-                self.progress["value"] = min(self.progress_done, self.total_expected)
+            "EXPORT_DIR": out_dir,
 
-                self.status_label.config(text=f"Progression : {self.progress_done}/{self.total_expected}")
+            "DPI": int(self.dpi_var.get()),
 
-            if workers <= 1:
+            "MARGIN_FAC": float(self.margin_var.get()),
 
-                for chunk in chunks:
+            "LAYER_AE_NAME": LAYER_AE_NAME,
 
-                    ok, ko = run_worker_subprocess(chunk, cfg)
+            "LAYER_ZE_NAME": LAYER_ZE_NAME,
 
-                    ok_total += ok
+            "AE_SHP": self.ae_shp_var.get(),
 
-                    ko_total += ko
+            "ZE_SHP": self.ze_shp_var.get(),
 
-                    self.after(0, ui_update_progress, ok + ko)
+            "CADRAGE_MODE": self.cadrage_var.get(),
 
-                    log_with_time(f"Lot terminé: {ok} OK, {ko} KO")
+            "OVERWRITE": bool(self.overwrite_var.get()),
 
-            else:
+            "EXPORT_TYPE": self.export_type_var.get(),
 
-                try:
+            "RENDER_CACHE": bool(self.render_cache_var.get()),
 
-                    import multiprocessing as mp
+            "WORKERS": workers,
 
-                    # Nettoyage de l'environnement hérité pour éviter collisions Python 3.12/3.13
+            "PROJECT_SOURCES": project_sources,
 
-                    for _k in ("PYTHONHOME", "PYTHONPATH", "PYTHONSTARTUP"):
+            "GPKG_LAYER_AE": GPKG_LAYER_AE,
 
-                        try:
+            "GPKG_LAYER_ZE": GPKG_LAYER_ZE,
 
-                            os.environ.pop(_k, None)
+        }
 
-                        except Exception:
+        # AE/ZE copiées une fois en GeoPackage local, dans le SCR des projets
 
-                            pass
+        for target in (sites or [cfg]):
 
-                    os.environ["PYTHONNOUSERSITE"] = "1"
+            try:
 
-                    # Fixer PYTHONHOME et PYTHONPATH sur le Python de QGIS
+                target["STUDY_GPKG"] = prepare_study_layers(target["AE_SHP"], target["ZE_SHP"], projets)
 
-                    try:
+            except Exception as e:
 
-                        qgis_py_root = os.path.join(QGIS_ROOT, "apps", PY_VER)
+                log_with_time(f"Aires d'étude non copiées en local: {e}")
 
-                        if os.path.isdir(qgis_py_root):
+        if sites:
 
-                            os.environ["PYTHONHOME"] = qgis_py_root
+            log_with_time(f"Campagne multi-sites : {len(sites)} site(s) × {len(projets)} projet(s)")
 
-                            qgis_lib   = os.path.join(qgis_py_root, "Lib")
+            for site in sites:
 
-                            qgis_dlls  = os.path.join(qgis_py_root, "DLLs")
+                os.makedirs(site["EXPORT_DIR"], exist_ok=True)
 
-                            qgis_site  = os.path.join(qgis_lib, "site-packages")
+        ok_total = 0
 
-                            qgis_app_py = os.path.join(QGIS_APP, "python")
+        ko_total = 0
 
-                            py_paths = [qgis_py_root, qgis_lib, qgis_dlls, qgis_site, qgis_app_py]
+        def ui_update_progress(done_inc):
 
-                            os.environ["PYTHONPATH"] = os.pathsep.join(py_paths)
+            self.progress_done += done_inc
 
-                            # Préfixer le PATH avec les dossiers Python QGIS pour la résolution des DLLs
+            self.progress["value"] = min(self.progress_done, self.total_expected)
 
-                            os.environ["PATH"] = os.pathsep.join([qgis_py_root, qgis_dlls, os.environ.get("PATH", "")])
+            self.status_label.config(text=f"Progression : {self.progress_done}/{self.total_expected}")
 
-                            log_with_time(f"PYTHONHOME={qgis_py_root}")
+        # Workers QGIS persistants : démarrés au premier export, réutilisés ensuite
 
-                    except Exception:
+        pool = get_worker_pool()
 
-                        pass
+        try:
 
-                    # Fixer PYTHONHOME sur le Python de QGIS pour que l'interprète trouve sa stdlib
+            t_pool = time.perf_counter()
 
-                    try:
+            n_ready = pool.ensure(workers, cfg)
 
-                        qgis_py_root = os.path.join(QGIS_ROOT, "apps", PY_VER)
+            log_with_time(f"Pool QGIS prêt : {n_ready} worker(s) en {time.perf_counter() - t_pool:.1f}s")
 
-                        if os.path.isdir(qgis_py_root):
+        except Exception as e:
 
-                            os.environ["PYTHONHOME"] = qgis_py_root
+            pool = None
 
-                            log_with_time(f"PYTHONHOME={qgis_py_root}")
+            log_with_time(f"Pool QGIS indisponible ({e}) — repli sur un sous-processus par lot")
 
-                    except Exception:
+        # DPI élevé : vues PNG rendues en bandes réparties sur tous les workers
 
-                        pass
+        tiled = (pool is not None and not sites and bool(self.tiled_var.get()) and cfg["DPI"] >= TILE_MIN_DPI
 
-                    ctx = mp.get_context("spawn")
+                 and cfg["EXPORT_TYPE"] in ("PNG", "BOTH"))
 
-                    try:
+        if tiled:
 
-                        qgis_py = os.path.join(QGIS_ROOT, "apps", PY_VER, "python.exe")
+            log_with_time(f"Rendu en bandes activé ({cfg['DPI']} DPI)")
 
-                        if os.path.isfile(qgis_py):
+        def on_view_event(evt: dict, seen: List[int]) -> None:
 
-                            ctx.set_executable(qgis_py)
+            kind = evt.get("type")
 
-                            log_with_time(f"MP exe: {qgis_py}")
+            where = f" ({evt['site']})" if evt.get("site") else ""
 
-                        else:
+            if kind == "start":
 
-                            log_with_time(f"Python QGIS introuvable: {qgis_py}")
+                log_with_time(f"→ {evt.get('project')}{where}")
 
-                    except Exception as e:
+            elif kind == "view":
 
-                        log_with_time(f"set_executable échec: {e}")
+                state = "déjà à jour" if evt.get("skipped") else ("OK" if evt.get("ok") else "KO")
 
-                except Exception as e:
+                log_with_time(f"   {evt.get('project')}{where} [{evt.get('view')}] {state} en {float(evt.get('duration') or 0):.1f}s")
 
-                    log_with_time(f"init multiprocessing: {e}")
+                seen[0] += 1
 
-                # Ajuster temporairement sys.path pour privilégier les libs QGIS
+                self.after(0, ui_update_progress, 1)
 
-                old_syspath = list(sys.path)
+        def run_job(paths: List[str], group: Optional[List[Dict]] = None) -> Tuple[int, int]:
 
-                try:
+            seen = [0]
 
-                    qgis_py_root = os.path.join(QGIS_ROOT, "apps", PY_VER)
+            handler = lambda evt: on_view_event(evt, seen)
 
-                    qgis_py_lib = os.path.join(qgis_py_root, "Lib")
+            rendered = [0]
 
-                    qgis_site = os.path.join(qgis_py_lib, "site-packages")
+            def tiled_handler(evt: dict) -> None:
 
-                    qgis_app_py = os.path.join(QGIS_APP, "python")
+                if is_rendered_view(evt):
 
-                    def _keep_path(p: str) -> bool:
+                    rendered[0] += 1
 
-                        if not isinstance(p, str):
+                handler(evt)
 
-                            return False
+            # Multi-sites : le worker lit le projet une fois et le relie à chaque site du groupe
 
-                        l = p.lower()
+            job_cfg = dict(cfg, SITES=group) if group else cfg
 
-                        if "python313" in l or "python311" in l or "python310" in l or "python39" in l:
+            if pool is None:
 
-                            return False
+                ok, ko = run_worker_subprocess(paths, job_cfg, handler)
 
-                        if ".venv" in l:
+            elif tiled:
 
-                            return False
+                t0 = time.perf_counter()
 
-                        return True
+                handler({"type": "start", "project": os.path.splitext(os.path.basename(paths[0]))[0]})
 
-                    sys.path = [qgis_py_root, qgis_py_lib, qgis_site, qgis_app_py] + [p for p in old_syspath if _keep_path(p)]
+                ok, ko = export_views_tiled(pool, paths[0], cfg, tiled_handler)
 
-                except Exception as e:
+                if cfg["EXPORT_TYPE"] == "BOTH":
 
-                    log_with_time(f"sys.path cleanup skip: {e}")
+                    try:
 
-                with ThreadPoolExecutor(max_workers=workers) as ex:
+                        res = pool.run(paths, dict(cfg, EXPORT_TYPE="QGS"), lambda evt: evt.get("type") != "start" and tiled_handler(evt))
 
-                    futures = [ex.submit(run_worker_subprocess, chunk, cfg) for chunk in chunks if chunk]
+                    except WorkerError as e:
 
-                    for fut in as_completed(futures):
+                        log_with_time(f"Worker QGIS KO ({os.path.basename(paths[0])}): {e}")
 
-                        try:
+                        res = {"ok": 0, "ko": 1}
 
-                            ok, ko = fut.result()
+                    ok += int(res.get("ok", 0)); ko += int(res.get("ko", 0))
 
-                            ok_total += ok
+                # Vues toutes à jour : durée non représentative, ignorée
 
-                            ko_total += ko
+                record_export_cost(costs, paths[0], time.perf_counter() - t0, rendered[0])
 
-                            self.after(0, ui_update_progress, ok + ko)
+            else:
 
-                            log_with_time(f"Lot terminé: {ok} OK, {ko} KO")
+                try:
 
-                        except Exception as e:
+                    res = pool.run(paths, job_cfg, handler)
 
-                            log_with_time(f"Erreur worker: {e}")
+                except WorkerError as e:
 
-                # Restaure le sys.path initial
+                    log_with_time(f"Worker QGIS KO ({', '.join(os.path.basename(p) for p in paths)}): {e}")
 
-                sys.path = old_syspath
+                    res = {"ok": 0, "ko": len(paths)}
 
-            elapsed = datetime.datetime.now() - start
+                if res.get("duration") is not None and len(paths) == 1:
 
-            log_with_time(f"FIN — OK={ok_total} | KO={ko_total} | Attendu={self.total_expected} | Durée={elapsed}")
+                    record_export_cost(costs, paths[0], res["duration"], int(res.get("rendered", 0)))
 
-            self.after(0, lambda: self.status_label.config(text=f"Terminé — OK={ok_total} / KO={ko_total}"))
+                ok, ko = int(res.get("ok", 0)), int(res.get("ko", 0))
 
-        except Exception as e:
+            # Sorties non signalées individuellement (projet illisible, worker tombé…)
 
-            log_with_time(f"Erreur critique: {e}")
+            rest = ok + ko - seen[0]
 
-            _err = str(e)
+            if rest > 0:
 
-            self.after(0, lambda msg=_err: messagebox.showerror("Erreur", msg))
+                self.after(0, ui_update_progress, rest)
 
-        finally:
+            return ok, ko
 
-            sys.stdout = old_stdout
+        # Rendu en bandes : projets l'un après l'autre, les bandes d'une vue occupent
 
-            self.after(0, self._run_finished)
+        # tout le pool et chaque worker garde le même projet cadré d'une bande à l'autre
+
+        with ThreadPoolExecutor(max_workers=1 if tiled else workers) as ex:
+
+            groups = site_groups(sites, len(projets), workers) if sites else [None]
+
+            if pool is not None:
+
+                # File de travail dynamique : un job par projet (et groupe de sites),
+
+                # chaque worker libre prend le suivant (ordre LPT ci-dessus)
+
+                futures = [ex.submit(run_job, [p], g) for p in projets for g in groups]
+
+            else:
+
+                futures = [ex.submit(run_job, chunk, g) for chunk in chunk_even(projets, workers) if chunk for g in groups]
+
+            for fut in as_completed(futures):
+
+                try:
+
+                    ok, ko = fut.result()
+
+                    ok_total += ok
+
+                    ko_total += ko
+
+                except Exception as e:
+
+                    log_with_time(f"Erreur worker: {e}")
+
+        save_export_costs(costs)
+
+        elapsed = datetime.datetime.now() - start
+
+        log_with_time(f"FIN — OK={ok_total} | KO={ko_total} | Attendu={self.total_expected} | Durée={elapsed}")
+
+        return ok_total, ko_total
 
 
 
@@ -2390,13 +2627,9 @@ class ExportCartesTab(ttk.Frame):
         sys.stdout = self.stdout_redirect
 
         try:
-            # Import robuste: relatif (via package) puis absolu (script direct)
-            try:
-                from .id_contexte_eco import run_analysis as run_id_context
-            except Exception:
-                from id_contexte_eco import run_analysis as run_id_context
+            if self._identify_zonages(ae, ze, buffer_km) is None:
 
-            run_id_context(ae, ze, buffer_km)
+                raise RuntimeError("analyse des zonages en échec (voir le journal)")
 
             log_with_time("Analyse terminée.")
 
@@ -2420,137 +2653,100 @@ class ExportCartesTab(ttk.Frame):
 
 
 
+    def _identify_zonages(self, ae: str, ze: str, buffer_km: float):
+        """Analyse des zonages ; les résultats sont gardés pour le rapport Word."""
+        # Import robuste: relatif (via package) puis absolu (script direct)
+        try:
+            from .id_contexte_eco import run_analysis as run_id_context
+        except Exception:
+            from id_contexte_eco import run_analysis as run_id_context
+
+        self._id_results = None
+        self._id_results = run_id_context(ae, ze, buffer_km)
+        return self._id_results
+
     def _run_finished(self):
-        if not getattr(self, '_report_active', False):
-            self.export_button.config(state="normal")
-            try:
-                if hasattr(self, 'id_button') and self.id_button:
-                    self.id_button.config(state="normal")
-            except Exception:
-                pass
-            try:
-                if hasattr(self, 'report_button') and self.report_button:
-                    self.report_button.config(state="normal")
-            except Exception:
-                pass
-            self.busy = False
-        cb = getattr(self, '_after_run_callback', None)
-        if cb:
-            self._after_run_callback = None
-            self.after(0, cb)
+        self.export_button.config(state="normal")
+        try:
+            if hasattr(self, 'id_button') and self.id_button:
+                self.id_button.config(state="normal")
+        except Exception:
+            pass
+        try:
+            if hasattr(self, 'report_button') and self.report_button:
+                self.report_button.config(state="normal")
+            if hasattr(self, 'batch_button') and self.batch_button:
+                self.batch_button.config(state="normal")
+        except Exception:
+            pass
+        self.busy = False
 
     # ---------- Rapport automatique ----------
 
     def start_report_sequence(self):
+        """Rapport auto : ID des zonages et export des cartes en parallèle, puis Word."""
         if self.busy:
             print("Une action est déjà en cours.", file=self.stdout_redirect)
             return
-        self._report_active = True
-        self._report_iter = iter(['id', 'export', 'word'])
-        self.export_button.config(state="disabled")
+        ae = to_long_unc(os.path.normpath(self.ae_shp_var.get().strip()))
+        ze = to_long_unc(os.path.normpath(self.ze_shp_var.get().strip()))
+        if not self.ae_shp_var.get().strip() or not self.ze_shp_var.get().strip():
+            messagebox.showerror("Erreur", "Sélectionnez les deux shapefiles."); return
+        if not os.path.isfile(ae) or not os.path.isfile(ze):
+            messagebox.showerror("Erreur", "Un shapefile est introuvable."); return
+        projets = self._selected_projects()
+        if not projets:
+            messagebox.showerror("Erreur", "Sélectionnez au moins un projet."); return
+
+        buffer_km = float(self.buffer_var.get())
+        self.prefs.update({"ID_TAMPON_KM": buffer_km})
+        self._prepare_export(projets)
+        self.report_button.config(state="disabled")
+        t = threading.Thread(target=self._run_report_pipeline, args=(ae, ze, buffer_km, projets), daemon=True)
+        t.start()
+
+    def _run_report_pipeline(self, ae: str, ze: str, buffer_km: float, projets: List[str]):
         try:
-            if hasattr(self, 'id_button') and self.id_button:
-                self.id_button.config(state="disabled")
+            from .report_pipeline import run_task_graph, timings_summary, FAILED
         except Exception:
-            pass
-        self.report_button.config(state="disabled")
-        self.busy = True
-        self._run_next_report_step()
+            from report_pipeline import run_task_graph, timings_summary, FAILED
 
-    def _run_next_report_step(self):
+        def identify():
+            if self._identify_zonages(ae, ze, buffer_km) is None:
+                raise RuntimeError("analyse des zonages en échec")
+
+        old_stdout = sys.stdout
+        sys.stdout = self.stdout_redirect
         try:
-            step = next(self._report_iter)
-        except StopIteration:
-            self._report_active = False
-            self._run_finished()
-            self.status_label.config(text="Terminé")
-            return
-        if step == 'id':
-            self._after_run_callback = self._run_next_report_step
-            self.start_id_thread()
-        elif step == 'export':
-            self._after_run_callback = self._run_next_report_step
-            self.start_export_thread()
-        elif step == 'word':
-            try:
-                self.generate_report()
-            except Exception as e:
-                print(f"Erreur génération rapport: {e}", file=self.stdout_redirect)
-                self.after(0, lambda msg=str(e): messagebox.showerror("Erreur", msg))
-            self._run_next_report_step()
+            log_with_time("Rapport auto : ID des zonages et export des cartes en parallèle")
+            # L'ID (CPU, geopandas) et l'export (sous-processus QGIS) sont indépendants
+            report = run_task_graph({
+                'id': (identify, ()),
+                'export': (lambda: self._export_projects(projets), ()),
+                'word': (self.generate_report, ('id', 'export')),
+            })
+            log_with_time(f"Rapport auto — {timings_summary(report, ['id', 'export', 'word'])}")
+            errors = [f"{name} : {entry['error']}" for name, entry in report.items() if entry['status'] == FAILED]
+            if errors:
+                self.after(0, lambda msg="\n".join(errors): messagebox.showerror("Erreur", msg))
+                self.after(0, lambda: self.status_label.config(text="Terminé avec erreurs"))
+            else:
+                self.after(0, lambda: self.status_label.config(text="Terminé"))
+        except Exception as e:
+            log_with_time(f"Erreur génération rapport: {e}")
+            _err = str(e)
+            self.after(0, lambda msg=_err: messagebox.showerror("Erreur", msg))
+        finally:
+            sys.stdout = old_stdout
+            self.after(0, self._run_finished)
 
     def generate_report(self):
-        xlsx = os.path.join(OUT_IMG, 'ID zonages.xlsx')
-        if not os.path.isfile(xlsx):
-            raise FileNotFoundError("Fichier d'analyse introuvable")
-        tpl_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Template word  Contexte éco'))
-        tpl_path = os.path.join(tpl_dir, '1 Template Contexte éco.docx')
-        if not os.path.isfile(tpl_path):
-            raise FileNotFoundError("Template Word introuvable")
-        out_doc = os.path.join(OUT_IMG, f"Rapport Contexte eco {datetime.datetime.now():%Y%m%d_%H%M%S}.docx")
-        shutil.copy(tpl_path, out_doc)
-        doc = Document(out_doc)
-        xls = pd.ExcelFile(xlsx)
-
-        def find_sheets(patterns):
-            found = []
-            for pat in patterns:
-                for name in xls.sheet_names:
-                    if pat.lower() in name.lower():
-                        found.append(name)
-            return found
-
-        table_map = {
-            'TABLEAU NATURA2000': ['Natura 2000'],
-            'TABLEAU ZNIEFF': ['ZNIEFF de Type I', 'ZNIEFF de Type II'],
-            'TABLEAU APPB': ['APPB'],
-            'TABLEAU ENS': ['ENS'],
-            'TABLEAU PNN': ['PNN', 'Parc National', 'PN'],
-            'TABLEAU PRN': ['PRN', 'Parc Naturel Régional', 'PR']
-        }
-        image_map = {
-            'CARTE NATURA2000': 'Contexte éco - N2000__AE.png',
-            'CARTE ZNIEFF': 'Contexte éco - ZNIEFF__AE.png',
-            'CARTE APPB': 'Contexte éco - APPB__AE.png',
-            'CARTE ENS': 'Contexte éco - ENS__AE.png',
-            'CARTE PNN': 'Contexte éco - Parc National__AE.png',
-            'CARTE PRN': 'Contexte éco - Parc Naturel Régional__AE.png'
-        }
-
-        for para in list(doc.paragraphs):
-            text = para.text.strip()
-            if text in table_map:
-                sheets = find_sheets(table_map[text])
-                dfs = [pd.read_excel(xls, sheet) for sheet in sheets]
-                if dfs:
-                    df = pd.concat(dfs, ignore_index=True)
-                    self._insert_table_from_df(doc, para, df)
-            elif text in image_map:
-                img_path = os.path.join(OUT_IMG, image_map[text])
-                if os.path.isfile(img_path):
-                    self._insert_image(para, img_path)
-        doc.save(out_doc)
-
-    def _insert_table_from_df(self, doc, paragraph, df):
-        table = doc.add_table(rows=df.shape[0] + 1, cols=df.shape[1])
-        table.style = 'Table Grid'
-        for j, col in enumerate(df.columns):
-            table.cell(0, j).text = str(col)
-        for i, row in df.iterrows():
-            for j, val in enumerate(row):
-                table.cell(i + 1, j).text = str(val)
-        parent = paragraph._p.getparent()
-        idx = parent.index(paragraph._p)
-        parent.insert(idx + 1, table._tbl)
-        parent.remove(paragraph._p)
-
-    def _insert_image(self, paragraph, img_path):
-        img_par = paragraph.insert_paragraph_before()
-        run = img_par.add_run()
-        run.add_picture(img_path, width=Cm(16))
-        img_par.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        parent = paragraph._p.getparent()
-        parent.remove(paragraph._p)
+        # Résultats de l'ID de cette session ; sinon le classeur est relu
+        try:
+            from .report_builder import build_report
+        except Exception:
+            from report_builder import build_report
+        build_report(getattr(self, '_id_results', None), OUT_IMG)
 
 
 
@@ -2638,6 +2834,12 @@ class Application(tk.Tk):
         # Call the cleanup method for the shared browser
         if hasattr(self, 'export_tab'):
             self.export_tab._cleanup_driver()
+
+        # Arrêt des workers QGIS persistants
+        try:
+            shutdown_worker_pool()
+        except Exception:
+            pass
         
         # Cleanup Carto tab resources
         if hasattr(self, 'carto_tab') and self.carto_tab:
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""Assemblage du rapport Word "Contexte éco".
+
+Le modèle contient des paragraphes repères : ``TABLEAU …`` (remplacé par les
+tableaux des couches de zonage correspondantes) et ``CARTE …`` (remplacé par
+la carte exportée). Les tableaux proviennent directement des résultats de
+l'ID contexte éco en mémoire (`id_contexte_eco.run_analysis`) ; le classeur
+``ID zonages.xlsx`` n'est relu que si ces résultats ne sont pas disponibles.
+
+Les lignes d'un tableau sont générées en XML en une passe (une ligne ``w:tr``
+copiée d'un modèle par enregistrement) au lieu de remplir les cellules une à
+une par ``table.cell(i, j)``, dont le coût croît avec le nombre de lignes.
+
+Le modèle est analysé une fois par processus (`compile_template`) : le
+document analysé et la position des repères dans son corps sont gardés
+jusqu'à ce que le fichier change. Chaque rapport part d'une copie de ce
+document (sans relire le .docx) et va directement aux repères, sans
+parcourir tous les paragraphes.
+
+Rapports d'une campagne : ``python -m modules.report_builder [--sites CSV]
+[dossier ...]`` (voir `build_reports`).
+"""
+import io
+import os
+import re
+import sys
+import copy
+import json
+import argparse
+import datetime
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from docx import Document
+from docx.shared import Cm
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
+
+try:
+    from .image_cache import prepare_image, prune_image_cache
+    from .export_inputs import load_sites_csv, safe_site_name, unique_site_name
+except Exception:
+    try:
+        from modules.image_cache import prepare_image, prune_image_cache
+        from modules.export_inputs import load_sites_csv, safe_site_name, unique_site_name
+    except Exception:
+        from image_cache import prepare_image, prune_image_cache
+        from export_inputs import load_sites_csv, safe_site_name, unique_site_name
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+TEMPLATE_PATH = os.path.join(REPO_ROOT, "Template word  Contexte éco", "1 Template Contexte éco.docx")
+EXCEL_NAME = "ID zonages.xlsx"
+JSON_NAME = "ID zonages.json"
+
+# Repère du modèle -> motifs cherchés dans le nom des couches
+TABLE_MAP = {
+    'TABLEAU NATURA2000': ['Natura 2000'],
+    'TABLEAU ZNIEFF': ['ZNIEFF de Type I', 'ZNIEFF de Type II'],
+    'TABLEAU APPB': ['APPB'],
+    'TABLEAU ENS': ['ENS'],
+    'TABLEAU PNN': ['PNN', 'Parc National', 'PN'],
+    'TABLEAU PRN': ['PRN', 'Parc Naturel Régional', 'PR'],
+}
+# Repère du modèle -> carte exportée
+IMAGE_MAP = {
+    'CARTE NATURA2000': 'Contexte éco - N2000__AE.png',
+    'CARTE ZNIEFF': 'Contexte éco - ZNIEFF__AE.png',
+    'CARTE APPB': 'Contexte éco - APPB__AE.png',
+    'CARTE ENS': 'Contexte éco - ENS__AE.png',
+    'CARTE PNN': 'Contexte éco - Parc National__AE.png',
+    'CARTE PRN': 'Contexte éco - Parc Naturel Régional__AE.png',
+}
+IMAGE_WIDTH_CM = 16
+
+_TEMPLATES: Dict[str, Dict] = {}
+_TEMPLATES_LOCK = threading.Lock()
+
+_XML_SPACE = '{http://www.w3.org/XML/1998/namespace}space'
+_SPECIAL_CHARS = re.compile(r'(\n|\t)')
+
+
+def log_with_time(msg: str) -> None:
+    print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+def _paragraph_text(p) -> str:
+    return ''.join(t.text or '' for t in p.iter(qn('w:t'))).strip()
+
+
+def compile_template(template_path: str = TEMPLATE_PATH) -> Dict:
+    """Modèle analysé : contenu du fichier, document analysé (``doc``) et
+    repères ``[(position dans le corps, repère)]``.
+
+    Mémorisé par processus tant que la taille et la date du fichier ne
+    changent pas. ``doc`` sert de base à chaque rapport (`new_report_document`)
+    et n'est jamais modifié.
+    """
+    st = os.stat(template_path)
+    signature = (st.st_size, st.st_mtime_ns)
+    with _TEMPLATES_LOCK:
+        compiled = _TEMPLATES.get(template_path)
+        if compiled is not None and compiled['signature'] == signature:
+            return compiled
+    with open(template_path, 'rb') as f:
+        data = f.read()
+    doc = Document(io.BytesIO(data))
+    body = doc.element.body
+    markers = []
+    for i, child in enumerate(body.iterchildren()):
+        if child.tag != qn('w:p'):
+            continue
+        text = _paragraph_text(child)
+        if text in TABLE_MAP or text in IMAGE_MAP:
+            markers.append((i, text))
+    compiled = {'signature': signature, 'data': data, 'doc': doc, 'markers': markers}
+    with _TEMPLATES_LOCK:
+        _TEMPLATES[template_path] = compiled
+    return compiled
+
+
+def new_report_document(template: Dict):
+    """Document d'un nouveau rapport : copie du modèle déjà analysé."""
+    return copy.deepcopy(template['doc'])
+
+
+def results_from_excel(xlsx_path: str) -> Dict:
+    """Tableaux des couches relus depuis ``ID zonages.xlsx`` (repli sans résultats en mémoire).
+
+    Le classeur est ouvert une seule fois ; la ligne de titre des onglets de
+    couche est ignorée pour retrouver les colonnes des résultats (elle est
+    régénérée par `layer_title` dans le rapport).
+    """
+    with pd.ExcelFile(xlsx_path) as xls:
+        couches = {name: pd.read_excel(xls, name, header=1)
+                   for name in xls.sheet_names if name.upper() != 'SYNTHÈSE'}
+    return {'couches': couches}
+
+
+def results_from_json(json_path: str) -> Dict:
+    """Résultats écrits par `id_contexte_eco.results_to_json`."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {
+        'synthese': pd.DataFrame(data.get('synthese') or []),
+        'couches': {nom: pd.DataFrame(records) for nom, records in (data.get('couches') or {}).items()},
+    }
+
+
+def find_tables(couches: Dict[str, pd.DataFrame], patterns: List[str]) -> List[str]:
+    """Couches dont le nom contient un des motifs (ordre des motifs, sans doublon)."""
+    found = []
+    for pat in patterns:
+        for name in couches:
+            if pat.lower() in name.lower() and name not in found:
+                found.append(name)
+    return found
+
+
+def _cell_text(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    try:
+        if pd.isna(value):
+            return ''
+    except (TypeError, ValueError):
+        pass
+    # Entiers relus en flottants (colonne avec des vides) : "12" et non "12.0"
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def layer_title(nom: str, df: pd.DataFrame) -> List[str]:
+    """Ligne de titre d'une couche, comme en tête de son onglet Excel."""
+    return [nom, f"Nombre de {nom} dans l'aire d'étude élargie : {len(df)}"]
+
+
+def _set_run_text(r, text: str) -> None:
+    """Texte d'un run ``w:r`` ; retours à la ligne et tabulations comme python-docx."""
+    for child in list(r):
+        if child.tag != qn('w:rPr'):
+            r.remove(child)
+    for piece in _SPECIAL_CHARS.split(text):
+        if piece == '\n':
+            r.append(OxmlElement('w:br'))
+        elif piece == '\t':
+            r.append(OxmlElement('w:tab'))
+        elif piece:
+            t = OxmlElement('w:t')
+            t.set(_XML_SPACE, 'preserve')
+            t.text = piece
+            r.append(t)
+
+
+def _row_prototype(tr):
+    """Copie d'une ligne ``w:tr`` dont chaque cellule contient un run, avec ses runs."""
+    proto = copy.deepcopy(tr)
+    runs = []
+    for tc in proto.iterchildren(qn('w:tc')):
+        p = tc.find(qn('w:p'))
+        if p is None:
+            p = OxmlElement('w:p')
+            tc.append(p)
+        for old in p.findall(qn('w:r')):
+            p.remove(old)
+        r = OxmlElement('w:r')
+        p.append(r)
+        runs.append(r)
+    return proto, len(runs)
+
+
+def insert_table(doc, paragraph, df: pd.DataFrame, style: Optional[str] = 'Table Grid',
+                 titles: Optional[Dict[int, List[str]]] = None):
+    """Remplace `paragraph` par un tableau : en-tête puis une ligne par enregistrement.
+
+    :param titles: {indice de ligne: valeurs} lignes de titre insérées avant
+        cet enregistrement (celle de l'indice 0 précède l'en-tête)
+    """
+    table = doc.add_table(rows=1, cols=df.shape[1])
+    if style:
+        table.style = style
+    for cell, col in zip(table.rows[0].cells, df.columns):
+        cell.text = str(col)
+
+    tbl = table._tbl
+    header = tbl.tr_lst[0]
+    proto, ncols = _row_prototype(header)
+
+    def _row(values):
+        tr = copy.deepcopy(proto)
+        runs = tr.iter(qn('w:r'))
+        for value, r in zip(values[:ncols], runs):
+            _set_run_text(r, _cell_text(value))
+        return tr
+
+    titles = titles or {}
+    if 0 in titles:
+        header.addprevious(_row(titles[0]))
+    for i, values in enumerate(df.itertuples(index=False, name=None)):
+        if i and i in titles:
+            tbl.append(_row(titles[i]))
+        tbl.append(_row(values))
+
+    parent = paragraph._p.getparent()
+    parent.replace(paragraph._p, tbl)
+    return table
+
+
+def insert_image(paragraph, img_path: str, width_cm: float = IMAGE_WIDTH_CM) -> None:
+    """Remplace `paragraph` par l'image centrée, ré-échantillonnée pour `width_cm`."""
+    img_par = paragraph.insert_paragraph_before()
+    run = img_par.add_run()
+    run.add_picture(prepare_image(img_path, width_cm), width=Cm(width_cm))
+    img_par.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    parent = paragraph._p.getparent()
+    parent.remove(paragraph._p)
+
+
+def _marker_paragraphs(doc, markers: Optional[List[Tuple[int, str]]]):
+    """Paragraphes repères : positions du modèle compilé, sinon parcours complet."""
+    if markers is not None:
+        children = list(doc.element.body.iterchildren())
+        found = []
+        for i, text in markers:
+            p = children[i] if i < len(children) else None
+            if p is None or p.tag != qn('w:p') or _paragraph_text(p) != text:
+                break
+            found.append((Paragraph(p, doc._body), text))
+        else:
+            return found
+    return [(para, para.text.strip()) for para in doc.paragraphs
+            if para.text.strip() in TABLE_MAP or para.text.strip() in IMAGE_MAP]
+
+
+def fill_document(doc, results: Dict, image_dir: str,
+                  markers: Optional[List[Tuple[int, str]]] = None) -> None:
+    """Remplace les repères TABLEAU/CARTE du document.
+
+    :param markers: repères de `compile_template` (None : le document est parcouru)
+    """
+    couches = (results or {}).get('couches') or {}
+    # Les paragraphes sont résolus avant toute insertion
+    for para, text in _marker_paragraphs(doc, markers):
+        if text in TABLE_MAP:
+            names = find_tables(couches, TABLE_MAP[text])
+            dfs = [couches[name] for name in names]
+            if dfs:
+                df = dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True)
+                # Ligne "Nombre de … dans l'aire d'étude élargie" avant chaque couche
+                titles, start = {}, 0
+                for name, part in zip(names, dfs):
+                    titles[start] = layer_title(name, part)
+                    start += len(part)
+                insert_table(doc, para, df, titles=titles)
+        elif text in IMAGE_MAP:
+            img_path = os.path.join(image_dir, IMAGE_MAP[text])
+            if os.path.isfile(img_path):
+                insert_image(para, img_path)
+
+
+def build_report(results: Optional[Dict], image_dir: str, out_path: Optional[str] = None,
+                 template_path: str = TEMPLATE_PATH) -> str:
+    """Génère le rapport Word et retourne son chemin.
+
+    :param results: résultats de l'ID contexte éco (voir
+        `id_contexte_eco.build_results`) ; None : relus depuis
+        ``ID zonages.xlsx`` dans `image_dir`
+    :param image_dir: dossier des cartes exportées
+    :param out_path: défaut ``Rapport Contexte eco <horodatage>.docx`` dans `image_dir`
+    """
+    t0 = datetime.datetime.now()
+    if results is None:
+        xlsx = os.path.join(image_dir, EXCEL_NAME)
+        if not os.path.isfile(xlsx):
+            raise FileNotFoundError("Fichier d'analyse introuvable")
+        results = results_from_excel(xlsx)
+    if not os.path.isfile(template_path):
+        raise FileNotFoundError("Template Word introuvable")
+    if out_path is None:
+        out_path = os.path.join(image_dir, f"Rapport Contexte eco {datetime.datetime.now():%Y%m%d_%H%M%S}.docx")
+    prune_image_cache()
+    template = compile_template(template_path)
+    doc = new_report_document(template)
+    fill_document(doc, results, image_dir, template['markers'])
+    doc.save(out_path)
+    log_with_time(f"Rapport Word généré en {datetime.datetime.now() - t0} : {out_path}")
+    return out_path
+
+
+# ---------- Rapports de plusieurs sites ----------
+
+def default_report_workers() -> int:
+    return max(1, min((os.cpu_count() or 2) - 1, 6))
+
+
+def site_results(folder: str, nom: Optional[str] = None) -> Optional[Dict]:
+    """Résultats d'un dossier de site : ``ID zonages.json``, sinon le classeur.
+
+    Les fichiers peuvent aussi porter le nom du site (``ID zonages - <site>``,
+    voir `id_contexte_eco.site_output_paths`).
+    """
+    stems = ["ID zonages"] + ([f"ID zonages - {safe_site_name(nom)}"] if nom else [])
+    for stem in stems:
+        json_path = os.path.join(folder, stem + ".json")
+        if os.path.isfile(json_path):
+            return results_from_json(json_path)
+    for stem in stems:
+        xlsx = os.path.join(folder, stem + ".xlsx")
+        if os.path.isfile(xlsx):
+            return results_from_excel(xlsx)
+    return None
+
+
+def _site_specs(sites) -> List[Dict]:
+    """Sites : dossiers, ou dicts (EXPORT_DIR[, SITE, results]) comme ceux de `load_sites_csv`.
+
+    Noms dédoublonnés comme dans `id_contexte_eco.run_batch` (`unique_site_name`).
+    """
+    specs = []
+    noms = set()
+    for site in sites:
+        if isinstance(site, dict):
+            folder = site.get('EXPORT_DIR') or site.get('dossier')
+            nom, results = site.get('SITE'), site.get('results')
+        else:
+            folder, nom, results = site, None, None
+        nom = unique_site_name(str(nom or os.path.basename(os.path.normpath(folder))), noms)
+        specs.append({'dossier': folder, 'nom': nom, 'results': results})
+    return specs
+
+
+def _init_report_worker(template_path: str, template: Dict) -> None:
+    # Modèle lu et repères trouvés par le processus principal : le document
+    # est analysé une seule fois ici, puis copié pour chaque rapport
+    template = dict(template, doc=Document(io.BytesIO(template['data'])))
+    with _TEMPLATES_LOCK:
+        _TEMPLATES[template_path] = template
+
+
+def _build_site_report(spec: Dict, template_path: str) -> Tuple[Optional[str], Optional[str]]:
+    """Rapport d'un site : (chemin du .docx, None) ou (None, message d'erreur)."""
+    try:
+        results = spec['results']
+        if results is None:
+            results = site_results(spec['dossier'], spec['nom'])
+            if results is None:
+                raise FileNotFoundError("résultats de l'ID des zonages introuvables")
+        return build_report(results, spec['dossier'], template_path=template_path), None
+    except Exception as e:
+        return None, str(e)
+
+
+def build_reports(sites, template_path: str = TEMPLATE_PATH, workers: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """Rapports Word de plusieurs sites, générés dans un pool de processus.
+
+    Chaque dossier de site contient ses cartes exportées et ses résultats
+    (voir `site_results`), sauf si le site les fournit en mémoire
+    (``results``). Le modèle est analysé une fois et transmis aux
+    processus ; le cache des images (``cache/images``) est commun.
+
+    :return: {nom du site: chemin du rapport, ou None en cas d'erreur}
+    """
+    t0 = datetime.datetime.now()
+    specs = _site_specs(sites)
+    if not specs:
+        return {}
+    template = compile_template(template_path)
+    prune_image_cache()
+    workers = max(1, min(workers or default_report_workers(), len(specs)))
+    log_with_time(f"Génération de {len(specs)} rapport(s) sur {workers} processus")
+
+    if workers == 1:
+        outcomes = [_build_site_report(spec, template_path) for spec in specs]
+    else:
+        # Le document analysé ne se transmet pas : chaque processus le reconstruit
+        shared = {k: v for k, v in template.items() if k != 'doc'}
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_report_worker,
+                                 initargs=(template_path, shared)) as ex:
+            outcomes = list(ex.map(_build_site_report, specs, [template_path] * len(specs)))
+
+    reports = {}
+    for spec, (path, error) in zip(specs, outcomes):
+        if error:
+            log_with_time(f"Rapport du site '{spec['nom']}' non généré : {error}")
+        reports[spec['nom']] = path
+    n_ok = sum(1 for p in reports.values() if p)
+    log_with_time(f"{n_ok}/{len(specs)} rapport(s) générés en {datetime.datetime.now() - t0}")
+    return reports
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Rapports Word \"Contexte éco\" de plusieurs sites")
+    parser.add_argument('dossiers', nargs='*', help="dossiers de site (cartes et résultats de l'ID)")
+    parser.add_argument('--sites', help="CSV de sites (ze;ae;sortie;site) : un rapport par dossier de sortie")
+    parser.add_argument('--workers', type=int, default=None, help="processus de génération")
+    parser.add_argument('--template', default=TEMPLATE_PATH, help="modèle Word")
+    args = parser.parse_args(argv)
+
+    sites: List = list(args.dossiers)
+    if args.sites:
+        sites += load_sites_csv(args.sites)
+    if not sites:
+        parser.error("indiquer des dossiers de site ou --sites")
+    reports = build_reports(sites, args.template, args.workers)
+    return 0 if reports and all(reports.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
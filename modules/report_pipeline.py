@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""Exécution des étapes du rapport automatique sous forme de petit graphe.
+
+Chaque étape déclare les étapes dont elle dépend ; une étape démarre dès que
+ses dépendances sont terminées, les étapes indépendantes tournent en
+parallèle (threads). Pour le rapport "Contexte éco" : l'ID des zonages
+(geopandas, CPU) et l'export des cartes (sous-processus QGIS) sont menés
+ensemble, puis l'assemblage Word démarre quand les deux sont finis.
+
+Une étape qui lève une exception fait sauter les étapes qui en dépendent.
+"""
+import time
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+OK = "ok"
+FAILED = "erreur"
+SKIPPED = "sautée"
+
+
+def log_with_time(msg: str) -> None:
+    print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+def _check_graph(tasks: Dict[str, Tuple[Callable, Sequence[str]]]) -> None:
+    for name, (_, deps) in tasks.items():
+        for dep in deps:
+            if dep not in tasks:
+                raise ValueError(f"étape '{name}' : dépendance inconnue '{dep}'")
+    # Détection de cycle (parcours en profondeur)
+    state: Dict[str, int] = {}
+
+    def visit(name: str) -> None:
+        if state.get(name) == 1:
+            raise ValueError(f"cycle dans les étapes autour de '{name}'")
+        if state.get(name) == 2:
+            return
+        state[name] = 1
+        for dep in tasks[name][1]:
+            visit(dep)
+        state[name] = 2
+
+    for name in tasks:
+        visit(name)
+
+
+def run_task_graph(tasks: Dict[str, Tuple[Callable, Sequence[str]]],
+                   max_workers: Optional[int] = None) -> Dict[str, Dict]:
+    """Exécute `tasks` ({nom: (fonction sans argument, dépendances)}).
+
+    :return: {nom: {"status", "start", "duration", "result", "error"}} ;
+        "start" et "duration" en secondes depuis le lancement du graphe
+    """
+    _check_graph(tasks)
+    t0 = time.perf_counter()
+    report: Dict[str, Dict] = {}
+    lock = threading.Lock()
+
+    def _run(name: str, fn: Callable):
+        start = time.perf_counter()
+        entry = {"status": OK, "start": start - t0, "duration": 0.0, "result": None, "error": None}
+        try:
+            entry["result"] = fn()
+        except Exception as e:
+            entry["status"] = FAILED
+            entry["error"] = e
+            log_with_time(f"Étape '{name}' en erreur : {e}")
+        entry["duration"] = time.perf_counter() - start
+        with lock:
+            report[name] = entry
+        return name
+
+    pending = dict(tasks)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or max(1, len(tasks))) as ex:
+        while pending or running:
+            for name, (fn, deps) in list(pending.items()):
+                with lock:
+                    states = [report[d]["status"] if d in report else None for d in deps]
+                if any(s in (FAILED, SKIPPED) for s in states):
+                    with lock:
+                        report[name] = {"status": SKIPPED, "start": time.perf_counter() - t0, "duration": 0.0,
+                                        "result": None, "error": None}
+                    log_with_time(f"Étape '{name}' sautée (dépendance en échec)")
+                    del pending[name]
+                elif all(s == OK for s in states):
+                    running[ex.submit(_run, name, fn)] = name
+                    del pending[name]
+            if not running:
+                # Les étapes sautées peuvent débloquer (sauter) d'autres étapes
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for fut in done:
+                running.pop(fut)
+    return report
+
+
+def timings_summary(report: Dict[str, Dict], order: Optional[List[str]] = None) -> str:
+    """Résumé lisible : durée de chaque étape, durée totale et gain sur l'enchaînement."""
+    names = order or sorted(report, key=lambda n: report[n]["start"])
+    parts = []
+    for name in names:
+        entry = report.get(name)
+        if entry is None:
+            continue
+        label = f"{entry['duration']:.1f}s" if entry["status"] == OK else entry["status"]
+        parts.append(f"{name}={label}")
+    total = max((e["start"] + e["duration"] for e in report.values()), default=0.0)
+    sequential = sum(e["duration"] for e in report.values())
+    return f"{', '.join(parts)} | total={total:.1f}s (enchaîné : {sequential:.1f}s)"
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""Export PNG en bandes pour les DPI élevés (côté application).
+
+À 600–1200 DPI, un seul `exportToImage` rend la carte sur un seul cœur et
+alloue l'image entière en mémoire. Ici la page est découpée en bandes
+horizontales rendues en parallèle par les workers du pool
+(`export_worker.render_tile`) ; chaque worker compresse sa bande et le
+PNG final est assemblé par simple concaténation des flux, sans jamais
+charger l'image complète.
+
+Pour chaque bande, les cartes de la mise en page sont réduites à la portion
+de leur emprise qui couvre la bande (`export_worker.clip_maps_to_region`,
+avec un débord de TILE_OVERLAP_MM) : le rendu total reste celui d'un export
+classique, réparti sur les workers. Les étiquettes placées à cheval sur une
+limite de bande peuvent différer d'un export classique ; les cartes tournées
+ou suivies par un aperçu sont rendues entières.
+Comparaison : ``scripts/bench_export.py --compare-tiled``.
+"""
+import os
+import math
+import zlib
+import time
+import shutil
+import struct
+import tempfile
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from .export_worker import (
+        load_manifest, update_manifest, output_fingerprint, planned_outputs, is_up_to_date,
+    )
+except Exception:
+    from modules.export_worker import (
+        load_manifest, update_manifest, output_fingerprint, planned_outputs, is_up_to_date,
+    )
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+TILES_DIR = os.path.join(REPO_ROOT, "cache", "tiles")
+
+# DPI à partir duquel le rendu en bandes est utilisé
+TILE_MIN_DPI = 600
+# Taille maximale d'une bande (pixels) : ~64 Mo en RGBA
+TILE_MAX_PIXELS = 16_000_000
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+_ADLER_BASE = 65521
+
+
+def log_with_time(msg: str) -> None:
+    print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+def strip_count(width: int, height: int, workers: int) -> int:
+    """Nombre de bandes : au moins une par worker, chacune sous `TILE_MAX_PIXELS`."""
+    n = max(int(workers), math.ceil(width * height / TILE_MAX_PIXELS))
+    return max(1, min(n, height))
+
+
+def adler32_combine(adler1: int, adler2: int, len2: int) -> int:
+    """Adler-32 de la concaténation A+B à partir de ceux de A et B (cf. zlib)."""
+    rem = len2 % _ADLER_BASE
+    sum1 = adler1 & 0xFFFF
+    sum2 = (rem * sum1) % _ADLER_BASE
+    sum1 += (adler2 & 0xFFFF) + _ADLER_BASE - 1
+    sum2 += ((adler1 >> 16) & 0xFFFF) + ((adler2 >> 16) & 0xFFFF) + _ADLER_BASE - rem
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum1 >= _ADLER_BASE:
+        sum1 -= _ADLER_BASE
+    if sum2 >= (_ADLER_BASE << 1):
+        sum2 -= (_ADLER_BASE << 1)
+    if sum2 >= _ADLER_BASE:
+        sum2 -= _ADLER_BASE
+    return sum1 | (sum2 << 16)
+
+
+def _write_chunk(f, kind: bytes, data: bytes) -> None:
+    f.write(struct.pack(">I", len(data)))
+    f.write(kind)
+    f.write(data)
+    f.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+
+def assemble_png(out_png: str, width: int, height: int, dpi: int,
+                 parts: List[Tuple[str, int, int]], chunk_size: int = 1 << 20) -> None:
+    """Écrit le PNG RGBA final à partir des bandes compressées.
+
+    :param parts: [(fichier, adler32, longueur non compressée)] dans l'ordre
+        des bandes ; chaque fichier est un flux deflate brut terminé par un
+        flush synchrone (le dernier par un flush final), cf. `render_tile`.
+    """
+    adler = 1
+    for _, part_adler, part_len in parts:
+        adler = adler32_combine(adler, part_adler, part_len)
+    ppm = int(round(dpi / 0.0254))
+    tmp = out_png + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PNG_SIGNATURE)
+        _write_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+        _write_chunk(f, b"pHYs", struct.pack(">IIB", ppm, ppm, 1))
+        # En-tête zlib (deflate, fenêtre 32 Ko, compression par défaut)
+        _write_chunk(f, b"IDAT", b"\x78\x9c")
+        for path, _, _ in parts:
+            with open(path, "rb") as src:
+                while True:
+                    data = src.read(chunk_size)
+                    if not data:
+                        break
+                    _write_chunk(f, b"IDAT", data)
+        _write_chunk(f, b"IDAT", struct.pack(">I", adler))
+        _write_chunk(f, b"IEND", b"")
+    os.replace(tmp, out_png)
+
+
+def render_tiled(pool, projet_path: str, view: str, out_png: str, cfg: Dict) -> bool:
+    """Rend une vue en bandes sur les workers de `pool` puis assemble le PNG."""
+    plan = pool.call({"cmd": "plan", "project": projet_path, "view": view, "cfg": cfg}, cfg)
+    width, height = int(plan["width"]), int(plan["height"])
+    count = strip_count(width, height, pool.size)
+    os.makedirs(TILES_DIR, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="tiles_", dir=TILES_DIR)
+    try:
+        def _tile(i: int) -> Dict:
+            out = os.path.join(work_dir, f"{i:04d}.part")
+            res = pool.call({
+                "cmd": "tile", "project": projet_path, "view": view,
+                "index": i, "count": count, "out": out, "cfg": cfg,
+            }, cfg)
+            return dict(res, path=out)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(count, pool.size))) as ex:
+            tiles = list(ex.map(_tile, range(count)))
+        if sum(int(t["rows"]) for t in tiles) != height:
+            raise RuntimeError("bandes incomplètes")
+        assemble_png(out_png, width, height, int(cfg["DPI"]),
+                     [(t["path"], int(t["adler"]), int(t["length"])) for t in tiles])
+        log_with_time(f"   {os.path.basename(out_png)} : {count} bandes, {width}x{height} px")
+        return True
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def export_views_tiled(pool, projet_path: str, cfg: Dict,
+                       emit: Optional[Callable[[Dict], None]] = None) -> Tuple[int, int]:
+    """Équivalent de `export_views` pour les vues PNG, rendues en bandes.
+
+    Même manifeste et mêmes évènements "view" que l'export classique ; la
+    sortie QGS éventuelle reste produite par un job d'export normal.
+    """
+    okc = 0
+    koc = 0
+    nom = os.path.splitext(os.path.basename(projet_path))[0]
+    outputs = [(v, o) for v, o in planned_outputs(projet_path, cfg) if v != "QGS"]
+    manifest = load_manifest(cfg["EXPORT_DIR"])
+    for view, out_png in outputs:
+        t0 = time.perf_counter()
+        key = output_fingerprint(projet_path, cfg, view)
+        skipped = is_up_to_date(manifest, out_png, key, cfg)
+        ok = skipped
+        if not skipped:
+            try:
+                ok = render_tiled(pool, projet_path, view, out_png, cfg)
+            except Exception as e:
+                log_with_time(f"   {nom} [{view}] rendu en bandes KO: {e}")
+                ok = False
+            if ok:
+                update_manifest(cfg["EXPORT_DIR"], {os.path.basename(out_png): key})
+        if ok:
+            okc += 1
+        else:
+            koc += 1
+        if emit:
+            emit({
+                "type": "view", "project": nom, "view": view, "ok": ok, "skipped": skipped,
+                "duration": round(time.perf_counter() - t0, 3),
+            })
+    return okc, koc
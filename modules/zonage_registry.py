@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""Registre des couches de zonage utilisées par l'ID contexte éco.
+
+Le registre (``Bases de données/zonages_id.json``) décrit chaque couche :
+
+- ``nom`` : nom de l'onglet et du type de zonage ;
+- ``fichier`` : nom du fichier, cherché dans les ``dossiers`` du registre
+  (relatifs au dépôt ou absolus, dans l'ordre), ou ``chemin`` explicite ;
+- ``attributs`` : colonnes exportées dans l'onglet de la couche ;
+- ``attribut_nom`` / ``attribut_code`` : colonnes "Nom du site" et "CODES"
+  de la synthèse (à défaut, premier de ``attributs_nom`` présent) ;
+- ``agregation`` : ``{"type", "libelle"}`` pour résumer la couche par un
+  simple décompte dans la synthèse.
+
+Le fichier est relu seulement quand sa date de modification change.
+"""
+import os
+import copy
+import json
+import threading
+from typing import Dict, List
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+REGISTRY_PATH = os.path.join(REPO_ROOT, "Bases de données", "zonages_id.json")
+
+_CACHE: Dict[str, tuple] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def _repo_path(path: str) -> str:
+    path = os.path.expandvars(os.path.expanduser(path))
+    return path if os.path.isabs(path) else os.path.normpath(os.path.join(REPO_ROOT, path))
+
+
+def load_registry(path: str = REGISTRY_PATH) -> Dict:
+    """Contenu du registre, mémorisé tant que le fichier n'a pas été modifié."""
+    mtime = os.stat(path).st_mtime_ns
+    with _CACHE_LOCK:
+        cached = _CACHE.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict) or not isinstance(data.get("couches"), list):
+        raise ValueError(f"registre des zonages invalide : {path}")
+    with _CACHE_LOCK:
+        _CACHE[path] = (mtime, data)
+    return data
+
+
+def resolve_layer_path(entry: Dict, dossiers: List[str]) -> str:
+    """Chemin d'une couche : premier dossier du registre où le fichier existe."""
+    if entry.get("chemin"):
+        return _repo_path(entry["chemin"])
+    candidates = [os.path.join(_repo_path(d), entry["fichier"]) for d in dossiers]
+    for path in candidates:
+        if os.path.exists(path):
+            return path
+    # Introuvable : le premier emplacement sert au message d'erreur
+    return candidates[0] if candidates else _repo_path(entry["fichier"])
+
+
+def load_couches(path: str = REGISTRY_PATH) -> List[Dict]:
+    """Couches cibles du registre, chemins résolus (copie modifiable)."""
+    registry = load_registry(path)
+    dossiers = list(registry.get("dossiers") or [])
+    couches = []
+    for entry in registry["couches"]:
+        couche = copy.deepcopy(entry)
+        couche["chemin"] = resolve_layer_path(entry, dossiers)
+        couche.setdefault("attributs", [])
+        couches.append(couche)
+    return couches
+
+
+def default_name_attributes(path: str = REGISTRY_PATH) -> List[str]:
+    """Colonnes essayées pour le "Nom du site" d'une couche sans `attribut_nom`."""
+    return list(load_registry(path).get("attributs_nom") or [])
+
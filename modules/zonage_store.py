@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""Base locale des couches de zonage de référence (ID contexte éco).
+
+Les couches cibles (ZNIEFF, N2000, ZH, pelouses sèches…) sont des
+shapefiles nationaux ou départementaux qui ne changent que quelques fois par
+an. Plutôt que de les relire en entier et de les reprojeter à chaque analyse,
+elles sont importées une fois en Lambert-93 dans un GeoPackage par couche :
+
+- colonnes d'emprise ``bbox_minx``/``bbox_miny``/``bbox_maxx``/``bbox_maxy`` ;
+- entités triées selon la courbe de Hilbert (voisins spatiaux contigus) ;
+- index spatial R-tree du GeoPackage, utilisé par les lectures ``bbox=``.
+
+L'analyse ne lit alors que les entités proches de l'aire d'étude élargie.
+Une couche dont le shapefile source a changé depuis l'import est relue
+depuis la source jusqu'au prochain import.
+
+Import : ``python -m modules.zonage_store [--force] [couche ...]``
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+STORE_DIR = os.path.join(REPO_ROOT, "cache", "zonages")
+STORE_INDEX = "index.json"
+
+# SCR de la base (RGF93 / Lambert-93)
+STORE_CRS = "EPSG:2154"
+BBOX_COLUMNS = ("bbox_minx", "bbox_miny", "bbox_maxx", "bbox_maxy")
+
+_SOURCE_SIDECARS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+# Couches sources (non importées) gardées décodées en Lambert-93 dans le
+# processus (voir `cached_source_layer`). LAYER_CACHE_MAX_BYTES est le budget
+# total, partagé entre les processus du pool d'analyse (`set_layer_cache_budget`).
+LAYER_CACHE_MAX_BYTES = 256 * 1024 * 1024
+_LAYER_CACHE_BUDGET = LAYER_CACHE_MAX_BYTES
+_LAYER_CACHE: "OrderedDict[str, Tuple[List, object, int]]" = OrderedDict()
+# Demandes par couche : {chemin: (signature, nombre, ou None si trop lourde)}
+_LAYER_REQUESTS: Dict[str, Tuple[List, Optional[int]]] = {}
+_LAYER_CACHE_LOCK = threading.Lock()
+
+
+def log_with_time(msg: str) -> None:
+    print(f"[{datetime.datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+def source_signature(path: str) -> List[List]:
+    """Taille et date des fichiers d'un shapefile (sans relire leur contenu)."""
+    stem = os.path.splitext(path or "")[0]
+    sig = []
+    for ext in _SOURCE_SIDECARS:
+        try:
+            st = os.stat(stem + ext)
+        except OSError:
+            continue
+        sig.append([ext, st.st_size, st.st_mtime_ns])
+    return sig
+
+
+def source_size(path: str) -> int:
+    return sum(size for _, size, _ in source_signature(path))
+
+
+def store_file_name(nom: str) -> str:
+    return re.sub(r"[^0-9A-Za-z]+", "_", nom).strip("_").lower() + ".gpkg"
+
+
+def load_store_index(store_dir: str = STORE_DIR) -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(store_dir, STORE_INDEX), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception:
+        return {}
+
+
+def _save_store_index(index: Dict[str, Dict], store_dir: str = STORE_DIR) -> None:
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        path = os.path.join(store_dir, STORE_INDEX)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+    except Exception as e:
+        log_with_time(f"Index de la base des zonages non enregistré : {e}")
+
+
+def store_layer_path(couche: Dict, index: Optional[Dict[str, Dict]] = None,
+                     store_dir: str = STORE_DIR) -> Optional[str]:
+    """GeoPackage importé de `couche`, ou None s'il est absent ou périmé."""
+    if index is None:
+        index = load_store_index(store_dir)
+    entry = index.get(couche["nom"])
+    if not entry:
+        return None
+    path = os.path.join(store_dir, entry.get("file", ""))
+    if not os.path.isfile(path):
+        return None
+    if entry.get("source") != couche["chemin"] or entry.get("signature") != source_signature(couche["chemin"]):
+        return None
+    return path
+
+
+def import_layer(couche: Dict, store_dir: str = STORE_DIR) -> Dict:
+    """Importe une couche en Lambert-93 dans son GeoPackage et retourne son entrée d'index."""
+    import geopandas as gpd
+
+    gdf = gpd.read_file(couche["chemin"])
+    if gdf.crs is None:
+        raise ValueError("couche sans SCR")
+    if gdf.crs != STORE_CRS:
+        gdf = gdf.to_crs(STORE_CRS)
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+    if len(gdf):
+        # Tri de Hilbert : les pages lues pour une emprise sont contiguës
+        gdf = gdf.iloc[gdf.geometry.hilbert_distance().argsort()].reset_index(drop=True)
+    bounds = gdf.geometry.bounds
+    for col, src in zip(BBOX_COLUMNS, ("minx", "miny", "maxx", "maxy")):
+        gdf[col] = bounds[src].values
+
+    os.makedirs(store_dir, exist_ok=True)
+    name = store_file_name(couche["nom"])
+    path = os.path.join(store_dir, name)
+    tmp = path + ".tmp.gpkg"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    gdf.to_file(tmp, driver="GPKG", layer="zonage", SPATIAL_INDEX="YES")
+    os.replace(tmp, path)
+    return {
+        "file": name,
+        "source": couche["chemin"],
+        "signature": source_signature(couche["chemin"]),
+        "count": int(len(gdf)),
+        "bounds": [float(v) for v in gdf.total_bounds] if len(gdf) else None,
+        "imported": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def build_zonage_store(couches: Iterable[Dict], store_dir: str = STORE_DIR,
+                       force: bool = False) -> Tuple[int, int, int]:
+    """Importe les couches absentes ou périmées de la base locale.
+
+    :return: (importées, déjà à jour, en erreur)
+    """
+    index = load_store_index(store_dir)
+    done = fresh = failed = 0
+    for couche in couches:
+        nom = couche["nom"]
+        if not force and store_layer_path(couche, index, store_dir):
+            fresh += 1
+            continue
+        if not os.path.exists(couche["chemin"]):
+            log_with_time(f"Le fichier de la couche '{nom}' n'a pas été trouvé : {couche['chemin']}")
+            failed += 1
+            continue
+        t0 = datetime.datetime.now()
+        try:
+            index[nom] = import_layer(couche, store_dir)
+            _save_store_index(index, store_dir)
+            done += 1
+            log_with_time(f"Couche '{nom}' importée ({index[nom]['count']} entités) en {datetime.datetime.now() - t0}")
+        except Exception as e:
+            failed += 1
+            log_with_time(f"Erreur lors de l'import de la couche '{nom}': {e}")
+    return done, fresh, failed
+
+
+def native_bbox(path: str, bbox: Sequence[float], bbox_crs: str = STORE_CRS) -> Optional[Tuple[float, ...]]:
+    """Emprise `bbox` (dans `bbox_crs`) exprimée dans le SCR natif du fichier.
+
+    Seul l'en-tête du fichier est lu. L'emprise est densifiée lors de la
+    transformation pour rester englobante. None si le SCR est inconnu.
+    """
+    import geopandas as gpd
+    from pyproj import Transformer
+
+    crs = gpd.read_file(path, rows=0).crs
+    if crs is None:
+        return None
+    if crs == bbox_crs:
+        return tuple(float(v) for v in bbox)
+    transformer = Transformer.from_crs(bbox_crs, crs, always_xy=True)
+    return tuple(float(v) for v in transformer.transform_bounds(*bbox, densify_pts=21))
+
+
+def set_layer_cache_budget(max_bytes: int) -> None:
+    """Budget du cache de couches de ce processus (initialiseur du pool d'analyse)."""
+    global _LAYER_CACHE_BUDGET
+    with _LAYER_CACHE_LOCK:
+        _LAYER_CACHE_BUDGET = max(0, int(max_bytes))
+        _LAYER_CACHE.clear()
+
+
+def layer_memory_size(gdf) -> int:
+    """Taille décodée d'une GeoDataFrame : attributs (pandas) et coordonnées GEOS."""
+    import shapely
+
+    size = int(gdf.drop(columns=gdf.geometry.name).memory_usage(deep=True).sum())
+    # ~16 octets par sommet (x, y en double) plus l'en-tête de chaque géométrie
+    size += int(shapely.get_num_coordinates(gdf.geometry.values).sum()) * 16 + len(gdf) * 64
+    return size
+
+
+def cached_source_layer(couche: Dict):
+    """Couche source entière en Lambert-93 si elle est gardée en mémoire, sinon None.
+
+    La première demande d'une couche ne la charge pas (l'appelant fait une
+    lecture limitée à l'emprise) : la couche n'est lue en entier qu'à partir
+    de la deuxième demande dans ce processus, tant que le fichier n'a pas
+    changé, puis gardée si sa taille décodée tient dans le budget.
+
+    Le cache est propre à chaque processus : les analyses confient toujours
+    une couche au même processus (`id_contexte_eco.layer_slots`), et le
+    budget global est divisé entre les processus pour que l'ensemble reste
+    sous LAYER_CACHE_MAX_BYTES.
+    """
+    import geopandas as gpd
+
+    path = couche["chemin"]
+    signature = source_signature(path)
+    with _LAYER_CACHE_LOCK:
+        hit = _LAYER_CACHE.get(path)
+        if hit is not None and hit[0] == signature:
+            _LAYER_CACHE.move_to_end(path)
+            return hit[1]
+        seen = _LAYER_REQUESTS.get(path)
+        if seen is not None and seen[0] == signature:
+            count = None if seen[1] is None else seen[1] + 1
+        else:
+            count = 1
+        _LAYER_REQUESTS[path] = (signature, count)
+        budget = _LAYER_CACHE_BUDGET
+    if count is None or count < 2 or source_size(path) > budget:
+        return None
+
+    gdf = gpd.read_file(path)
+    if gdf.crs is not None and gdf.crs != STORE_CRS:
+        gdf = gdf.to_crs(STORE_CRS)
+    size = layer_memory_size(gdf)
+
+    with _LAYER_CACHE_LOCK:
+        if size > _LAYER_CACHE_BUDGET:
+            # Trop lourde une fois décodée : lectures par emprise désormais
+            _LAYER_REQUESTS[path] = (signature, None)
+            log_with_time(f"Couche '{couche['nom']}' non gardée en mémoire ({size / 1e6:.0f} Mo décodés)")
+            return gdf
+        _LAYER_CACHE[path] = (signature, gdf, size)
+        while len(_LAYER_CACHE) > 1 and sum(e[2] for e in _LAYER_CACHE.values()) > _LAYER_CACHE_BUDGET:
+            _LAYER_CACHE.popitem(last=False)
+    return gdf
+
+
+def _filter_bbox(gdf, bbox: Optional[Sequence[float]]):
+    """Entités dont l'emprise croise `bbox` (index spatial STR de geopandas)."""
+    if bbox is None or gdf.crs is None or gdf.empty:
+        return gdf
+    from shapely.geometry import box
+
+    idx = gdf.sindex.query(box(*bbox))
+    idx.sort()
+    return gdf.iloc[idx]
+
+
+def read_zonage(couche: Dict, bbox: Optional[Sequence[float]] = None,
+                index: Optional[Dict[str, Dict]] = None, store_dir: str = STORE_DIR):
+    """Lit une couche de zonage, limitée à `bbox` (Lambert-93) si possible.
+
+    Utilise la base locale quand elle est à jour (lecture par l'index
+    spatial). Sinon, la couche source est lue avec un filtre d'emprise
+    exprimé dans son SCR natif : seules les entités candidates sont décodées
+    (et reprojetées ensuite par l'appelant). Une couche source demandée de
+    nouveau est servie par le cache du processus (`cached_source_layer`).
+
+    :return: (GeoDataFrame, True si lu depuis la base locale)
+    """
+    import geopandas as gpd
+
+    path = store_layer_path(couche, index, store_dir)
+    if path is None:
+        cached = cached_source_layer(couche)
+        if cached is not None:
+            return _filter_bbox(cached, bbox), False
+        src_bbox = None
+        if bbox is not None:
+            try:
+                src_bbox = native_bbox(couche["chemin"], bbox)
+            except Exception as e:
+                log_with_time(f"Emprise non calculée pour '{couche['nom']}', lecture complète : {e}")
+        if src_bbox is None:
+            return gpd.read_file(couche["chemin"]), False
+        return gpd.read_file(couche["chemin"], bbox=src_bbox), False
+    if bbox is None:
+        gdf = gpd.read_file(path, layer="zonage")
+    else:
+        gdf = gpd.read_file(path, layer="zonage", bbox=tuple(bbox))
+    return gdf.drop(columns=[c for c in BBOX_COLUMNS if c in gdf.columns]), True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Import des couches de zonage en base locale Lambert-93")
+    parser.add_argument("couches", nargs="*", help="noms des couches à importer (toutes par défaut)")
+    parser.add_argument("--force", action="store_true", help="réimporter même les couches à jour")
+    parser.add_argument("--store-dir", default=STORE_DIR)
+    args = parser.parse_args(argv)
+
+    try:
+        from .zonage_registry import load_couches
+    except Exception:
+        from modules.zonage_registry import load_couches
+
+    couches = [c for c in load_couches() if not args.couches or c["nom"] in args.couches]
+    unknown = set(args.couches) - {c["nom"] for c in couches}
+    for nom in sorted(unknown):
+        log_with_time(f"Couche inconnue : {nom}")
+    done, fresh, failed = build_zonage_store(couches, args.store_dir, force=args.force)
+    log_with_time(f"Base des zonages : {done} importée(s), {fresh} à jour, {failed} en erreur")
+    return 1 if failed or unknown else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""Banc de mesure de l'export des cartes (workers QGIS).
+
+Lance le pool de workers QGIS sur les projets fournis (par défaut ceux de
+"Cartes contexte éco export") ou sur des projets .qgs synthétiques, pour
+plusieurs DPI et nombres de workers, et enregistre en JSON les durées par
+phase : init de QGIS, lecture du projet, relink AE/ZE, emprise/cadrage,
+export image (et écriture QGS).
+
+Exemples :
+    python scripts/bench_export.py --dpi 150,300 --workers 1,2,4
+    python scripts/bench_export.py --synthetic 6 --features 5000 --dpi 300,600
+    python scripts/bench_export.py --compare-render-cache --dpi 300 --workers 2
+    python scripts/bench_export.py --compare-tiled --dpi 600 --workers 4
+
+Les résultats sont écrits dans output/benchmarks/ (un fichier par exécution,
+avec le commit courant) pour comparer les versions entre elles.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+import datetime
+import subprocess
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+BENCH_DIR = ROOT / "output" / "benchmarks"
+WORK_DIR = ROOT / "cache" / "bench"
+PROJECTS_DIR = ROOT / "Cartes contexte éco export"
+
+# Repli si modules.main_app n'est pas importable (dépendances de l'interface absentes)
+DEFAULT_LAYER_AE_NAME = "Aire d'étude élargie"
+DEFAULT_LAYER_ZE_NAME = "Zone d'étude"
+
+PHASES = ("read", "relink", "extent", "export", "write")
+
+
+def log(msg: str) -> None:
+    print(f"[BENCH {datetime.datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+
+# ---------- Données de test ----------
+
+def make_fixture_layers(dest: Path, center=(913000.0, 6458000.0), ze_half=250.0,
+                        ae_buffer=5000.0, features=2000, seed=0):
+    """Crée ZE/AE (shapefiles Lambert-93) et une couche de charge (GPKG) autour de `center`.
+
+    La couche de charge contient `features` polygones aléatoires dans l'AE :
+    elle simule les couches de contexte dessinées par les projets.
+    """
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    dest.mkdir(parents=True, exist_ok=True)
+    x, y = center
+    ze = box(x - ze_half, y - ze_half, x + ze_half, y + ze_half)
+    ae = ze.buffer(ae_buffer)
+    ze_shp = dest / "bench_ZE.shp"
+    ae_shp = dest / "bench_AE.shp"
+    gpd.GeoDataFrame({"nom": ["ZE"]}, geometry=[ze], crs="EPSG:2154").to_file(ze_shp)
+    gpd.GeoDataFrame({"nom": ["AE"]}, geometry=[ae], crs="EPSG:2154").to_file(ae_shp)
+
+    rnd = random.Random(seed)
+    minx, miny, maxx, maxy = ae.bounds
+    geoms = []
+    for _ in range(int(features)):
+        cx, cy = rnd.uniform(minx, maxx), rnd.uniform(miny, maxy)
+        r = rnd.uniform(20.0, 250.0)
+        geoms.append(box(cx - r, cy - r, cx + r, cy + r))
+    load = dest / "bench_load.gpkg"
+    if load.exists():
+        load.unlink()
+    gpd.GeoDataFrame({"id": list(range(len(geoms)))}, geometry=geoms, crs="EPSG:2154").to_file(
+        load, layer="charge", driver="GPKG")
+    return ae_shp, ze_shp, load
+
+
+def make_synthetic_projects(out_dir: str, count: int, ae_shp: str, ze_shp: str, load_gpkg: str,
+                            layer_ae: str, layer_ze: str, cfg: dict) -> int:
+    """Écrit `count` projets .qgs (exécuté dans le Python de QGIS)."""
+    from modules.export_worker import init_qgis
+    qgs = init_qgis(dict(cfg, RENDER_CACHE=False))
+    try:
+        from qgis.core import (
+            QgsProject, QgsVectorLayer, QgsPrintLayout, QgsLayoutItemMap, QgsLayoutPoint,
+            QgsLayoutSize, QgsUnitTypes, QgsCoordinateReferenceSystem,
+        )
+        os.makedirs(out_dir, exist_ok=True)
+        for i in range(count):
+            prj = QgsProject.instance()
+            prj.clear()
+            prj.setCrs(QgsCoordinateReferenceSystem("EPSG:2154"))
+            load = QgsVectorLayer(f"{load_gpkg}|layername=charge", f"Charge {i}", "ogr")
+            ae = QgsVectorLayer(ae_shp, layer_ae, "ogr")
+            ze = QgsVectorLayer(ze_shp, layer_ze, "ogr")
+            for lyr in (load, ae, ze):
+                if not lyr.isValid():
+                    raise RuntimeError(f"couche invalide: {lyr.source()}")
+                prj.addMapLayer(lyr)
+            layout = QgsPrintLayout(prj)
+            layout.initializeDefaults()
+            layout.setName(f"Synthétique {i:02d}")
+            item = QgsLayoutItemMap(layout)
+            item.attemptMove(QgsLayoutPoint(10, 10, QgsUnitTypes.LayoutMillimeters))
+            item.attemptResize(QgsLayoutSize(277, 190, QgsUnitTypes.LayoutMillimeters))
+            item.setExtent(ae.extent())
+            layout.addLayoutItem(item)
+            prj.layoutManager().addLayout(layout)
+            path = os.path.join(out_dir, f"Contexte éco - Synthétique {i:02d}.qgs")
+            if not prj.write(path):
+                raise RuntimeError(f"écriture impossible: {path}")
+        QgsProject.instance().clear()
+        return 0
+    finally:
+        qgs.exitQgis()
+
+
+# ---------- Mesures ----------
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except Exception:
+        return ""
+
+
+def _app_defaults() -> dict:
+    try:
+        from modules import main_app
+        return {
+            "QGIS_ROOT": main_app.QGIS_ROOT, "QGIS_APP": main_app.QGIS_APP, "PY_VER": main_app.PY_VER,
+            "LAYER_AE_NAME": main_app.LAYER_AE_NAME, "LAYER_ZE_NAME": main_app.LAYER_ZE_NAME,
+        }
+    except Exception as e:
+        log(f"modules.main_app non importable ({e}) : utiliser --qgis-root/--py-ver")
+        return {"LAYER_AE_NAME": DEFAULT_LAYER_AE_NAME, "LAYER_ZE_NAME": DEFAULT_LAYER_ZE_NAME}
+
+
+def _run_tiled(pool, projects, cfg: dict, on_event) -> list:
+    """Projets exportés l'un après l'autre en bandes (comme l'application)."""
+    from modules.tiled_export import export_views_tiled
+
+    done = []
+    for path in projects:
+        t0 = time.perf_counter()
+        ok, ko = export_views_tiled(pool, path, cfg, on_event)
+        done.append((path, {"ok": ok, "ko": ko, "duration": round(time.perf_counter() - t0, 3)}))
+    return done
+
+
+def run_benchmark(projects, base_cfg: dict, dpis, worker_counts, repeat: int = 1, tiled: bool = False) -> list:
+    from modules.export_pool import QgisWorkerPool
+
+    runs = []
+    for n_workers in worker_counts:
+        pool = QgisWorkerPool()
+        t0 = time.perf_counter()
+        try:
+            pool.ensure(n_workers, base_cfg)
+            startup = time.perf_counter() - t0
+            init = [i.get("init") for i in pool.worker_info()]
+            log(f"{n_workers} worker(s) prêts en {startup:.1f}s (init QGIS: {init})")
+            for dpi in dpis:
+                for rep in range(repeat):
+                    WORK_DIR.mkdir(parents=True, exist_ok=True)
+                    export_dir = tempfile.mkdtemp(prefix="export_", dir=WORK_DIR)
+                    cfg = dict(base_cfg, DPI=int(dpi), EXPORT_DIR=export_dir, OVERWRITE=True, WORKERS=n_workers)
+                    # Durées de rendu par vue (AE, ZE…), pour isoler le gain de la 2e emprise
+                    views = {}
+
+                    def on_event(evt: dict) -> None:
+                        if evt.get("type") == "view" and evt.get("ok") and not evt.get("skipped"):
+                            v = evt.get("view")
+                            views[v] = views.get(v, 0.0) + float(evt.get("duration") or 0.0)
+
+                    try:
+                        t1 = time.perf_counter()
+                        if tiled:
+                            done = _run_tiled(pool, projects, cfg, on_event)
+                        else:
+                            with ThreadPoolExecutor(max_workers=n_workers) as ex:
+                                done = list(ex.map(lambda p: (p, pool.run([p], cfg, on_event)), projects))
+                        wall = time.perf_counter() - t1
+                    finally:
+                        shutil.rmtree(export_dir, ignore_errors=True)
+                    phases = {ph: 0.0 for ph in PHASES}
+                    per_project = {}
+                    ok = ko = 0
+                    for path, res in done:
+                        timings = res.get("timings") or {}
+                        for ph, v in timings.items():
+                            phases[ph] = phases.get(ph, 0.0) + float(v)
+                        ok += int(res.get("ok", 0))
+                        ko += int(res.get("ko", 0))
+                        per_project[os.path.basename(path)] = {
+                            "duration": res.get("duration"), "ok": res.get("ok"), "ko": res.get("ko"),
+                            "timings": timings,
+                        }
+                    runs.append({
+                        "workers": n_workers, "dpi": int(dpi), "repeat": rep,
+                        "pool_startup": round(startup, 3), "qgis_init": init,
+                        "wall": round(wall, 3), "ok": ok, "ko": ko,
+                        "outputs_per_s": round(ok / wall, 4) if wall > 0 else None,
+                        "render_cache": bool(cfg.get("RENDER_CACHE", True)), "tiled": tiled,
+                        "phases": {k: round(v, 3) for k, v in phases.items()},
+                        "views": {k: round(v, 3) for k, v in views.items()},
+                        "projects": per_project,
+                    })
+                    log(f"workers={n_workers} dpi={dpi}{' (bandes)' if tiled else ''} : {wall:.1f}s, OK={ok} KO={ko}, "
+                        + ", ".join(f"{k}={v:.1f}s" for k, v in phases.items() if v))
+        finally:
+            pool.shutdown()
+    return runs
+
+
+def compare_render_cache(runs: list) -> list:
+    """Rendu par vue sans puis avec le cache réseau/raster, par (workers, DPI)."""
+    rows = []
+    for off in (r for r in runs if not r["render_cache"]):
+        for on in (r for r in runs if r["render_cache"]):
+            if (on["workers"], on["dpi"], on["repeat"]) != (off["workers"], off["dpi"], off["repeat"]):
+                continue
+            row = {"workers": on["workers"], "dpi": on["dpi"], "repeat": on["repeat"], "views": {}}
+            for view in sorted(set(off["views"]) | set(on["views"])):
+                a, b = off["views"].get(view), on["views"].get(view)
+                row["views"][view] = {"off": a, "on": b, "gain": round(1.0 - b / a, 3) if a and b else None}
+            rows.append(row)
+            log(f"workers={on['workers']} dpi={on['dpi']} : " + ", ".join(
+                f"{v} {d['off']}s -> {d['on']}s" for v, d in row["views"].items()))
+    return rows
+
+
+def _parse_ints(text: str):
+    return [int(x) for x in str(text).replace(";", ",").split(",") if x.strip()]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Banc de mesure de l'export des cartes QGIS")
+    ap.add_argument("--projects", nargs="*", help="projets .qgz/.qgs ou dossiers (défaut : Cartes contexte éco export)")
+    ap.add_argument("--synthetic", type=int, default=0, help="nombre de projets .qgs synthétiques à générer")
+    ap.add_argument("--features", type=int, default=2000, help="polygones de la couche de charge synthétique")
+    ap.add_argument("--ae", help="shapefile AE (défaut : AE de test générée)")
+    ap.add_argument("--ze", help="shapefile ZE (défaut : ZE de test générée)")
+    ap.add_argument("--dpi", default="150,300", help="liste de DPI, ex. 150,300,600")
+    ap.add_argument("--workers", default="1,2", help="liste de nombres de workers, ex. 1,2,4")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--limit", type=int, default=0, help="nombre maximal de projets")
+    ap.add_argument("--mode", default="BOTH", choices=("AE", "ZE", "BOTH"), help="cadrage exporté")
+    ap.add_argument("--no-render-cache", action="store_true")
+    ap.add_argument("--compare-render-cache", action="store_true",
+                    help="mesurer sans puis avec le cache réseau/raster des workers")
+    ap.add_argument("--compare-tiled", action="store_true",
+                    help="mesurer l'export classique puis le rendu en bandes")
+    ap.add_argument("--qgis-root")
+    ap.add_argument("--py-ver")
+    ap.add_argument("--out", help="fichier JSON de résultats")
+    # Mode interne : génération des projets synthétiques dans le Python de QGIS
+    ap.add_argument("--make-synthetic", help=argparse.SUPPRESS)
+    ap.add_argument("--load", help=argparse.SUPPRESS)
+    ap.add_argument("--layer-ae", help=argparse.SUPPRESS)
+    ap.add_argument("--layer-ze", help=argparse.SUPPRESS)
+    ap.add_argument("--qgis-app", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.make_synthetic:
+        qgis_cfg = {"QGIS_ROOT": args.qgis_root, "QGIS_APP": args.qgis_app, "PY_VER": args.py_ver}
+        return make_synthetic_projects(args.make_synthetic, args.synthetic, args.ae, args.ze,
+                                       args.load, args.layer_ae, args.layer_ze, qgis_cfg)
+
+    from modules.export_pool import qgis_python, qgis_subprocess_env
+
+    defaults = _app_defaults()
+    if args.qgis_root:
+        defaults["QGIS_ROOT"] = args.qgis_root
+        defaults["QGIS_APP"] = os.path.join(args.qgis_root, "apps", "qgis")
+    if args.py_ver:
+        defaults["PY_VER"] = args.py_ver
+    if not all(k in defaults for k in ("QGIS_ROOT", "QGIS_APP", "PY_VER")):
+        log("QGIS introuvable : préciser --qgis-root et --py-ver")
+        return 2
+
+    stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    fixtures = WORK_DIR / f"fixtures_{stamp}"
+    ae_shp, ze_shp = args.ae, args.ze
+    load_gpkg = None
+    if not (ae_shp and ze_shp) or args.synthetic:
+        gen_ae, gen_ze, load_gpkg = make_fixture_layers(fixtures, features=args.features)
+        ae_shp = ae_shp or str(gen_ae)
+        ze_shp = ze_shp or str(gen_ze)
+
+    if args.synthetic:
+        synth_dir = fixtures / "projets"
+        cmd = [qgis_python(defaults), os.path.abspath(__file__), "--make-synthetic", str(synth_dir),
+               "--synthetic", str(args.synthetic), "--ae", ae_shp, "--ze", ze_shp, "--load", str(load_gpkg),
+               "--layer-ae", defaults["LAYER_AE_NAME"], "--layer-ze", defaults["LAYER_ZE_NAME"],
+               "--qgis-root", defaults["QGIS_ROOT"], "--qgis-app", defaults["QGIS_APP"], "--py-ver", defaults["PY_VER"]]
+        log(f"Génération de {args.synthetic} projet(s) synthétique(s)…")
+        res = subprocess.run(cmd, env=qgis_subprocess_env(defaults), cwd=str(ROOT))
+        if res.returncode != 0:
+            log("Génération des projets synthétiques en échec")
+            return 1
+        projects = sorted(str(p) for p in synth_dir.glob("*.qgs"))
+    else:
+        projects = []
+        for src in (args.projects or [str(PROJECTS_DIR)]):
+            if os.path.isdir(src):
+                projects += sorted(os.path.join(src, f) for f in os.listdir(src)
+                                   if f.lower().endswith((".qgz", ".qgs")))
+            elif os.path.isfile(src):
+                projects.append(src)
+    if args.limit:
+        projects = projects[:args.limit]
+    if not projects:
+        log("Aucun projet à mesurer")
+        return 2
+
+    base_cfg = dict(defaults, **{
+        "AE_SHP": os.path.abspath(ae_shp), "ZE_SHP": os.path.abspath(ze_shp),
+        "MARGIN_FAC": 1.15, "CADRAGE_MODE": args.mode, "EXPORT_TYPE": "PNG",
+        "RENDER_CACHE": not args.no_render_cache,
+    })
+    dpis = _parse_ints(args.dpi)
+    worker_counts = _parse_ints(args.workers)
+    log(f"{len(projects)} projet(s), DPI={dpis}, workers={worker_counts}, répétitions={args.repeat}")
+
+    comparison = None
+    try:
+        if args.compare_render_cache:
+            # Pools distincts : le cache est configuré à l'init de chaque worker
+            runs = (run_benchmark(projects, dict(base_cfg, RENDER_CACHE=False), dpis, worker_counts, args.repeat)
+                    + run_benchmark(projects, dict(base_cfg, RENDER_CACHE=True), dpis, worker_counts, args.repeat))
+            comparison = compare_render_cache(runs)
+        elif args.compare_tiled:
+            runs = (run_benchmark(projects, base_cfg, dpis, worker_counts, args.repeat)
+                    + run_benchmark(projects, base_cfg, dpis, worker_counts, args.repeat, tiled=True))
+            for r in runs:
+                log(f"workers={r['workers']} dpi={r['dpi']} {'bandes' if r['tiled'] else 'classique'} : "
+                    f"{r['wall']}s ({r['outputs_per_s']} sorties/s)")
+        else:
+            runs = run_benchmark(projects, base_cfg, dpis, worker_counts, args.repeat)
+    finally:
+        shutil.rmtree(fixtures, ignore_errors=True)
+
+    result = {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "host": {"platform": platform.platform(), "cpu_count": os.cpu_count(), "python": platform.python_version()},
+        "params": {
+            "projects": [os.path.basename(p) for p in projects], "synthetic": args.synthetic,
+            "features": args.features if args.synthetic else None, "dpi": dpis, "workers": worker_counts,
+            "repeat": args.repeat, "mode": args.mode, "render_cache": base_cfg["RENDER_CACHE"],
+        },
+        "runs": runs,
+    }
+    if comparison is not None:
+        result["render_cache_comparison"] = comparison
+    out = Path(args.out) if args.out else BENCH_DIR / f"bench_export_{stamp}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    log(f"Résultats : {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,5 @@
+"""Les tests importent les modules comme l'application : ``modules.<nom>``."""
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
@@ -0,0 +1,88 @@
+"""Entrées des exports : miroir local des projets QGIS, liste CSV des sites
+et noms de sites."""
+import os
+import threading
+
+from modules.export_inputs import (
+    sync_projects, load_project_index, cached_projects, load_sites_csv, safe_site_name, unique_site_name,
+)
+
+
+def test_sync_projects_concurrent(tmp_path):
+    src_dir = tmp_path / "reseau"
+    src_dir.mkdir()
+    sources = []
+    for i in range(10):
+        path = src_dir / f"Projet {i}.qgz"
+        path.write_bytes(os.urandom(100_000))
+        sources.append(str(path))
+    dest = tmp_path / "miroir"
+
+    # Rafraîchissement de la liste et export synchronisent en même temps
+    results, errors = [], []
+
+    def _sync():
+        try:
+            results.append(sync_projects(sources, str(dest), prune=True))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_sync) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert all(sorted(r) == sorted(sources) for r in results)
+    index = load_project_index(str(dest / "index.json"))
+    assert sorted(index) == sorted(sources)
+    for src, entry in index.items():
+        with open(src, "rb") as a, open(entry["local"], "rb") as b:
+            assert a.read() == b.read()
+    assert cached_projects(str(dest / "index.json")) == sorted(sources, key=lambda p: os.path.basename(p).lower())
+    assert not [f for _, _, files in os.walk(dest) for f in files if f.endswith(".tmp")]
+
+
+def test_sync_projects_keeps_offline_copy(tmp_path):
+    src = tmp_path / "Projet.qgz"
+    src.write_bytes(b"v1")
+    dest = str(tmp_path / "miroir")
+    local = sync_projects([str(src)], dest)[str(src)]
+    src.unlink()
+    # Partage hors ligne : la copie précédente reste utilisable
+    assert sync_projects([str(src)], dest) == {str(src): local}
+
+
+def test_load_sites_csv(tmp_path):
+    for name in ("ze1.shp", "ae1.shp", "sub/ze2.shp", "sub/ae2.shp"):
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).touch()
+    csv_path = tmp_path / "sites.csv"
+    csv_path.write_text("Site;ZE;AE;Sortie\n"
+                        "Site A;ze1.shp;ae1.shp;out/a\n"
+                        ";sub/ze2.shp;sub/ae2.shp;out/b\n"
+                        "Manquant;absent.shp;ae1.shp;out/c\n"
+                        "Incomplet;ze1.shp;;out/d\n", encoding="utf-8-sig")
+    sites = load_sites_csv(str(csv_path))
+    # Lignes invalides écartées ; site sans nom : nom du dossier de sortie
+    assert [s["SITE"] for s in sites] == ["Site A", "b"]
+    assert sites[0]["EXPORT_DIR"] == os.path.normpath(str(tmp_path / "out" / "a"))
+    assert sites[1]["ZE_SHP"] == os.path.normpath(str(tmp_path / "sub" / "ze2.shp"))
+
+
+def test_load_sites_csv_without_header(tmp_path):
+    (tmp_path / "ze1.shp").touch()
+    (tmp_path / "ae1.shp").touch()
+    csv_path = tmp_path / "sites.csv"
+    csv_path.write_text(f"{tmp_path / 'ze1.shp'},{tmp_path / 'ae1.shp'},out/x\n", encoding="utf-8")
+    sites = load_sites_csv(str(csv_path))
+    assert len(sites) == 1 and sites[0]["SITE"] == "x"
+
+
+def test_site_names():
+    noms = set()
+    assert [unique_site_name(n, noms) for n in ("A", "A", "B", "A")] == ["A", "A (2)", "B", "A (3)"]
+    assert safe_site_name('a/b:c*[d]') == "a_b_c_d_"
+    assert safe_site_name("  ") == "site"
+    assert safe_site_name("x" * 40, 31) == "x" * 31
@@ -0,0 +1,63 @@
+"""Manifeste des exports : une sortie n'est refaite que si ses entrées ont changé."""
+import os
+
+import pytest
+
+from modules.export_worker import (
+    output_fingerprint, is_up_to_date, load_manifest, update_manifest, planned_outputs,
+)
+
+
+@pytest.fixture
+def projet(tmp_path):
+    (tmp_path / "Projet.qgz").write_bytes(b"projet v1")
+    for stem in ("ae", "ze"):
+        for ext in (".shp", ".shx", ".dbf", ".prj"):
+            (tmp_path / f"{stem}{ext}").write_bytes(f"{stem}{ext}".encode("ascii"))
+    (tmp_path / "export").mkdir()
+    return str(tmp_path / "Projet.qgz")
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    return {"AE_SHP": str(tmp_path / "ae.shp"), "ZE_SHP": str(tmp_path / "ze.shp"), "DPI": 300,
+            "MARGIN_FAC": 1.15, "CADRAGE_MODE": "BOTH", "EXPORT_TYPE": "PNG",
+            "EXPORT_DIR": str(tmp_path / "export"), "OVERWRITE": False}
+
+
+def test_fingerprint(projet, cfg):
+    outputs = planned_outputs(projet, cfg)
+    assert [v for v, _ in outputs] == ["AE", "ZE"]
+    key = output_fingerprint(projet, cfg, "AE")
+    assert key == output_fingerprint(projet, cfg, "AE")
+    assert key != output_fingerprint(projet, dict(cfg, DPI=600), "AE")
+    assert key != output_fingerprint(projet, cfg, "ZE")
+
+
+def test_inputs_change_fingerprint(tmp_path, projet, cfg):
+    key = output_fingerprint(projet, cfg, "AE")
+    (tmp_path / "ze.dbf").write_bytes(b"ze.dbf modifie")
+    changed = output_fingerprint(projet, cfg, "AE")
+    assert changed != key
+    (tmp_path / "Projet.qgz").write_bytes(b"projet v2")
+    assert output_fingerprint(projet, cfg, "AE") != changed
+
+
+def test_is_up_to_date(tmp_path, projet, cfg):
+    _, out = planned_outputs(projet, cfg)[0]
+    key = output_fingerprint(projet, cfg, "AE")
+    assert not is_up_to_date({}, out, key, cfg)
+
+    with open(out, "wb") as f:
+        f.write(b"png")
+    # Sortie antérieure au manifeste : gardée, sauf écrasement demandé
+    assert is_up_to_date({}, out, key, cfg)
+    assert not is_up_to_date({}, out, key, dict(cfg, OVERWRITE=True))
+
+    update_manifest(cfg["EXPORT_DIR"], {os.path.basename(out): key})
+    manifest = load_manifest(cfg["EXPORT_DIR"])
+    assert is_up_to_date(manifest, out, key, cfg)
+    assert not is_up_to_date(manifest, out, key, dict(cfg, OVERWRITE=True))
+
+    (tmp_path / "ze.dbf").write_bytes(b"ze.dbf modifie")
+    assert not is_up_to_date(manifest, out, output_fingerprint(projet, cfg, "AE"), cfg)
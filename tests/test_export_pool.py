@@ -0,0 +1,135 @@
+"""Pool de workers QGIS (piloté par un faux worker qui parle le même
+protocole) et ordonnancement des exports par coût."""
+import os
+import stat
+import sys
+import textwrap
+
+import pytest
+
+from modules import export_pool
+from modules.export_pool import QgisWorkerPool, WorkerError, WorkerTimeout, order_by_cost, record_export_cost
+
+posix_only = pytest.mark.skipif(os.name == "nt", reason="faux Python QGIS écrit en script shell")
+
+FAKE_WORKER = textwrap.dedent('''
+    import json, os, sys, time
+
+    def emit(evt):
+        sys.stdout.write("@@" + json.dumps(evt) + "\\n")
+        sys.stdout.flush()
+
+    for line in sys.stdin:
+        msg = json.loads(line)
+        if msg["cmd"] == "init":
+            emit({"type": "ready", "pid": os.getpid()})
+        elif msg["cmd"] == "stop":
+            break
+        elif msg["cmd"] == "export":
+            projet = msg["projects"][0]
+            if projet == "bloque":
+                time.sleep(1000)
+            if projet == "erreur hors job":
+                # Erreur sans id pendant que le job continue
+                emit({"type": "error", "error": "message invalide"})
+                time.sleep(1000)
+            if projet == "erreur job":
+                emit({"type": "error", "id": msg["id"], "error": "projet illisible"})
+                continue
+            emit({"type": "view", "id": msg["id"], "project": projet, "view": "AE", "ok": True})
+            emit({"type": "done", "id": msg["id"], "ok": 1, "ko": 0, "duration": 0.0, "rendered": 1})
+''')
+
+
+@pytest.fixture
+def cfg(tmp_path):
+    worker = tmp_path / "fake_worker.py"
+    worker.write_text(FAKE_WORKER, encoding="utf-8")
+    py_dir = tmp_path / "apps" / "PyX"
+    py_dir.mkdir(parents=True)
+    python = py_dir / "python.exe"
+    python.write_text(f'#!/bin/sh\nexec env -u PYTHONHOME -u PYTHONPATH "{sys.executable}" "{worker}"\n')
+    python.chmod(python.stat().st_mode | stat.S_IEXEC)
+    return {"QGIS_ROOT": str(tmp_path), "QGIS_APP": str(tmp_path), "PY_VER": "PyX",
+            "INIT_TIMEOUT": 10, "JOB_TIMEOUT": 2}
+
+
+@pytest.fixture
+def pool():
+    pool = QgisWorkerPool()
+    yield pool
+    pool.shutdown()
+
+
+def _pids(pool):
+    return {w.proc.pid for w in pool._workers}
+
+
+@posix_only
+def test_run_streams_events_and_reuses_workers(pool, cfg):
+    assert pool.ensure(2, cfg) == 2
+    pids = _pids(pool)
+    events = []
+    done = pool.run(["a.qgz"], cfg, events.append)
+    assert done["type"] == "done" and done["ok"] == 1
+    assert [e["type"] for e in events] == ["view"]
+    pool.run(["b.qgz"], cfg)
+    assert _pids(pool) == pids
+
+
+@posix_only
+def test_job_error_keeps_worker(pool, cfg):
+    pool.ensure(1, cfg)
+    pids = _pids(pool)
+    with pytest.raises(WorkerError, match="projet illisible"):
+        pool.run(["erreur job"], cfg)
+    assert _pids(pool) == pids
+    assert pool.run(["a.qgz"], cfg)["ok"] == 1
+
+
+@posix_only
+def test_error_outside_job_replaces_busy_worker(pool, cfg):
+    pool.ensure(2, cfg)
+    pids = _pids(pool)
+    with pytest.raises(WorkerError, match="message invalide"):
+        pool.run(["erreur hors job"], cfg)
+    assert pool.size == 2 and len(_pids(pool) - pids) == 1
+    # Aucun worker encore occupé par le job interrompu n'est rendu au pool
+    for _ in range(3):
+        assert pool.run(["a.qgz"], cfg)["ok"] == 1
+
+
+@posix_only
+def test_timeout_kills_and_replaces_worker_outside_lock(pool, cfg, monkeypatch):
+    pool.ensure(1, cfg)
+    pids = _pids(pool)
+    init = export_pool.QgisWorker.__init__
+    locked = []
+
+    def slow_init(self, worker_cfg):
+        # Le remplaçant démarre sans bloquer le pool
+        locked.append(pool._lock.locked())
+        init(self, worker_cfg)
+
+    monkeypatch.setattr(export_pool.QgisWorker, "__init__", slow_init)
+    with pytest.raises(WorkerTimeout):
+        pool.run(["bloque"], cfg)
+    assert locked == [False]
+    assert pool.size == 1 and _pids(pool).isdisjoint(pids)
+    assert pool.run(["a.qgz"], cfg)["ok"] == 1
+
+
+def test_order_by_cost_longest_first():
+    costs = {"a.qgz": 1.0, "b.qgz": 5.0}
+    # Projet jamais mesuré : coût maximal connu, clé insensible au dossier et à la casse
+    assert order_by_cost(["x/a.qgz", "y/B.qgz", "c.qgz"], costs) == ["y/B.qgz", "c.qgz", "x/a.qgz"]
+    assert order_by_cost(["p1", "p2"], {}) == ["p1", "p2"]
+
+
+def test_record_export_cost_per_output_moving_average():
+    costs = {}
+    record_export_cost(costs, "//serveur/p.qgz", 12.0, 0)
+    assert costs == {}
+    record_export_cost(costs, "//serveur/p.qgz", 10.0, 2)
+    record_export_cost(costs, "C:/local/P.qgz", 6.0, 2)
+    assert costs == {"p.qgz": 4.0}
@@ -0,0 +1,146 @@
+"""ID contexte éco : répartition des couches entre processus d'analyse,
+écriture du classeur."""
+import pytest
+
+pytest.importorskip("geopandas")
+
+from modules import id_contexte_eco
+from modules.id_contexte_eco import layer_slots, run_analysis, shutdown_analysis_pool
+
+
+@pytest.fixture(autouse=True)
+def _no_pools():
+    shutdown_analysis_pool()
+    yield
+    shutdown_analysis_pool()
+
+
+def _couches(tmp_path, sizes):
+    couches = []
+    for nom, size in sizes.items():
+        path = tmp_path / f"{nom}.shp"
+        path.write_bytes(b"\0" * size)
+        couches.append({"nom": nom, "chemin": str(path)})
+    return couches
+
+
+def test_layer_slots_balances_by_size(tmp_path):
+    couches = _couches(tmp_path, {"a": 900, "b": 500, "c": 400, "d": 100})
+    slots = layer_slots(couches, 2)
+    loads = [0, 0]
+    for slot, size in zip(slots, (900, 500, 400, 100)):
+        loads[slot] += size
+    assert sorted(loads) == [900, 1000]
+
+
+def test_layer_slots_are_stable(tmp_path):
+    couches = _couches(tmp_path, {"a": 900, "b": 500, "c": 400, "d": 100})
+    slots = layer_slots(couches, 3)
+    # Même processus d'une analyse à l'autre, même pour un sous-ensemble
+    assert layer_slots(couches, 3) == slots
+    assert layer_slots(couches[2:], 3) == slots[2:]
+    extra = _couches(tmp_path, {"e": 50})
+    assert layer_slots(couches + extra, 3)[:4] == slots
+
+
+def test_run_analysis_reports_workbook_failure(tmp_path, monkeypatch):
+    results = {"synthese": None, "couches": {}}
+    monkeypatch.setattr(id_contexte_eco, "analyse_zonages", lambda *a, **k: results)
+    written = []
+    monkeypatch.setattr(id_contexte_eco, "write_workbook", lambda res, path: written.append(path))
+    out = str(tmp_path / "ID zonages.xlsx")
+    assert run_analysis("ae.shp", "ze.shp", 5.0, 1, out) is results
+    assert written == [out]
+
+    def _fail(res, path):
+        raise PermissionError("classeur ouvert dans Excel")
+
+    monkeypatch.setattr(id_contexte_eco, "write_workbook", _fail)
+    # Classeur demandé mais non écrit : échec pour l'appelant
+    assert run_analysis("ae.shp", "ze.shp", 5.0, 1, out) is None
+    assert run_analysis("ae.shp", "ze.shp", 5.0, 1, None) is results
+
+
+def test_group_site_bboxes():
+    from modules.id_contexte_eco import group_site_bboxes
+
+    near = [(0, 0, 10, 10), (12, 0, 22, 10)]
+    far = [(100_000, 100_000, 100_010, 100_010)]
+    groups = group_site_bboxes(near + far)
+    assert sorted(idx for _, idx in groups) == [[0, 1], [2]]
+    assert dict((tuple(idx), bbox) for bbox, idx in groups)[(0, 1)] == (0.0, 0.0, 22.0, 10.0)
+    # Sans agrandissement toléré, chaque site est lu seul
+    assert len(group_site_bboxes(near, max_growth=1.0)) == 2
+    assert group_site_bboxes([]) == []
+
+
+def test_run_batch_matches_single_site(tmp_path, monkeypatch):
+    gpd = pytest.importorskip("geopandas")
+    from shapely.geometry import box
+    from modules.id_contexte_eco import run_batch, _results_records
+
+    crs = "EPSG:2154"
+    # Deux sites proches et un site éloigné : deux lectures de la couche
+    origins = {"Site A": (900_000, 6_400_000), "Site B": (915_000, 6_400_000), "Site C": (700_000, 6_800_000)}
+    sites = []
+    zonages = []
+    for nom, (x, y) in origins.items():
+        ae, ze = tmp_path / f"{nom} AE.shp", tmp_path / f"{nom} ZE.shp"
+        gpd.GeoDataFrame(geometry=[box(x - 5_000, y - 5_000, x + 5_000, y + 5_000)], crs=crs).to_file(ae)
+        gpd.GeoDataFrame(geometry=[box(x - 500, y - 500, x + 500, y + 500)], crs=crs).to_file(ze)
+        sites.append({"AE_SHP": str(ae), "ZE_SHP": str(ze), "SITE": nom})
+        zonages += [(f"{nom} proche", box(x + 1_000, y + 1_000, x + 2_000, y + 2_000)),
+                    (f"{nom} limite", box(x - 6_000, y - 3_000, x - 4_000, y - 2_000)),
+                    (f"{nom} dehors", box(x, y + 20_000, x + 1_000, y + 21_000))]
+    layer = tmp_path / "zonage_test.shp"
+    gpd.GeoDataFrame({"NOM": [n for n, _ in zonages], "CODE": [f"Z{i}" for i in range(len(zonages))]},
+                     geometry=[g for _, g in zonages], crs=crs).to_file(layer)
+    couches = [{"nom": "Zonage test pytest", "chemin": str(layer), "attributs": ["NOM", "CODE"],
+                "attribut_nom": "NOM", "attribut_code": "CODE"}]
+    monkeypatch.setattr(id_contexte_eco, "load_couches", lambda: [dict(c) for c in couches])
+    monkeypatch.setattr(id_contexte_eco, "default_name_attributes", lambda: ["NOM"])
+    monkeypatch.setattr(id_contexte_eco, "CANDIDATES_DIR", str(tmp_path / "cache"))
+
+    by_site = run_batch(sites, 5.0, 2, excel=False, json_results=False)
+    assert sorted(by_site) == sorted(origins)
+    for site in sites:
+        single = run_analysis(site["AE_SHP"], site["ZE_SHP"], 5.0, 2, None)
+        assert _results_records(by_site[site["SITE"]]) == _results_records(single)
+        noms = {r["NOM"] for r in _results_records(single)["couches"]["Zonage test pytest"]}
+        assert noms == {f"{site['SITE']} proche", f"{site['SITE']} limite"}
+
+
+def test_write_workbook(tmp_path):
+    import numpy as np
+    import pandas as pd
+    openpyxl = pytest.importorskip("openpyxl")
+    from modules.id_contexte_eco import (
+        write_workbook, SYNTHESIS_SHEET, SYNTHESIS_HEADERS, STYLE_HEADER, STYLE_TITLE,
+        STYLE_DATA_EVEN, STYLE_DATA_ODD,
+    )
+
+    synthese = pd.DataFrame([["ZNIEFF I", "0.5 km", "Marais", "", "Z1"],
+                             ["ZNIEFF I", "2.1 km", "Forêt", "", np.nan]], columns=SYNTHESIS_HEADERS)
+    couche = pd.DataFrame({"Nom de la couche": ["ZNIEFF I"] * 3, "Distance et Direction": ["a", "b", "c"],
+                           "NOM": ["Marais", "Forêt", "Lande"], "Surface": [1.5, np.nan, 3.0]})
+    out = tmp_path / "ID zonages.xlsx"
+    write_workbook({"synthese": synthese, "couches": {"ZNIEFF I": couche}}, str(out))
+
+    def values(row):
+        # Cellule vide relue None, qu'elle ait été écrite '' ou NaN
+        return [c.value if c.value != "" else None for c in row]
+
+    wb = openpyxl.load_workbook(out)
+    assert wb.sheetnames == [SYNTHESIS_SHEET, "ZNIEFF I"]
+    ws = wb[SYNTHESIS_SHEET]
+    assert values(ws[1]) == [h or None for h in SYNTHESIS_HEADERS]
+    assert values(ws[3]) == ["ZNIEFF I", "2.1 km", "Forêt", None, None]
+    assert [ws.cell(r, 1).style for r in (1, 2, 3)] == [STYLE_HEADER, STYLE_DATA_EVEN, STYLE_DATA_ODD]
+    assert ws.column_dimensions["C"].width == 50
+
+    ws = wb["ZNIEFF I"]
+    assert values(ws[1])[:2] == ["ZNIEFF I", "Nombre de ZNIEFF I dans l'aire d'étude élargie : 3"]
+    assert values(ws[2]) == list(couche.columns)
+    assert values(ws[4]) == ["ZNIEFF I", "b", "Forêt", None]
+    assert [ws.cell(r, 1).style for r in (1, 2, 3, 4)] == [STYLE_TITLE, STYLE_HEADER, STYLE_DATA_ODD, STYLE_DATA_EVEN]
+    assert ws.column_dimensions["C"].width == 45
@@ -0,0 +1,119 @@
+"""Rapport Word : tableaux des couches insérés aux repères du modèle,
+modèle analysé une fois par processus, rapports d'une campagne de sites."""
+import json
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+docx = pytest.importorskip("docx")
+
+from modules.report_builder import (
+    _cell_text, fill_document, compile_template, new_report_document, build_report, build_reports,
+)
+
+
+def _couches():
+    return {
+        "ZNIEFF de Type I": pd.DataFrame({"Nom de la couche": ["ZNIEFF de Type I"] * 2,
+                                          "Distance et Direction": ["0.5 km N", "2 km S"],
+                                          "Surface": [12.0, np.nan]}),
+        "ZNIEFF de Type II": pd.DataFrame({"Nom de la couche": ["ZNIEFF de Type II"],
+                                           "Distance et Direction": ["3 km E"],
+                                           "Surface": [4.0]}),
+    }
+
+
+ZNIEFF_ROWS = [
+    ["ZNIEFF de Type I", "Nombre de ZNIEFF de Type I dans l'aire d'étude élargie : 2", ""],
+    ["Nom de la couche", "Distance et Direction", "Surface"],
+    ["ZNIEFF de Type I", "0.5 km N", "12"],
+    ["ZNIEFF de Type I", "2 km S", ""],
+    ["ZNIEFF de Type II", "Nombre de ZNIEFF de Type II dans l'aire d'étude élargie : 1", ""],
+    ["ZNIEFF de Type II", "3 km E", "4"],
+]
+
+
+def _rows(table):
+    return [[c.text for c in r.cells] for r in table.rows]
+
+
+def test_cell_text():
+    values = (None, float("nan"), 12.0, np.float64(3.0), 2.5, 7, "x")
+    assert [_cell_text(v) for v in values] == ["", "", "12", "3", "2.5", "7", "x"]
+
+
+def test_fill_document_tables(tmp_path):
+    doc = docx.Document()
+    doc.add_paragraph("Introduction")
+    doc.add_paragraph("TABLEAU ZNIEFF")
+    doc.add_paragraph("TABLEAU APPB")
+    fill_document(doc, {"couches": _couches()}, str(tmp_path))
+    assert len(doc.tables) == 1
+    assert _rows(doc.tables[0]) == ZNIEFF_ROWS
+    # Repère remplacé par le tableau ; repère sans couche laissé tel quel
+    assert [p.text for p in doc.paragraphs] == ["Introduction", "TABLEAU APPB"]
+
+
+@pytest.fixture
+def template(tmp_path):
+    doc = docx.Document()
+    for text in ("Contexte éco", "TABLEAU ZNIEFF", "CARTE ZNIEFF", "Conclusion"):
+        doc.add_paragraph(text)
+    path = tmp_path / "modèle.docx"
+    doc.save(path)
+    return str(path)
+
+
+def test_compile_template_cached_until_modified(template):
+    compiled = compile_template(template)
+    assert compile_template(template) is compiled
+    assert [text for _, text in compiled["markers"]] == ["TABLEAU ZNIEFF", "CARTE ZNIEFF"]
+
+    doc = docx.Document(template)
+    doc.add_paragraph("TABLEAU APPB")
+    doc.save(template)
+    st = os.stat(template)
+    os.utime(template, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert [text for _, text in compile_template(template)["markers"]][-1] == "TABLEAU APPB"
+
+
+def test_reports_share_the_parsed_template(tmp_path, template):
+    compiled = compile_template(template)
+    doc = new_report_document(compiled)
+    fill_document(doc, {"couches": _couches()}, str(tmp_path), compiled["markers"])
+    assert _rows(doc.tables[0]) == ZNIEFF_ROWS
+    # Le modèle analysé n'est jamais modifié par un rapport
+    assert not compiled["doc"].tables
+    assert "TABLEAU ZNIEFF" in [p.text for p in compiled["doc"].paragraphs]
+
+    outs = [build_report({"couches": _couches()}, str(tmp_path), str(tmp_path / f"r{i}.docx"), template)
+            for i in range(2)]
+    for out in outs:
+        report = docx.Document(out)
+        assert _rows(report.tables[0]) == ZNIEFF_ROWS
+        # Carte absente : repère laissé tel quel
+        assert [p.text for p in report.paragraphs] == ["Contexte éco", "CARTE ZNIEFF", "Conclusion"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_build_reports(tmp_path, template, workers):
+    records = {nom: json.loads(df.to_json(orient="records", force_ascii=False)) for nom, df in _couches().items()}
+    sites = []
+    for i, (dossier, fichier) in enumerate((("a", "ID zonages.json"), ("b", "ID zonages - Site B.json"),
+                                            ("c", None), ("a", "ID zonages.json"))):
+        folder = tmp_path / f"lot{i}" / dossier
+        folder.mkdir(parents=True)
+        if fichier:
+            (folder / fichier).write_text(json.dumps({"synthese": [], "couches": records}), encoding="utf-8")
+        sites.append({"EXPORT_DIR": str(folder), "SITE": "Site B" if dossier == "b" else None})
+    # Deux dossiers de même nom : noms dédoublonnés comme pour l'ID des zonages
+    sites[-1] = sites[-1]["EXPORT_DIR"]
+
+    reports = build_reports(sites, template, workers)
+    assert sorted(reports) == ["Site B", "a", "a (2)", "c"]
+    assert reports["c"] is None
+    assert reports["a (2)"].startswith(str(tmp_path / "lot3"))
+    for nom in ("Site B", "a", "a (2)"):
+        assert _rows(docx.Document(reports[nom]).tables[0]) == ZNIEFF_ROWS
@@ -0,0 +1,46 @@
+"""Graphe d'étapes du rapport automatique."""
+import threading
+
+import pytest
+
+from modules.report_pipeline import run_task_graph, OK, FAILED, SKIPPED
+
+
+def _fail():
+    raise RuntimeError("échec volontaire")
+
+
+def test_failure_skips_dependents():
+    report = run_task_graph({
+        "a": (lambda: 1, []),
+        "b": (_fail, []),
+        "c": (lambda: 3, ["b"]),
+        "d": (lambda: 4, ["c"]),
+        "e": (lambda: 5, ["a"]),
+    })
+    assert {name: entry["status"] for name, entry in report.items()} == {
+        "a": OK, "b": FAILED, "c": SKIPPED, "d": SKIPPED, "e": OK,
+    }
+    assert report["e"]["result"] == 5 and report["c"]["result"] is None
+    assert isinstance(report["b"]["error"], RuntimeError)
+
+
+def test_independent_steps_run_together():
+    # L'ID des zonages et l'export des cartes se rejoignent avant le rapport
+    barrier = threading.Barrier(2, timeout=5)
+    report = run_task_graph({
+        "id": (barrier.wait, []),
+        "export": (barrier.wait, []),
+        "rapport": (lambda: "ok", ["id", "export"]),
+    })
+    assert [report[n]["status"] for n in ("id", "export", "rapport")] == [OK, OK, OK]
+    assert report["rapport"]["start"] >= max(report[n]["start"] + report[n]["duration"] for n in ("id", "export"))
+
+
+@pytest.mark.parametrize("tasks", [
+    {"a": (lambda: 1, ["b"]), "b": (lambda: 2, ["a"])},
+    {"a": (lambda: 1, ["z"])},
+], ids=["cycle", "dépendance inconnue"])
+def test_invalid_graph(tasks):
+    with pytest.raises(ValueError):
+        run_task_graph(tasks)
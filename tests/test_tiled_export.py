@@ -0,0 +1,66 @@
+"""Assemblage du PNG final à partir des bandes deflate rendues par les workers."""
+import random
+import struct
+import zlib
+
+import pytest
+
+from modules.tiled_export import adler32_combine, assemble_png
+
+
+def _png_pixels(path):
+    """Taille et lignes filtrées (octet de filtre + RGBA) ; CRC vérifiés."""
+    data = path.read_bytes()
+    pos, idat, size = 8, [], None
+    while pos < len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        chunk = data[pos + 8:pos + 8 + length]
+        crc = struct.unpack(">I", data[pos + 8 + length:pos + 12 + length])[0]
+        assert crc == zlib.crc32(chunk, zlib.crc32(kind)) & 0xFFFFFFFF, kind
+        if kind == b"IHDR":
+            size = struct.unpack(">II", chunk[:8])
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        pos += 12 + length
+    return size, zlib.decompress(b"".join(idat))
+
+
+def _write_parts(tmp_path, lines, count):
+    """Bandes au format de `export_worker.render_tile`."""
+    parts = []
+    bounds = [len(lines) * i // count for i in range(count + 1)]
+    for i in range(count):
+        comp = zlib.compressobj(6, zlib.DEFLATED, -15)
+        adler, length = 1, 0
+        path = tmp_path / f"{i}.part"
+        with open(path, "wb") as f:
+            for line in lines[bounds[i]:bounds[i + 1]]:
+                adler = zlib.adler32(line, adler)
+                length += len(line)
+                f.write(comp.compress(line))
+            f.write(comp.flush(zlib.Z_FINISH if i == count - 1 else zlib.Z_SYNC_FLUSH))
+        parts.append((str(path), adler, length))
+    return parts
+
+
+def test_adler32_combine():
+    rng = random.Random(0)
+    a = bytes(rng.randrange(256) for _ in range(5000))
+    b = bytes(rng.randrange(256) for _ in range(7000))
+    assert adler32_combine(zlib.adler32(a), zlib.adler32(b), len(b)) == zlib.adler32(a + b)
+    assert adler32_combine(zlib.adler32(a), 1, 0) == zlib.adler32(a)
+
+
+def test_assemble_png(tmp_path):
+    rng = random.Random(0)
+    width, height = 37, 50
+    lines = [b"\x00" + bytes(rng.randrange(256) for _ in range(width * 4)) for _ in range(height)]
+    out = tmp_path / "out.png"
+    assemble_png(str(out), width, height, 600, _write_parts(tmp_path, lines, 3), chunk_size=97)
+    assert _png_pixels(out) == ((width, height), b"".join(lines))
+
+    Image = pytest.importorskip("PIL.Image")
+    with Image.open(out) as img:
+        img.load()
+        assert img.size == (width, height)
+        assert img.tobytes() == b"".join(line[1:] for line in lines)
@@ -0,0 +1,54 @@
+"""Registre JSON des couches de zonage."""
+import json
+import os
+
+import pytest
+
+from modules.zonage_registry import load_registry, load_couches, default_name_attributes
+
+
+def _write(path, data, mtime_ns=None):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_load_registry_reloads_on_change(tmp_path):
+    path = tmp_path / "zonages_id.json"
+    _write(path, {"couches": [{"nom": "A", "fichier": "a.shp"}]}, 1_000_000_000)
+    first = load_registry(str(path))
+    assert load_registry(str(path)) is first
+    _write(path, {"couches": [{"nom": "B", "fichier": "b.shp"}]}, 2_000_000_000)
+    assert [c["nom"] for c in load_registry(str(path))["couches"]] == ["B"]
+
+
+def test_load_registry_invalid(tmp_path):
+    path = tmp_path / "zonages_id.json"
+    _write(path, {"couches": {"nom": "A"}})
+    with pytest.raises(ValueError):
+        load_registry(str(path))
+
+
+def test_load_couches_resolves_paths(tmp_path):
+    (tmp_path / "secours").mkdir()
+    (tmp_path / "secours" / "b.shp").touch()
+    path = tmp_path / "zonages_id.json"
+    _write(path, {
+        "dossiers": [str(tmp_path / "principal"), str(tmp_path / "secours")],
+        "attributs_nom": ["NOM", "SITENAME"],
+        "couches": [
+            {"nom": "A", "fichier": "a.shp"},
+            {"nom": "B", "fichier": "b.shp", "attributs": ["NOM"]},
+            {"nom": "C", "chemin": str(tmp_path / "ailleurs" / "c.shp")},
+        ],
+    })
+    couches = load_couches(str(path))
+    # Introuvable : premier dossier, pour le message d'erreur
+    assert couches[0]["chemin"] == str(tmp_path / "principal" / "a.shp")
+    assert couches[0]["attributs"] == []
+    assert couches[1]["chemin"] == str(tmp_path / "secours" / "b.shp")
+    assert couches[2]["chemin"] == str(tmp_path / "ailleurs" / "c.shp")
+    # Copie modifiable : le registre mémorisé n'est pas touché
+    couches[1]["attributs"].append("X")
+    assert load_couches(str(path))[1]["attributs"] == ["NOM"]
+    assert default_name_attributes(str(path)) == ["NOM", "SITENAME"]